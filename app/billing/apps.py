@@ -8,4 +8,4 @@ class BillingAppConfig(AppConfig):
     verbose_name = "Billing"
 
     def ready(self):
-        pass
+        import billing.signals  # pylint: disable=unused-import
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from billing.models import User
+
+
+def user_cache_key(user_id):
+    return f"billing:auth-user:{user_id}"
+
+
+def invalidate_cached_users(user_ids):
+    """Drops users from the cache of every process
+
+    Saved users and wallets are dropped by billing.signals, call it after
+    changing them with QuerySet.update(), which sends no signals.
+    """
+    cache.delete_many([user_cache_key(user_id) for user_id in user_ids])
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication keeping the user with the wallet in the cache for a while.
+
+    Most requests then make no query to authenticate. Wallet balance and version
+    are never cached: they're deferred and loaded from the database when read,
+    payments lock and re-read wallets anyway. Cached users are dropped when a user or wallet
+    is saved, see billing.signals. The cache is shared by all workers, see CACHES.
+    Users changed by QuerySet.update() stay cached for up to AUTH_USER_CACHE_TTL
+    unless invalidate_cached_users is called.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = (
+                User.objects.defer("wallet__balance", "wallet__version")
+                .filter(**{jwt_settings.USER_ID_FIELD: user_id})
+                .first()
+            )
+            if user is None:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            cache.set(key, user, settings.AUTH_USER_CACHE_TTL)
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
@@ -0,0 +1,5 @@
+"""Performance benchmarks for the billing app.
+
+Each module exposes `add_arguments(parser)` and `run(command, **options)`
+and is launched with `python manage.py benchmark <name>`.
+"""
@@ -0,0 +1,73 @@
+"""Request latency and queries with JWTAuthentication vs CachedJWTAuthentication.
+
+Requests carry a real access token, so both backends validate it the same way.
+"""
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from billing.authentication import CachedJWTAuthentication, user_cache_key
+from billing.benchmarks.utils import (
+    create_bench_wallet,
+    ensure_exchange_rates,
+    seed_entries,
+    stopwatch,
+    summarize,
+)
+from billing.constants import USD
+from billing.views import ExchangeRateList, TransactionViewset
+
+ENDPOINTS = (
+    ("exchange rates", "/api/exchange-rates/", ExchangeRateList.as_view),
+    (
+        "transactions",
+        "/api/transactions/",
+        lambda **kwargs: TransactionViewset.as_view({"get": "list"}, **kwargs),
+    ),
+)
+
+
+def add_arguments(parser):
+    parser.add_argument(
+        "--requests", type=int, default=2000, help="Requests timed per endpoint"
+    )
+
+
+def measure(view, path, token, count):
+    factory = APIRequestFactory()
+    samples = []
+    for _ in range(count):
+        request = factory.get(path, HTTP_AUTHORIZATION=f"Bearer {token}")
+        with stopwatch(samples):
+            view(request).render()
+
+    request = factory.get(path, HTTP_AUTHORIZATION=f"Bearer {token}")
+    with CaptureQueriesContext(connection) as queries:
+        view(request).render()
+    return summarize(samples), len(queries)
+
+
+def run(command, requests, **options):
+    # Everything is rolled back at the end, the database is left untouched.
+    with transaction.atomic():
+        ensure_exchange_rates()
+        wallet = create_bench_wallet(USD)
+        seed_entries(wallet, 100)
+        token = str(RefreshToken.for_user(wallet.user).access_token)
+
+        for name, path, as_view in ENDPOINTS:
+            for backend in (JWTAuthentication, CachedJWTAuthentication):
+                cache.delete(user_cache_key(wallet.user_id))
+                stats, queries = measure(
+                    as_view(authentication_classes=[backend]), path, token, requests
+                )
+                command.stdout.write(
+                    f"{name:>14} {backend.__name__:>23}: "
+                    f"mean {stats['mean_ms']:.3f} ms, p50 {stats['p50_ms']:.3f} ms, "
+                    f"{queries} queries"
+                )
+
+        transaction.set_rollback(True)
@@ -0,0 +1,60 @@
+"""Payment latency as the source wallet history grows.
+
+Balances are maintained incrementally, so latency should stay flat
+regardless of how many entries the wallet already has.
+"""
+from django.db import transaction
+
+from billing.benchmarks.utils import (
+    create_bench_wallet,
+    seed_entries,
+    stopwatch,
+    summarize,
+)
+from billing.constants import USD
+from billing.context import send_payment
+from billing.money import Money
+
+
+def add_arguments(parser):
+    parser.add_argument(
+        "--sizes",
+        default="1000,10000,100000,1000000",
+        help="Comma separated wallet history sizes (entries) to measure at",
+    )
+    parser.add_argument(
+        "--payments", type=int, default=200, help="Payments timed at each size"
+    )
+
+
+def run(command, sizes, payments, **options):
+    sizes = sorted(int(size) for size in sizes.split(","))
+
+    # Everything is rolled back at the end, the database is left untouched.
+    with transaction.atomic():
+        source_wallet = create_bench_wallet(USD, balance=Money.from_decimal(1000000000))
+        destination_wallet = create_bench_wallet(USD)
+
+        history = 0
+        for size in sizes:
+            seed_entries(source_wallet, size - history)
+            history = size
+
+            samples = []
+            for _ in range(payments):
+                with stopwatch(samples):
+                    send_payment(
+                        source_wallet=source_wallet,
+                        destination_wallet=destination_wallet,
+                        amount=Money.from_decimal(1),
+                        description="Benchmark payment",
+                    )
+            history += payments
+
+            stats = summarize(samples)
+            command.stdout.write(
+                f"{size:>10} entries: mean {stats['mean_ms']:.2f} ms, "
+                f"p50 {stats['p50_ms']:.2f} ms, p95 {stats['p95_ms']:.2f} ms"
+            )
+
+        transaction.set_rollback(True)
@@ -0,0 +1,77 @@
+"""Payments per second, single payment endpoint vs batch endpoint.
+
+Views are called in-process through APIRequestFactory, so the numbers include
+request parsing, validation and serialization but no network.
+"""
+
+import time
+
+from django.db import transaction
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from billing.benchmarks.utils import create_bench_wallet, ensure_exchange_rates
+from billing.constants import USD, EUR
+from billing.money import Money
+from billing.views import TransactionViewset, TransactionBatchView
+
+
+def add_arguments(parser):
+    parser.add_argument(
+        "--payments", type=int, default=2000, help="Payments sent through each path"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=500, help="Payments per batch request"
+    )
+    parser.add_argument(
+        "--destinations", type=int, default=50, help="Distinct destination wallets"
+    )
+
+
+def run(command, payments, batch_size, destinations, **options):
+    factory = APIRequestFactory()
+    single_view = TransactionViewset.as_view({"post": "post"})
+    batch_view = TransactionBatchView.as_view()
+
+    # Everything is rolled back at the end, the database is left untouched.
+    with transaction.atomic():
+        ensure_exchange_rates()
+        source_wallet = create_bench_wallet(USD, balance=Money.from_decimal(1000000000))
+        user = source_wallet.user
+        destination_ids = [
+            create_bench_wallet(USD if index % 2 else EUR).id
+            for index in range(destinations)
+        ]
+        payment_data = [
+            dict(
+                amount="1.00",
+                destination_wallet=destination_ids[index % destinations],
+                description=f"Benchmark payment #{index}",
+            )
+            for index in range(payments)
+        ]
+
+        started = time.perf_counter()
+        for data in payment_data:
+            request = factory.post("/api/transactions/", data, format="json")
+            force_authenticate(request, user=user)
+            single_view(request)
+        single_rate = payments / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        for offset in range(0, payments, batch_size):
+            request = factory.post(
+                "/api/transactions/batch/",
+                dict(payments=payment_data[offset : offset + batch_size]),
+                format="json",
+            )
+            force_authenticate(request, user=user)
+            batch_view(request)
+        batch_rate = payments / (time.perf_counter() - started)
+
+        command.stdout.write(f"single: {single_rate:.0f} payments/s")
+        command.stdout.write(
+            f"batch ({batch_size} per request): {batch_rate:.0f} payments/s, "
+            f"x{batch_rate / single_rate:.1f}"
+        )
+
+        transaction.set_rollback(True)
@@ -0,0 +1,106 @@
+"""Concurrent payments between a small set of wallets.
+
+Reports payment throughput and the time spent waiting for wallet row locks.
+Data has to be committed for other threads to see it, so benchmark wallets
+and their transactions are deleted at the end instead of rolled back.
+"""
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+from rest_framework import serializers
+
+from billing.benchmarks.utils import create_bench_wallet, summarize
+from billing.constants import USD
+from billing.context import send_payment
+from billing.models import Transaction, User, Wallet
+from billing.money import Money
+
+
+def add_arguments(parser):
+    parser.add_argument(
+        "--payments", type=int, default=5000, help="Total payments to send"
+    )
+    parser.add_argument("--threads", type=int, default=16, help="Concurrent clients")
+    parser.add_argument(
+        "--wallets", type=int, default=4, help="Wallets the payments go between"
+    )
+
+
+class LockTimer:
+    """execute_wrapper collecting durations of SELECT ... FOR UPDATE queries"""
+
+    def __init__(self):
+        self.samples = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if "FOR UPDATE" not in sql:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.samples.append(time.perf_counter() - started)
+
+
+def run(command, payments, threads, wallets, **options):
+    wallet_ids = [
+        create_bench_wallet(USD, balance=Money.from_decimal(1000000)).id
+        for _ in range(wallets)
+    ]
+
+    def pay(count):
+        lock_timer = LockTimer()
+        latencies = []
+        rejected = 0
+        randomizer = random.Random()
+        try:
+            with connection.execute_wrapper(lock_timer):
+                for _ in range(count):
+                    source_id, destination_id = randomizer.sample(wallet_ids, 2)
+                    started = time.perf_counter()
+                    try:
+                        send_payment(
+                            source_wallet=Wallet.objects.get(id=source_id),
+                            destination_wallet=Wallet.objects.get(id=destination_id),
+                            amount=Money.from_decimal(randomizer.randint(1, 100)),
+                            description="Benchmark payment",
+                        )
+                    except serializers.ValidationError:
+                        rejected += 1
+                    latencies.append(time.perf_counter() - started)
+        finally:
+            connection.close()
+        return latencies, lock_timer.samples, rejected
+
+    per_thread = [payments // threads] * threads
+    per_thread[0] += payments % threads
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(pay, per_thread))
+    elapsed = time.perf_counter() - started
+
+    latencies = [sample for result in results for sample in result[0]]
+    lock_waits = [sample for result in results for sample in result[1]]
+    rejected = sum(result[2] for result in results)
+
+    latency = summarize(latencies)
+    lock_wait = summarize(lock_waits)
+    command.stdout.write(
+        f"{payments} payments, {threads} threads, {wallets} wallets: "
+        f"{payments / elapsed:.0f} payments/s, {rejected} rejected"
+    )
+    command.stdout.write(
+        f"latency: p50 {latency['p50_ms']:.2f} ms, p95 {latency['p95_ms']:.2f} ms, "
+        f"p99 {latency['p99_ms']:.2f} ms"
+    )
+    command.stdout.write(
+        f"lock wait: mean {lock_wait['mean_ms']:.2f} ms, "
+        f"p95 {lock_wait['p95_ms']:.2f} ms, "
+        f"total {sum(lock_waits):.2f} s"
+    )
+
+    Transaction.objects.filter(entries__wallet__in=wallet_ids).delete()
+    User.objects.filter(wallet__in=wallet_ids).delete()
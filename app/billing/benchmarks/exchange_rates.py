@@ -0,0 +1,43 @@
+"""Requests per second of the exchange rates endpoint.
+
+The view is called in-process through APIRequestFactory with today's rates
+already stored, so no rates are downloaded.
+"""
+import time
+
+from django.db import transaction
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from billing.benchmarks.utils import create_bench_wallet, ensure_exchange_rates
+from billing.constants import USD, SUPPORTED_CURRENCIES
+from billing.views import ExchangeRateList
+
+
+def add_arguments(parser):
+    parser.add_argument(
+        "--requests", type=int, default=5000, help="Requests sent to the endpoint"
+    )
+
+
+def run(command, requests, **options):
+    factory = APIRequestFactory()
+    view = ExchangeRateList.as_view()
+
+    # Everything is rolled back at the end, the database is left untouched.
+    with transaction.atomic():
+        ensure_exchange_rates()
+        user = create_bench_wallet(USD).user
+
+        started = time.perf_counter()
+        for index in range(requests):
+            from_currency = SUPPORTED_CURRENCIES[index % len(SUPPORTED_CURRENCIES)]
+            request = factory.get(
+                "/api/exchange-rates/", dict(from_currency=from_currency)
+            )
+            force_authenticate(request, user=user)
+            view(request).render()
+        elapsed = time.perf_counter() - started
+
+        command.stdout.write(f"exchange rates: {requests / elapsed:.0f} requests/s")
+
+        transaction.set_rollback(True)
@@ -0,0 +1,290 @@
+"""Latency, throughput and SQL queries of API endpoints under concurrent clients.
+
+Users with a transaction history are seeded and committed, then every scenario
+sends --requests HTTP requests from --clients threads, either to a server
+started in-process or to --url. Queries per request are only counted by the
+in-process server. Seeded users are deleted at the end unless --keep is given.
+Results are written as JSON with --output and compared to an earlier run
+with --compare, so commits can be checked for regressions.
+"""
+import json
+import random
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from billing.benchmarks.utils import (
+    create_bench_wallet,
+    delete_bench_wallets,
+    ensure_exchange_rates,
+    seed_entries,
+    summarize,
+)
+from billing.constants import USD, EUR
+from billing.money import Money
+
+QUERIES_HEADER = "X-Bench-Queries"
+
+
+def top_up(wallet, wallets, randomizer):
+    return "POST", "/api/wallets/top-up/", dict(amount="10.00")
+
+
+def payment(wallet, wallets, randomizer):
+    destination_wallet = randomizer.choice(wallets)
+    return (
+        "POST",
+        "/api/transactions/",
+        dict(
+            amount="1.00",
+            destination_wallet=destination_wallet.id,
+            description="Load test payment",
+        ),
+    )
+
+
+def transactions(wallet, wallets, randomizer):
+    return "GET", "/api/transactions/", None
+
+
+def exchange_rates(wallet, wallets, randomizer):
+    return "GET", "/api/exchange-rates/", None
+
+
+def report(wallet, wallets, randomizer):
+    date_from = date.today() - timedelta(days=30)
+    return (
+        "GET",
+        f"/api/report/?username={wallet.user.username}&date_from={date_from}",
+        None,
+    )
+
+
+SCENARIOS = {
+    "top_up": top_up,
+    "payment": payment,
+    "transactions": transactions,
+    "exchange_rates": exchange_rates,
+    "report": report,
+}
+
+
+def add_arguments(parser):
+    parser.add_argument("--users", type=int, default=50, help="Seeded users")
+    parser.add_argument(
+        "--history", type=int, default=200, help="Seeded transactions per user"
+    )
+    parser.add_argument(
+        "--clients", type=int, default=8, help="Concurrent client threads"
+    )
+    parser.add_argument(
+        "--requests", type=int, default=1000, help="Requests sent per scenario"
+    )
+    parser.add_argument(
+        "--scenarios",
+        default=",".join(SCENARIOS),
+        help=f"Comma separated, any of: {', '.join(SCENARIOS)}",
+    )
+    parser.add_argument(
+        "--url", help="Server to load, e.g. http://localhost:8000, in-process if empty"
+    )
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of an earlier run")
+    parser.add_argument(
+        "--keep", action="store_true", help="Don't delete the seeded users"
+    )
+
+
+class QueryCountingApp:
+    """WSGI app sending the number of SQL queries of a request in a header"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        queries = []
+
+        def count_query(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        def start_response_with_queries(status, headers, exc_info=None):
+            headers = headers + [(QUERIES_HEADER, str(len(queries)))]
+            return start_response(status, headers, exc_info)
+
+        # Request threads have their own connections, only this request is counted
+        with connection.execute_wrapper(count_query):
+            return self.app(environ, start_response_with_queries)
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@contextmanager
+def local_server():
+    """Serves the app on a free local port in a background thread
+
+    :return: str base URL
+    """
+    server = ThreadedWSGIServer(("127.0.0.1", 0), QuietRequestHandler)
+    server.set_app(QueryCountingApp(get_wsgi_application()))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        with override_settings(ALLOWED_HOSTS=settings.ALLOWED_HOSTS + ["127.0.0.1"]):
+            yield f"http://127.0.0.1:{server.server_port}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def send(base_url, token, method, path, data):
+    """:return: tuple of (HTTP status, queries made or None)"""
+    request = urllib.request.Request(
+        base_url + path,
+        data=json.dumps(data).encode() if data is not None else None,
+        method=method,
+        headers={
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+        },
+    )
+    try:
+        with urllib.request.urlopen(request) as response:
+            response.read()
+    except urllib.error.HTTPError as error:
+        response = error
+        response.read()
+    queries = response.headers.get(QUERIES_HEADER)
+    return response.status, int(queries) if queries is not None else None
+
+
+def run_scenario(base_url, build, wallets, count, clients, seed):
+    """Sends `count` requests built by `build` for random users
+
+    :return: dict() of latency summary, throughput, errors and queries per request
+    """
+    randomizer = random.Random(seed)
+    tokens = {
+        wallet.id: str(RefreshToken.for_user(wallet.user).access_token)
+        for wallet in wallets
+    }
+    requests = []
+    for _ in range(count):
+        wallet = randomizer.choice(wallets)
+        requests.append((tokens[wallet.id],) + build(wallet, wallets, randomizer))
+
+    def timed_send(request):
+        started = time.perf_counter()
+        status, queries = send(base_url, *request)
+        return time.perf_counter() - started, status, queries
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        results = list(executor.map(timed_send, requests))
+    elapsed = time.perf_counter() - started
+
+    queries = [queries for _, _, queries in results if queries is not None]
+    return dict(
+        summarize([duration for duration, _, _ in results]),
+        throughput=count / elapsed,
+        errors=sum(not 200 <= status < 300 for _, status, _ in results),
+        queries_per_request=sum(queries) / len(queries) if queries else None,
+    )
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_stats(stats):
+    queries = stats["queries_per_request"]
+    return (
+        f"{stats['throughput']:.0f} req/s, p50 {stats['p50_ms']:.1f} ms, "
+        f"p95 {stats['p95_ms']:.1f} ms, p99 {stats['p99_ms']:.1f} ms, "
+        f"{'-' if queries is None else f'{queries:.1f}'} queries/request, "
+        f"{stats['errors']} errors"
+    )
+
+
+def format_change(stats, earlier):
+    def change(key):
+        return (stats[key] / earlier[key] - 1) * 100 if earlier[key] else 0.0
+
+    return (
+        f"throughput {change('throughput'):+.0f}%, p50 {change('p50_ms'):+.0f}%, "
+        f"p99 {change('p99_ms'):+.0f}%"
+    )
+
+
+def run(command, users, history, clients, requests, scenarios, url, **options):
+    names = [name.strip() for name in scenarios.split(",") if name.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        command.stderr.write(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        return
+    earlier = None
+    if options["compare"]:
+        with open(options["compare"]) as compare_file:
+            earlier = json.load(compare_file)["scenarios"]
+
+    ensure_exchange_rates()
+    wallets = [
+        create_bench_wallet(
+            USD if index % 2 else EUR, balance=Money.from_decimal(1000000)
+        )
+        for index in range(users)
+    ]
+    for wallet in wallets:
+        seed_entries(wallet, history)
+    command.stdout.write(f"Seeded {users} users with {history} transactions each")
+
+    results = dict(
+        commit=git_commit(),
+        created=timezone.now().isoformat(),
+        url=url,
+        options=dict(users=users, history=history, clients=clients, requests=requests),
+        scenarios={},
+    )
+    try:
+        with (nullcontext(url) if url else local_server()) as base_url:
+            for seed, name in enumerate(names):
+                stats = run_scenario(
+                    base_url, SCENARIOS[name], wallets, requests, clients, seed
+                )
+                results["scenarios"][name] = stats
+                line = f"{name:>14}: {format_stats(stats)}"
+                if earlier and name in earlier:
+                    line += f" ({format_change(stats, earlier[name])})"
+                command.stdout.write(line)
+    finally:
+        if not options["keep"]:
+            delete_bench_wallets(wallets)
+
+    if options["output"]:
+        with open(options["output"], "w") as output_file:
+            json.dump(results, output_file, indent=2)
+        command.stdout.write(f"Results written to {options['output']}")
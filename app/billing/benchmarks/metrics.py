@@ -0,0 +1,66 @@
+"""Request latency with and without MetricsMiddleware.
+
+Requests go through the whole Django handler with the test client,
+set PROMETHEUS_MULTIPROC_DIR to a scratch directory to time the uWSGI setup.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from billing.benchmarks.utils import (
+    create_bench_wallet,
+    ensure_exchange_rates,
+    seed_entries,
+    stopwatch,
+    summarize,
+)
+from billing.constants import USD
+
+MIDDLEWARE = "billing.metrics.MetricsMiddleware"
+
+
+def add_arguments(parser):
+    parser.add_argument(
+        "--requests", type=int, default=2000, help="Requests timed per endpoint"
+    )
+
+
+def measure(client, url, token, count):
+    samples = []
+    for _ in range(count):
+        with stopwatch(samples):
+            client.get(url, HTTP_AUTHORIZATION=f"Bearer {token}")
+    return summarize(samples)
+
+
+def run(command, requests, **options):
+    # Everything is rolled back at the end, the database is left untouched.
+    with transaction.atomic():
+        ensure_exchange_rates()
+        wallet = create_bench_wallet(USD)
+        seed_entries(wallet, 100)
+        token = str(RefreshToken.for_user(wallet.user).access_token)
+        client = Client()
+
+        without = [name for name in settings.MIDDLEWARE if name != MIDDLEWARE]
+        for name in ("exchange-rates", "transactions", "wallet"):
+            url = reverse(name)
+            means = []
+            for label, middleware in (
+                ("without", without),
+                ("with", [MIDDLEWARE] + without),
+            ):
+                with override_settings(MIDDLEWARE=middleware):
+                    measure(client, url, token, 10)  # warm up
+                    stats = measure(client, url, token, requests)
+                means.append(stats["mean_ms"])
+                command.stdout.write(
+                    f"{name:>14} {label:>7} metrics: "
+                    f"mean {stats['mean_ms']:.3f} ms, p50 {stats['p50_ms']:.3f} ms"
+                )
+            command.stdout.write(f"{'':>14} overhead {means[1] - means[0]:+.3f} ms")
+
+        transaction.set_rollback(True)
@@ -0,0 +1,75 @@
+"""Transactions list latency at page 1 and a deep page, keyset vs limit/offset.
+
+The deep keyset page is opened with a cursor built for its position,
+the same cursor a client gets by following `next` links.
+"""
+from django.db import transaction
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from billing.benchmarks.utils import (
+    create_bench_wallet,
+    seed_entries,
+    stopwatch,
+    summarize,
+)
+from billing.constants import USD
+from billing.context import find_transactions
+from billing.pagination import KeysetPagination
+from billing.views import TransactionViewset
+
+PAGE_SIZE = 10
+
+
+def add_arguments(parser):
+    parser.add_argument("--page", type=int, default=10000, help="Deep page number")
+    parser.add_argument(
+        "--repeat", type=int, default=20, help="Requests timed per measurement"
+    )
+
+
+def measure(view, user, params, repeat):
+    factory = APIRequestFactory()
+    samples = []
+    for _ in range(repeat):
+        request = factory.get("/api/transactions/", params)
+        force_authenticate(request, user=user)
+        with stopwatch(samples):
+            view(request).render()
+    return summarize(samples)["p50_ms"]
+
+
+def run(command, page, repeat, **options):
+    keyset_view = TransactionViewset.as_view({"get": "list"})
+    offset_view = TransactionViewset.as_view(
+        {"get": "list"}, pagination_class=LimitOffsetPagination
+    )
+
+    # Everything is rolled back at the end, the database is left untouched.
+    with transaction.atomic():
+        wallet = create_bench_wallet(USD)
+        seed_entries(wallet, (page + 1) * PAGE_SIZE)
+        user = wallet.user
+
+        offset = (page - 1) * PAGE_SIZE
+        last_item = (
+            find_transactions(dict(wallet=wallet))
+            .order_by("-created", "-id")
+            .values_list("created", "id")[offset - 1]
+        )
+        cursor = KeysetPagination().encode_cursor(last_item)
+
+        results = [
+            ("keyset", 1, measure(keyset_view, user, {}, repeat)),
+            ("keyset", page, measure(keyset_view, user, dict(cursor=cursor), repeat)),
+            ("limit/offset", 1, measure(offset_view, user, {}, repeat)),
+            (
+                "limit/offset",
+                page,
+                measure(offset_view, user, dict(offset=offset), repeat),
+            ),
+        ]
+        for name, page_number, p50 in results:
+            command.stdout.write(f"{name:>12} page {page_number:>6}: p50 {p50:.2f} ms")
+
+        transaction.set_rollback(True)
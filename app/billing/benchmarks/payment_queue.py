@@ -0,0 +1,95 @@
+"""Payment request latency, synchronous vs queued, and worker settle rate.
+
+Views are called in-process through APIRequestFactory. Queued payments are
+then settled in batches like the process_payments worker does, in one thread.
+"""
+import time
+
+from django.db import transaction
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from billing.benchmarks.utils import (
+    create_bench_wallet,
+    ensure_exchange_rates,
+    percentile,
+    stopwatch,
+    summarize,
+)
+from billing.constants import USD, EUR
+from billing.context import settle_queued_payments
+from billing.money import Money
+from billing.views import TransactionViewset
+
+
+def add_arguments(parser):
+    parser.add_argument(
+        "--payments", type=int, default=2000, help="Payments sent through each path"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=100, help="Queued payments settled at once"
+    )
+    parser.add_argument(
+        "--destinations", type=int, default=50, help="Distinct destination wallets"
+    )
+
+
+def post_payments(view, path, user, payment_data):
+    factory = APIRequestFactory()
+    samples = []
+    for data in payment_data:
+        request = factory.post(path, data, format="json")
+        force_authenticate(request, user=user)
+        with stopwatch(samples):
+            view(request)
+    return summarize(samples)
+
+
+def run(command, payments, batch_size, destinations, **options):
+    view = TransactionViewset.as_view({"post": "post"})
+
+    # Everything is rolled back at the end, the database is left untouched.
+    with transaction.atomic():
+        ensure_exchange_rates()
+        source_wallet = create_bench_wallet(USD, balance=Money.from_decimal(1000000000))
+        user = source_wallet.user
+        destination_ids = [
+            create_bench_wallet(USD if index % 2 else EUR).id
+            for index in range(destinations)
+        ]
+        payment_data = [
+            dict(
+                amount="1.00",
+                destination_wallet=destination_ids[index % destinations],
+                description=f"Benchmark payment #{index}",
+            )
+            for index in range(payments)
+        ]
+
+        for name, path in (
+            ("sync", "/api/transactions/"),
+            ("async", "/api/transactions/?async=true"),
+        ):
+            stats = post_payments(view, path, user, payment_data)
+            command.stdout.write(
+                f"{name:>5} request: mean {stats['mean_ms']:.3f} ms, "
+                f"p50 {stats['p50_ms']:.3f} ms, p99 {stats['p99_ms']:.3f} ms"
+            )
+
+        settled = []
+        started = time.perf_counter()
+        while True:
+            batch = settle_queued_payments(batch_size)
+            if not batch:
+                break
+            settled.extend(batch)
+        elapsed = time.perf_counter() - started
+        latencies = [
+            (payment.processed - payment.created).total_seconds() for payment in settled
+        ]
+        command.stdout.write(
+            f"worker ({batch_size} per batch): {len(settled) / elapsed:.0f} payments/s, "
+            f"queued to settled p50 {percentile(latencies, 50):.2f}s "
+            f"max {max(latencies):.2f}s"
+        )
+
+        transaction.set_rollback(True)
@@ -0,0 +1,81 @@
+"""Report export time and memory, rendered vs streamed vs aggregated.
+
+Python memory is traced with tracemalloc, which slows all modes down
+by the same factor. Rendered mode is skipped above --rendered-max entries.
+"""
+import time
+import tracemalloc
+
+from django.db import transaction
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from billing.benchmarks.utils import create_bench_wallet, seed_entries
+from billing.constants import USD, REPORT_GROUPS
+from billing.views import ReportView
+
+
+def add_arguments(parser):
+    parser.add_argument(
+        "--entries", type=int, default=10000000, help="Entries in the report"
+    )
+    parser.add_argument(
+        "--rendered-max",
+        type=int,
+        default=1000000,
+        help="Largest report to render without streaming",
+    )
+    parser.add_argument(
+        "--format", default="csv", choices=["json", "jsonl", "csv", "xml"]
+    )
+    parser.add_argument(
+        "--group-by",
+        default="day",
+        choices=REPORT_GROUPS,
+        help="Grouping of the aggregated report",
+    )
+
+
+def export(user, output_format, stream, group_by=None):
+    params = dict(
+        username=user.username,
+        format=output_format,
+        stream="true" if stream else "false",
+    )
+    if group_by:
+        params["group_by"] = group_by
+    request = APIRequestFactory().get("/api/report/", params)
+    force_authenticate(request, user=user)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    response = ReportView.as_view()(request)
+    if stream:
+        size = sum(len(chunk) for chunk in response.streaming_content)
+    else:
+        size = len(response.render().content)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, size
+
+
+def run(
+    command, entries, rendered_max, format, group_by, **options
+):  # pylint: disable=redefined-builtin
+    # Everything is rolled back at the end, the database is left untouched.
+    with transaction.atomic():
+        wallet = create_bench_wallet(USD)
+        seed_entries(wallet, entries)
+        command.stdout.write(f"Seeded {entries} entries")
+
+        modes = [("streamed", True, None), (f"group_by={group_by}", False, group_by)]
+        if entries <= rendered_max:
+            modes.insert(0, ("rendered", False, None))
+        for name, stream, mode_group_by in modes:
+            elapsed, peak, size = export(wallet.user, format, stream, mode_group_by)
+            command.stdout.write(
+                f"{name}: {elapsed:.1f}s, {entries / elapsed:.0f} rows/s, "
+                f"peak memory {peak / 2 ** 20:.1f} MB, output {size / 2 ** 20:.1f} MB"
+            )
+
+        transaction.set_rollback(True)
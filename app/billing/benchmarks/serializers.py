@@ -0,0 +1,88 @@
+"""Rows per second of DRF serializers vs the fast path for list and report rows.
+
+Rows are built in memory, no database is involved. Outputs of both
+paths are checked to be equal.
+"""
+import time
+from datetime import timedelta
+
+from django.utils import timezone
+
+from billing.constants import USD, EUR
+from billing.fast_serializers import (
+    FEED_COLUMNS,
+    REPORT_COLUMNS,
+    serialize_feed_row,
+    serialize_report_row,
+)
+from billing.models import FeedItem
+from billing.serializers import FeedItemSerializer, ReportSerializer
+from billing.utils import convert_amount
+
+
+def add_arguments(parser):
+    parser.add_argument("--rows", type=int, default=100000, help="Rows serialized")
+
+
+def make_rows(count):
+    """:return: tuple of (feed rows, FeedItem list, report rows, report dicts)"""
+    now = timezone.now()
+    feed_rows = []
+    report_rows = []
+    for index in range(count):
+        created = now - timedelta(seconds=index)
+        amount = index % 1000 * 100 + 50
+        feed_rows.append(
+            (
+                index,
+                index,
+                created,
+                f"Payment #{index}",
+                False,
+                index * 2,
+                -amount,
+                USD,
+                1,
+                index * 2 + 1,
+                convert_amount(amount, 90),
+                EUR,
+                2,
+            )
+        )
+        report_rows.append((index * 2, "bench", created, USD, -amount))
+
+    feed_items = [FeedItem(**dict(zip(FEED_COLUMNS, row))) for row in feed_rows]
+    report_dicts = [dict(zip(REPORT_COLUMNS, row)) for row in report_rows]
+    return feed_rows, feed_items, report_rows, report_dicts
+
+
+def measure(serialize, count):
+    """:return: tuple of (output, rows per second)"""
+    started = time.perf_counter()
+    data = serialize()
+    return data, count / (time.perf_counter() - started)
+
+
+def run(command, rows, **options):
+    feed_rows, feed_items, report_rows, report_dicts = make_rows(rows)
+    cases = [
+        (
+            "transactions",
+            lambda: FeedItemSerializer(feed_items, many=True).data,
+            lambda: [serialize_feed_row(row) for row in feed_rows],
+        ),
+        (
+            "report",
+            lambda: ReportSerializer(report_dicts, many=True).data,
+            lambda: [serialize_report_row(row) for row in report_rows],
+        ),
+    ]
+    for name, drf, fast in cases:
+        drf_data, drf_speed = measure(drf, rows)
+        fast_data, fast_speed = measure(fast, rows)
+        if drf_data != fast_data:
+            command.stderr.write(f"{name}: outputs differ")
+        command.stdout.write(
+            f"{name:>12}: DRF {drf_speed:,.0f} rows/s, fast {fast_speed:,.0f} rows/s, "
+            f"{fast_speed / drf_speed:.1f}x"
+        )
@@ -0,0 +1,138 @@
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date
+
+from django.db import connection
+
+from billing.cache import exchange_rate_cache
+from billing.constants import USD, EUR, CAD, CNY
+from billing.models import (
+    User,
+    Wallet,
+    ExchangeRate,
+    Transaction,
+    TransactionEntry,
+    FeedItem,
+)
+
+# Scaled by RATE_SCALE like ExchangeRate.rate
+BENCH_RATES = {
+    USD: 100,
+    EUR: 90,
+    CAD: 133,
+    CNY: 709,
+}
+
+
+def create_bench_wallet(currency, balance=0):
+    """Create a throwaway user with a wallet for benchmarking
+
+    :param currency: str
+    :param balance: int minor units
+    :return: Wallet
+    """
+    user = User.objects.create(username=f"bench_{uuid.uuid4().hex[:12]}")
+    return Wallet.objects.create(user=user, currency=currency, balance=balance)
+
+
+def delete_bench_wallets(wallets):
+    """Delete benchmark wallets with their users and transactions
+
+    :param wallets: list of Wallet
+    """
+    wallet_ids = [wallet.id for wallet in wallets]
+    Transaction.objects.filter(
+        id__in=TransactionEntry.objects.filter(wallet_id__in=wallet_ids).values(
+            "transaction_id"
+        )
+    ).delete()
+    User.objects.filter(wallet__id__in=wallet_ids).delete()
+
+
+def seed_entries(wallet, count):
+    """Adds `count` single entry transactions to the wallet with one SQL statement
+
+    Amounts alternate between 1.00 and -1.00, so the balance stays about the same,
+    every entry has its running balance. Transactions are created one second
+    apart, the last one now.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH seeded AS (
+                INSERT INTO {Transaction._meta.db_table} (created, description, is_top_up)
+                SELECT now() - make_interval(secs => %s - n), 'Benchmark seed', false
+                FROM generate_series(1, %s) AS n
+                RETURNING id, created, description
+            ), entries AS (
+                INSERT INTO {TransactionEntry._meta.db_table}
+                    (amount, balance_after, wallet_id, transaction_id)
+                SELECT amount, %s + SUM(amount) OVER (ORDER BY id), %s, id
+                FROM (
+                    SELECT id, CASE WHEN id %% 2 = 0 THEN 100 ELSE -100 END AS amount
+                    FROM seeded
+                ) amounts
+                RETURNING id, amount, balance_after, wallet_id, transaction_id
+            )
+            INSERT INTO {FeedItem._meta.db_table} (
+                wallet_id, entry_id, transaction_id, created, description,
+                is_top_up, amount, balance_after, currency
+            )
+            SELECT entries.wallet_id, entries.id, seeded.id, seeded.created,
+                seeded.description, false, entries.amount, entries.balance_after, %s
+            FROM entries JOIN seeded ON seeded.id = entries.transaction_id
+            """,
+            [count, count, wallet.balance, wallet.id, wallet.currency],
+        )
+        # Planner statistics have to know about the new rows.
+        cursor.execute(
+            f"ANALYZE {Transaction._meta.db_table}, {TransactionEntry._meta.db_table}, "
+            f"{FeedItem._meta.db_table}"
+        )
+
+
+def ensure_exchange_rates(for_date=None):
+    """Store fixed rates for the date if there are none, so nothing is downloaded"""
+    for_date = for_date or date.today()
+    if not ExchangeRate.objects.filter(date=for_date).exists():
+        ExchangeRate.objects.bulk_create(
+            [
+                ExchangeRate(
+                    from_currency=USD, to_currency=currency, rate=rate, date=for_date
+                )
+                for currency, rate in BENCH_RATES.items()
+            ]
+        )
+        exchange_rate_cache.invalidate(for_date)
+
+
+def percentile(samples, percent):
+    """Nearest-rank percentile of a list of numbers"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    """Latency summary in milliseconds for a list of durations in seconds"""
+    count = len(samples)
+    return dict(
+        count=count,
+        mean_ms=(sum(samples) / count * 1000) if count else 0.0,
+        p50_ms=percentile(samples, 50) * 1000,
+        p95_ms=percentile(samples, 95) * 1000,
+        p99_ms=percentile(samples, 99) * 1000,
+    )
+
+
+@contextmanager
+def stopwatch(samples):
+    """Append the duration of the block in seconds to `samples`"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        samples.append(time.perf_counter() - started)
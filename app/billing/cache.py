@@ -0,0 +1,80 @@
+import threading
+from datetime import date
+
+from billing.models import ExchangeRate
+from billing.utils import CrossRates
+
+
+class ExchangeRateCache:
+    """Per-process cache of stored exchange rates keyed by date and currency.
+
+    Rates for a date are loaded with one query on first use, together with
+    their precomputed CrossRates, and kept until the day rolls over,
+    when the whole cache is dropped. Dates without
+    stored rates are not cached, so freshly downloaded rates are picked up.
+    Saving or deleting an ExchangeRate invalidates the cache (see signals.py),
+    bulk writes have to call `invalidate` themselves.
+    """
+
+    max_dates = 64
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._day = date.today()
+        self._rates = {}
+
+    def get(self, for_date):
+        """Returns dict() of to_currency -> ExchangeRate for the date, in id order"""
+        return self._load(for_date)[0]
+
+    def get_cross_rates(self, for_date):
+        """Returns CrossRates for the date, None if no rates are stored"""
+        return self._load(for_date)[1]
+
+    def _load(self, for_date):
+        self._evict_if_day_changed()
+        cached = self._rates.get(for_date)
+        if cached is not None:
+            return cached
+
+        rates = {
+            exchange_rate.to_currency: exchange_rate
+            for exchange_rate in ExchangeRate.objects.filter(date=for_date).order_by(
+                "id"
+            )
+        }
+        if not rates:
+            return rates, None
+
+        cached = (
+            rates,
+            CrossRates(
+                {
+                    currency: exchange_rate.rate
+                    for currency, exchange_rate in rates.items()
+                }
+            ),
+        )
+        with self._lock:
+            if len(self._rates) >= self.max_dates:
+                self._rates.pop(next(iter(self._rates)))
+            self._rates[for_date] = cached
+        return cached
+
+    def invalidate(self, for_date=None):
+        """Drops cached rates for the date, or everything if no date given"""
+        with self._lock:
+            if for_date is None:
+                self._rates.clear()
+            else:
+                self._rates.pop(for_date, None)
+
+    def _evict_if_day_changed(self):
+        today = date.today()
+        if today != self._day:
+            with self._lock:
+                self._day = today
+                self._rates.clear()
+
+
+exchange_rate_cache = ExchangeRateCache()
@@ -5,3 +5,24 @@ CNY = "CNY"
 
 CURRENCIES = ((EUR, EUR), (USD, USD), (CAD, CAD), (CNY, CNY))
 SUPPORTED_CURRENCIES = (USD, EUR, CAD, CNY)
+
+MAX_BATCH_PAYMENTS = 10000
+
+# Statuses of payments queued with POST /api/transactions/?async=true
+PAYMENT_QUEUED = "queued"
+PAYMENT_COMPLETED = "completed"
+PAYMENT_FAILED = "failed"
+PAYMENT_STATUSES = (
+    (PAYMENT_QUEUED, PAYMENT_QUEUED),
+    (PAYMENT_COMPLETED, PAYMENT_COMPLETED),
+    (PAYMENT_FAILED, PAYMENT_FAILED),
+)
+# Rows fetched from the DB cursor at once when streaming reports
+REPORT_CHUNK_SIZE = 2000
+
+SUMMARY_PERIODS = ("day", "week", "month")
+
+# Longest period of a wallet statement, its entries are returned in one response
+STATEMENT_MAX_DAYS = 366
+
+REPORT_GROUPS = ("day", "week", "month", "currency")
@@ -1,17 +1,34 @@
+from collections import defaultdict
 from datetime import date
-from decimal import Decimal
 
-import requests
-
-from django.conf import settings
-from django.db import transaction
-from django.db.models import Sum
+from django.db import connection, transaction
+from django.db.models import Count, DateField, F, Max, Min, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
 from rest_framework import serializers
 
-from billing.models import Transaction, TransactionEntry, ExchangeRate
-from billing.constants import USD, SUPPORTED_CURRENCIES
-from billing.serializers import ExchangeRateSerializer, TransactionSerializer
-from billing.utils import calculate_currency_rate
+from billing.cache import exchange_rate_cache
+from billing.models import (
+    Transaction,
+    TransactionEntry,
+    Wallet,
+    ExchangeRate,
+    FeedItem,
+    DailyRollup,
+    QueuedPayment,
+)
+from billing.money import RATE_DECIMAL_PLACES, to_scaled_int
+from billing.rate_providers import get_rate_provider
+from billing.rate_refresh import RateRefresher
+from billing.constants import (
+    USD,
+    SUPPORTED_CURRENCIES,
+    PAYMENT_QUEUED,
+    PAYMENT_COMPLETED,
+    PAYMENT_FAILED,
+)
+from billing.serializers import TransactionSerializer
+from billing.utils import convert_amount
 
 
 def create_transaction_entry(attrs):
@@ -20,16 +37,103 @@ def create_transaction_entry(attrs):
     :param attrs: dict() with keys: transaction, amount, wallet
     :return: TransactionEntry
     """
-    entry = TransactionEntry.objects.create(**attrs)
+    wallet = attrs["wallet"]
+
+    # Update wallet balance incrementally with each entry.
+    # Must run inside the same DB transaction as the entry insert,
+    # otherwise balance and ledger can drift apart. The update locks the
+    # wallet row first, so balance_after follows the order of entries.
+    Wallet.objects.filter(id=wallet.id).update(
+        balance=F("balance") + attrs["amount"], version=F("version") + 1
+    )
+    wallet.refresh_from_db(fields=["balance", "version"])
+
+    return TransactionEntry.objects.create(balance_after=wallet.balance, **attrs)
+
+
+def create_feed_items(entries):
+    """Writes the wallet feed rows of new entries, see FeedItem
+
+    Must run in the DB transaction that created the entries.
+
+    :param entries: list of saved TransactionEntry with transaction and wallet set,
+        all entries of their transactions
+    """
+    entries_by_transaction = defaultdict(list)
+    for entry in entries:
+        entries_by_transaction[entry.transaction_id].append(entry)
+
+    feed_items = []
+    for entry in entries:
+        counterparty = next(
+            (
+                other
+                for other in entries_by_transaction[entry.transaction_id]
+                if other is not entry
+            ),
+            None,
+        )
+        feed_items.append(
+            FeedItem(
+                wallet_id=entry.wallet_id,
+                entry=entry,
+                transaction_id=entry.transaction_id,
+                created=entry.transaction.created,
+                description=entry.transaction.description,
+                is_top_up=entry.transaction.is_top_up,
+                amount=entry.amount,
+                balance_after=entry.balance_after,
+                currency=entry.wallet.currency,
+                counterparty_wallet_id=counterparty and counterparty.wallet_id,
+                counterparty_entry_id=counterparty and counterparty.id,
+                counterparty_amount=counterparty and counterparty.amount,
+                counterparty_currency=counterparty and counterparty.wallet.currency,
+            )
+        )
+    FeedItem.objects.bulk_create(feed_items)
 
-    # Update wallet balance after each entry creation.
-    wallet = entry.wallet
-    wallet.balance = TransactionEntry.objects.filter(wallet=wallet).aggregate(
-        Sum("amount")
-    )["amount__sum"]
-    wallet.save()
 
-    return entry
+def update_daily_rollups(entries, batch_size=1000):
+    """Adds new entries to the daily rollups of their wallets, see DailyRollup
+
+    Upserts one row per wallet and day, must run in the DB transaction
+    that created the entries.
+
+    :param entries: list of saved TransactionEntry with transaction and wallet set
+    :param batch_size: int rows per upsert
+    """
+    totals = defaultdict(lambda: [0, 0, 0])
+    for entry in entries:
+        key = (
+            entry.wallet_id,
+            timezone.localdate(entry.transaction.created),
+            entry.wallet.currency,
+        )
+        if entry.amount > 0:
+            totals[key][0] += entry.amount
+        else:
+            totals[key][1] -= entry.amount
+        totals[key][2] += 1
+    if not totals:
+        return
+
+    # Rows are locked in wallet order, the same order wallets are locked in.
+    rows = [key + tuple(values) for key, values in sorted(totals.items())]
+    table = DailyRollup._meta.db_table
+    with connection.cursor() as cursor:
+        for offset in range(0, len(rows), batch_size):
+            batch = rows[offset : offset + batch_size]
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (wallet_id, day, currency, inflow, outflow, entries_count)
+                VALUES {", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(batch))}
+                ON CONFLICT (wallet_id, day) DO UPDATE SET
+                    inflow = {table}.inflow + EXCLUDED.inflow,
+                    outflow = {table}.outflow + EXCLUDED.outflow,
+                    entries_count = {table}.entries_count + EXCLUDED.entries_count
+                """,
+                [value for row in batch for value in row],
+            )
 
 
 def create_transaction(transaction_attrs, entries):
@@ -43,10 +147,14 @@ def create_transaction(transaction_attrs, entries):
     # atomic to rollback if anything throws an exception
     with transaction.atomic():
         transaction_instance = Transaction.objects.create(**transaction_attrs)
-        for entry_data in entries:
+        entry_instances = [
             create_transaction_entry(
                 dict(transaction=transaction_instance, **entry_data)
             )
+            for entry_data in entries
+        ]
+        create_feed_items(entry_instances)
+        update_daily_rollups(entry_instances)
 
     return transaction_instance
 
@@ -57,21 +165,45 @@ def top_up_wallet(wallet, amount):
     Creates a Transaction with single TransactionEntry
 
     :param wallet: Wallet instance
-    :param amount: Decimal
+    :param amount: int minor units, see billing.money
     :return: Transaction
     """
-    return create_transaction(
-        transaction_attrs=dict(description="Top up", is_top_up=True),
-        entries=[dict(amount=abs(amount), wallet=wallet)],
-    )
+    with transaction.atomic():
+        # Lock before the transaction gets its `created` time, like payments do,
+        # so wallet feed order matches the order of balance changes.
+        lock_wallets([wallet.id])
+        return create_transaction(
+            transaction_attrs=dict(description="Top up", is_top_up=True),
+            entries=[dict(amount=abs(amount), wallet=wallet)],
+        )
+
+
+def lock_wallets(wallet_ids):
+    """Locks wallet rows until the end of the current DB transaction
+
+    Rows are always locked in id order, so concurrent payments touching
+    the same wallets wait for each other instead of deadlocking.
+
+    :param wallet_ids: iterable of Wallet ids
+    :return: dict() of Wallet id to locked Wallet
+    """
+    return {
+        wallet.id: wallet
+        for wallet in Wallet.objects.select_for_update()
+        .filter(id__in=set(wallet_ids))
+        .order_by("id")
+    }
 
 
 def send_payment(source_wallet, destination_wallet, amount, description):
     """Sends amount of money from source_wallet to destination_wallet
 
+    Both wallets are locked before the balance check,
+    raises ValidationError if source_wallet has not enough money.
+
     :param source_wallet: Wallet
     :param destination_wallet: Wallet
-    :param amount: Decimal
+    :param amount: int minor units
     :param description: str
     :return: Transaction
     """
@@ -82,38 +214,369 @@ def send_payment(source_wallet, destination_wallet, amount, description):
     destination_entry = dict(amount=amount, wallet=destination_wallet)
 
     if destination_wallet.currency != source_wallet.currency:
-        from_rate = (
-            find_exchange_rates(dict(to_currency=source_wallet.currency)).first().rate
+        rate = find_cross_rate(source_wallet.currency, destination_wallet.currency)
+        destination_entry["amount"] = convert_amount(amount, rate)
+
+    with transaction.atomic():
+        locked_wallets = lock_wallets([source_wallet.id, destination_wallet.id])
+        if locked_wallets[source_wallet.id].balance < amount:
+            raise serializers.ValidationError("More gold is needed.")
+
+        transaction_instance = create_transaction(
+            dict(description=description), entries=[source_entry, destination_entry]
         )
-        to_rate = (
-            find_exchange_rates(dict(to_currency=destination_wallet.currency))
-            .first()
-            .rate
+    return transaction_instance
+
+
+def send_payments(source_wallet, payments):
+    """Sends many independent payments from source_wallet at once
+
+    All touched wallets are locked and resolved with one query,
+    exchange rates come from the rate cache, entries are bulk inserted and every
+    touched wallet balance is updated with a single statement.
+    A failed payment doesn't affect the others.
+
+    :param source_wallet: Wallet
+    :param payments: list of dict() with keys: amount, destination_wallet (id), description
+    :return: list with Transaction or ValidationError for every payment, in order
+    """
+    results = []
+    transactions = []
+    entries = []
+    balance_deltas = defaultdict(int)
+    _, cross_rates = find_cross_rates()
+
+    with transaction.atomic():
+        # Lock every touched wallet up front, the balance can't change
+        # while the batch is checked and destinations are resolved at once.
+        destination_wallets = lock_wallets(
+            [source_wallet.id] + [payment["destination_wallet"] for payment in payments]
         )
-        destination_entry["amount"] = (
-            amount * calculate_currency_rate(base_rate=from_rate, target_rate=to_rate)
-        ).quantize(Decimal("1.00"))
+        balance = destination_wallets[source_wallet.id].balance
+
+        for payment in payments:
+            amount = abs(payment["amount"])
+            destination_wallet = destination_wallets.get(payment["destination_wallet"])
+            if not destination_wallet:
+                results.append(
+                    serializers.ValidationError(
+                        f"Wallet with id {payment['destination_wallet']} does not exist"
+                    )
+                )
+                continue
+            if balance < amount:
+                results.append(serializers.ValidationError("More gold is needed."))
+                continue
+
+            destination_amount = amount
+            if destination_wallet.currency != source_wallet.currency:
+                rate = cross_rates and cross_rates.get(
+                    source_wallet.currency, destination_wallet.currency
+                )
+                if rate is None:
+                    results.append(
+                        serializers.ValidationError(
+                            f"No exchange rate from '{source_wallet.currency}' "
+                            f"to '{destination_wallet.currency}' exists"
+                        )
+                    )
+                    continue
+                destination_amount = convert_amount(amount, rate)
+
+            balance -= amount
+            if destination_wallet.id == source_wallet.id:
+                balance += destination_amount
+            balance_deltas[source_wallet.id] -= amount
+            balance_deltas[destination_wallet.id] += destination_amount
+
+            transaction_instance = Transaction(description=payment["description"])
+            transactions.append(transaction_instance)
+            entries.append((transaction_instance, -amount, source_wallet))
+            entries.append(
+                (transaction_instance, destination_amount, destination_wallet)
+            )
+            results.append(transaction_instance)
+
+        Transaction.objects.bulk_create(transactions)
+        balances = {
+            wallet_id: wallet.balance
+            for wallet_id, wallet in destination_wallets.items()
+        }
+        entry_instances = []
+        for transaction_instance, amount, wallet in entries:
+            balances[wallet.id] += amount
+            entry_instances.append(
+                TransactionEntry(
+                    transaction=transaction_instance,
+                    amount=amount,
+                    balance_after=balances[wallet.id],
+                    wallet=wallet,
+                )
+            )
+        TransactionEntry.objects.bulk_create(entry_instances)
+        create_feed_items(entry_instances)
+        update_daily_rollups(entry_instances)
+        for wallet_id in sorted(balance_deltas):
+            Wallet.objects.filter(id=wallet_id).update(
+                balance=F("balance") + balance_deltas[wallet_id],
+                version=F("version") + 1,
+            )
+
+    source_wallet.refresh_from_db(fields=["balance", "version"])
+    return results
+
+
+def queue_payment(source_wallet, destination_wallet, amount, description):
+    """Queues a payment to be sent by the process_payments worker
+
+    The balance is checked when the payment is settled, see settle_queued_payments.
 
-    transaction_instance = create_transaction(
-        dict(description=description), entries=[source_entry, destination_entry]
+    :param source_wallet: Wallet
+    :param destination_wallet: Wallet
+    :param amount: int minor units
+    :param description: str
+    :return: QueuedPayment
+    """
+    return QueuedPayment.objects.create(
+        source_wallet=source_wallet,
+        destination_wallet=destination_wallet,
+        amount=abs(amount),
+        description=description,
     )
-    return transaction_instance
+
+
+def settle_queued_payments(batch_size):
+    """Sends a batch of the oldest queued payments in one DB transaction
+
+    Payments are claimed with SKIP LOCKED, so concurrent workers settle
+    different batches. Payments of every source wallet are sent together
+    with send_payments, a failed payment doesn't affect the others.
+
+    :param batch_size: int maximum number of payments settled
+    :return: list of settled QueuedPayment
+    """
+    # Warm up the rate cache before any lock is taken,
+    # missing rates mustn't be fetched while wallets are locked.
+    find_cross_rates()
+    with transaction.atomic():
+        payments = list(
+            QueuedPayment.objects.select_for_update(skip_locked=True)
+            .filter(status=PAYMENT_QUEUED)
+            .order_by("id")[:batch_size]
+        )
+        if not payments:
+            return payments
+
+        # Wallets of the whole batch are locked at once in id order, so workers
+        # settling overlapping batches wait for each other instead of deadlocking.
+        wallets = lock_wallets(
+            [payment.source_wallet_id for payment in payments]
+            + [payment.destination_wallet_id for payment in payments]
+        )
+        payments_by_source = defaultdict(list)
+        for payment in payments:
+            payments_by_source[payment.source_wallet_id].append(payment)
+
+        processed = timezone.now()
+        for source_wallet_id, source_payments in sorted(payments_by_source.items()):
+            outcomes = send_payments(
+                wallets[source_wallet_id],
+                [
+                    dict(
+                        amount=payment.amount,
+                        destination_wallet=payment.destination_wallet_id,
+                        description=payment.description,
+                    )
+                    for payment in source_payments
+                ],
+            )
+            for payment, outcome in zip(source_payments, outcomes):
+                payment.processed = processed
+                if isinstance(outcome, serializers.ValidationError):
+                    payment.status = PAYMENT_FAILED
+                    payment.error = " ".join(str(detail) for detail in outcome.detail)
+                else:
+                    payment.status = PAYMENT_COMPLETED
+                    payment.transaction = outcome
+        QueuedPayment.objects.bulk_update(
+            payments, ["status", "processed", "transaction", "error"]
+        )
+    return payments
+
+
+def find_payment_queue_depth():
+    """:return: int number of payments waiting to be settled"""
+    return QueuedPayment.objects.filter(status=PAYMENT_QUEUED).count()
+
+
+def find_queued_payments(filters):
+    """Finds payments queued from the wallet
+
+    :param filters: dict() with keys: wallet
+    :return: QuerySet of QueuedPayment
+    """
+    return QueuedPayment.objects.filter(source_wallet=filters["wallet"])
 
 
 def find_transactions(filters):
-    queryset = Transaction.objects.prefetch_related("entries__wallet").filter(
-        entries__wallet=filters["wallet"]
+    """Finds the wallet transactions list, one FeedItem per wallet entry
+
+    :param filters: dict() with keys: wallet
+    :return: QuerySet of FeedItem
+    """
+    return FeedItem.objects.filter(wallet=filters["wallet"])
+
+
+def find_wallet_balance(wallet, before):
+    """Finds the wallet balance right before the moment
+
+    Reads balance_after of the last earlier feed item, a single index lookup.
+
+    :param wallet: Wallet
+    :param before: datetime
+    :return: int minor units
+    """
+    balance = (
+        FeedItem.objects.filter(wallet=wallet, created__lt=before)
+        .order_by("-created", "-id")
+        .values_list("balance_after", flat=True)
+        .first()
+    )
+    return balance if balance is not None else 0
+
+
+def find_statement(filters):
+    """Finds wallet entries of a period with the balance before and after it
+
+    :param filters: dict() with keys: wallet, date_from, date_to
+    :return: dict() with keys: opening_balance, closing_balance,
+        entries (list of FeedItem, oldest first)
+    """
+    opening_balance = find_wallet_balance(filters["wallet"], filters["date_from"])
+    entries = list(
+        FeedItem.objects.filter(
+            wallet=filters["wallet"],
+            created__gte=filters["date_from"],
+            created__lte=filters["date_to"],
+        ).order_by("created", "id")
+    )
+    return dict(
+        opening_balance=opening_balance,
+        closing_balance=entries[-1].balance_after if entries else opening_balance,
+        entries=entries,
+    )
+
+
+def find_rollup_summary(filters):
+    """Sums daily rollups of the user wallet by day, week or month
+
+    :param filters: dict() with keys: username, period, optional: date_from, date_to
+    :return: QuerySet of dict() with keys: period, currency, total_inflow,
+        total_outflow, net, count
+    """
+    rollups = DailyRollup.objects.filter(wallet__user__username=filters["username"])
+
+    if filters.get("date_from"):
+        rollups = rollups.filter(day__gte=filters["date_from"])
+
+    if filters.get("date_to"):
+        rollups = rollups.filter(day__lte=filters["date_to"])
+
+    return (
+        rollups.annotate(
+            period=Trunc("day", filters["period"], output_field=DateField())
+        )
+        .values("period", "currency")
+        .annotate(
+            total_inflow=Sum("inflow"),
+            total_outflow=Sum("outflow"),
+            net=Sum("inflow") - Sum("outflow"),
+            count=Sum("entries_count"),
+        )
+        .order_by("period", "currency")
+    )
+
+
+def filter_report_entries(filters):
+    """
+    :param filters: dict() with keys: username, optional: date_from, date_to
+    :return: QuerySet of TransactionEntry
+    """
+    entries = TransactionEntry.objects.filter(
+        wallet__user__username=filters["username"]
+    )
+
+    if filters.get("date_from"):
+        entries = entries.filter(transaction__created__gte=filters["date_from"])
+
+    if filters.get("date_to"):
+        entries = entries.filter(transaction__created__lte=filters["date_to"])
+
+    return entries
+
+
+def find_report_summary(filters):
+    """Aggregates report entries in the database, one row per group
+
+    Days, weeks and months are in TIME_ZONE.
+
+    :param filters: dict() with keys: username, group_by (one of REPORT_GROUPS),
+        optional: date_from, date_to
+    :return: QuerySet of dict() with keys: currency, count, sum, min, max
+        and period (date) unless grouped by currency
+    """
+    entries = filter_report_entries(filters)
+    group_by = filters["group_by"]
+    keys = ["currency"]
+    if group_by != "currency":
+        entries = entries.annotate(
+            period=Trunc("transaction__created", group_by, output_field=DateField())
+        )
+        keys.insert(0, "period")
+
+    return (
+        entries.annotate(currency=F("wallet__currency"))
+        .values(*keys)
+        .annotate(
+            count=Count("id"), sum=Sum("amount"), min=Min("amount"), max=Max("amount")
+        )
+        .order_by(*keys)
+    )
+
+
+def find_report_entries(filters):
+    """Finds entries of the user wallet for a report, newest first
+
+    :param filters: dict() with keys: username, optional: date_from, date_to
+    :return: QuerySet of dict() with keys: id, username, created, currency, amount
+    """
+    return (
+        filter_report_entries(filters)
+        .order_by("-transaction__created", "-id")
+        .values(
+            "id",
+            "amount",
+            username=F("wallet__user__username"),
+            created=F("transaction__created"),
+            currency=F("wallet__currency"),
+        )
     )
-    return queryset
 
 
 def find_exchange_rates(filters=None):
+    """Finds USD based exchange rates, served from the per-process rate cache
+
+    :param filters: dict() with optional keys: for_date, to_currency
+    :return: list of ExchangeRate
+    """
     if not filters:
         filters = {}
 
-    for_date = filters.get("for_date", date.today())
+    for_date = filters.get("for_date") or date.today()
+    if isinstance(for_date, str):
+        for_date = date.fromisoformat(for_date)
 
-    queryset = ExchangeRate.objects.filter(date=for_date)
+    rates = exchange_rate_cache.get(for_date)
 
     to_currency = filters.get("to_currency")
 
@@ -122,39 +585,117 @@ def find_exchange_rates(filters=None):
             raise serializers.ValidationError(
                 f"to_currency must be one of the {SUPPORTED_CURRENCIES}"
             )
-        queryset = queryset.filter(to_currency=to_currency)
+        return [rates[to_currency]] if to_currency in rates else []
+
+    return list(rates.values())
 
-    return queryset
+
+def find_cross_rates(for_date=None):
+    """Finds CrossRates for the date without waiting for the rates provider
+
+    Missing rates are downloaded in background, meanwhile the latest
+    rates stored before the date are served.
+
+    :param for_date: date, today by default
+    :return: tuple of (rates date, CrossRates), (None, None) if nothing is stored
+    """
+    for_date = for_date or date.today()
+    cross_rates = exchange_rate_cache.get_cross_rates(for_date)
+    if cross_rates:
+        return for_date, cross_rates
+
+    rate_refresher.request(for_date)
+    latest_date = ExchangeRate.objects.filter(date__lte=for_date).aggregate(
+        Max("date")
+    )["date__max"]
+    if not latest_date:
+        return None, None
+    return latest_date, exchange_rate_cache.get_cross_rates(latest_date)
+
+
+def find_cross_rate(from_currency, to_currency, for_date=None):
+    """Finds rate from one currency to another, served from the rate cache
+
+    :param from_currency: str
+    :param to_currency: str
+    :param for_date: date, today by default
+    :return: int scaled rate, see billing.money
+    """
+    _, cross_rates = find_cross_rates(for_date)
+    rate = cross_rates and cross_rates.get(from_currency, to_currency)
+    if rate is None:
+        raise serializers.ValidationError(
+            f"No exchange rate from '{from_currency}' to '{to_currency}' exists"
+        )
+    return rate
 
 
 def download_exchange_rates(for_date):
-    response = requests.get(
-        f"{settings.EXCHANGE_RATES_URL}{for_date}?base={USD}&symbols={','.join(SUPPORTED_CURRENCIES)}"
-    )
-    return response.json()
+    return get_rate_provider().fetch(for_date)
+
+
+def build_exchange_rates(for_date, rates):
+    """Builds unsaved USD based ExchangeRate instances for supported currencies
+
+    :param for_date: date
+    :param rates: dict() of currency -> USD to currency rate
+    :return: list of ExchangeRate
+    """
+    return [
+        ExchangeRate(
+            rate=to_scaled_int(str(rate), RATE_DECIMAL_PLACES),
+            from_currency=USD,
+            to_currency=currency,
+            date=for_date,
+        )
+        for currency, rate in rates.items()
+        if currency in SUPPORTED_CURRENCIES
+    ]
+
+
+def store_exchange_rates(rates_by_date, batch_size=1000):
+    """Bulk inserts rates for dates that have none stored yet
+
+    :param rates_by_date: dict() of date -> dict() of currency -> USD to currency rate
+    :param batch_size: int rows per INSERT
+    :return: int number of stored rows
+    """
+    # Save all rates of a date at once, the rate cache only keeps complete dates.
+    with transaction.atomic():
+        # Another process could have stored them while we were downloading.
+        existing_dates = set(
+            ExchangeRate.objects.filter(date__in=list(rates_by_date)).values_list(
+                "date", flat=True
+            )
+        )
+        exchange_rates = [
+            exchange_rate
+            for for_date, rates in rates_by_date.items()
+            if for_date not in existing_dates
+            for exchange_rate in build_exchange_rates(for_date, rates)
+        ]
+        # The unique (date, currency) constraint drops rows stored concurrently
+        # between the check above and this insert.
+        ExchangeRate.objects.bulk_create(
+            exchange_rates, batch_size=batch_size, ignore_conflicts=True
+        )
+
+    # bulk_create doesn't send signals, invalidate the cache here.
+    exchange_rate_cache.invalidate()
+    return len(exchange_rates)
 
 
 def create_exchange_rates(for_date):
     data = download_exchange_rates(for_date)
-    serializer = ExchangeRateSerializer(
-        many=True,
-        data=[
-            dict(
-                rate=round(rate, 2),
-                from_currency=USD,
-                to_currency=currency,
-                date=for_date,
-            )
-            for currency, rate in data["rates"].items()
-        ],
-    )
-    serializer.is_valid(raise_exception=True)
-    serializer.save()
+    store_exchange_rates({for_date: data["rates"]})
 
 
 def update_exchange_rates_for_date_if_not_exist(for_date=None):
     if not for_date:
         for_date = date.today()
     # Download exchange rates for the current day on app startup
-    if not find_exchange_rates(dict(for_date=for_date)).exists():
+    if not find_exchange_rates(dict(for_date=for_date)):
         create_exchange_rates(for_date)
+
+
+rate_refresher = RateRefresher(update_exchange_rates_for_date_if_not_exist)
@@ -0,0 +1,92 @@
+"""Serialization of hot read paths without DRF field objects.
+
+Rows are `values_list()` tuples with columns in the order listed here,
+output is equal to the matching DRF serializer, key order included.
+"""
+from django.utils import timezone
+
+from billing.money import format_money
+
+# values_list() columns of FeedItem, output like FeedItemSerializer
+FEED_COLUMNS = (
+    "id",
+    "transaction_id",
+    "created",
+    "description",
+    "is_top_up",
+    "entry_id",
+    "amount",
+    "currency",
+    "wallet_id",
+    "counterparty_entry_id",
+    "counterparty_amount",
+    "counterparty_currency",
+    "counterparty_wallet_id",
+)
+
+# values_list() columns of report entries, output like ReportSerializer
+REPORT_COLUMNS = ("id", "username", "created", "currency", "amount")
+
+
+def format_datetime(value):
+    """Formats like DateTimeField with the default ISO 8601 format"""
+    value = timezone.localtime(value).isoformat()
+    if value.endswith("+00:00"):
+        value = value[:-6] + "Z"
+    return value
+
+
+def serialize_feed_row(row):
+    (
+        _,
+        transaction_id,
+        created,
+        description,
+        is_top_up,
+        entry_id,
+        amount,
+        currency,
+        wallet_id,
+        counterparty_entry_id,
+        counterparty_amount,
+        counterparty_currency,
+        counterparty_wallet_id,
+    ) = row
+    entries = [
+        {
+            "id": entry_id,
+            "amount": format_money(amount),
+            "currency": currency,
+            "wallet": wallet_id,
+        }
+    ]
+    if counterparty_entry_id:
+        counterparty = {
+            "id": counterparty_entry_id,
+            "amount": format_money(counterparty_amount),
+            "currency": counterparty_currency,
+            "wallet": counterparty_wallet_id,
+        }
+        # Entries in id order, like FeedItem.entries
+        if counterparty_entry_id < entry_id:
+            entries.insert(0, counterparty)
+        else:
+            entries.append(counterparty)
+    return {
+        "id": transaction_id,
+        "created": format_datetime(created),
+        "description": description,
+        "entries": entries,
+        "is_top_up": is_top_up,
+    }
+
+
+def serialize_report_row(row):
+    entry_id, username, created, currency, amount = row
+    return {
+        "id": str(entry_id),
+        "username": username,
+        "created": format_datetime(created),
+        "currency": currency,
+        "amount": format_money(amount),
+    }
@@ -0,0 +1,89 @@
+import json
+
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from billing.models import IdempotencyKey
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field("key").max_length
+
+
+def find_idempotency_key(user, key):
+    return IdempotencyKey.objects.filter(user=user, key=key).first()
+
+
+def claim_idempotency_key(user, key, path):
+    """Inserts the key unless it exists.
+
+    A request racing with an uncommitted insert of the same key waits
+    on the unique index until the other DB transaction ends.
+
+    :return: bool, True if the key was inserted
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {IdempotencyKey._meta.db_table} (user_id, key, path, created)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (user_id, key) DO NOTHING
+            RETURNING id
+            """,
+            [user.id, key, path, timezone.now()],
+        )
+        return cursor.fetchone() is not None
+
+
+def replay_response(stored, path):
+    if stored.path != path:
+        raise serializers.ValidationError(
+            {IDEMPOTENCY_KEY_HEADER: ["Key was already used for another request."]}
+        )
+    response = Response(json.loads(stored.response), status=stored.status_code)
+    if stored.location:
+        response["Location"] = stored.location
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def idempotent_response(request, handler):
+    """Runs the request handler once per user and Idempotency-Key header.
+
+    Repeated requests with the key get the stored response back after one
+    indexed read. The key is stored in the same DB transaction as the handler
+    writes, a failed request leaves no key and can be retried.
+    Requests without the header just run the handler.
+
+    :param request: Request of an authenticated user
+    :param handler: callable returning Response
+    :return: Response
+    """
+    key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+    if not key:
+        return handler()
+    if len(key) > MAX_KEY_LENGTH:
+        raise serializers.ValidationError(
+            {
+                IDEMPOTENCY_KEY_HEADER: [
+                    f"Ensure this value has at most {MAX_KEY_LENGTH} characters."
+                ]
+            }
+        )
+
+    stored = find_idempotency_key(request.user, key)
+    if stored is None:
+        with transaction.atomic():
+            if claim_idempotency_key(request.user, key, request.path):
+                response = handler()
+                IdempotencyKey.objects.filter(user=request.user, key=key).update(
+                    status_code=response.status_code,
+                    response=json.dumps(response.data, cls=JSONEncoder),
+                    location=response.get("Location"),
+                )
+                return response
+        # Lost the race, the other request has committed its response
+        stored = find_idempotency_key(request.user, key)
+    return replay_response(stored, request.path)
@@ -1,16 +1,367 @@
-from django.core.management.base import BaseCommand
+import io
+import multiprocessing
+import random
+import time
+import uuid
+from datetime import timedelta
 
-from billing.context import top_up_wallet, send_payment
-from billing.models import User
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.utils import timezone
+from psycopg2.extras import execute_values
+
+from billing.constants import SUPPORTED_CURRENCIES
+from billing.context import top_up_wallet, send_payment, find_cross_rates
+from billing.models import User, Wallet, Transaction, TransactionEntry, FeedItem
+from billing.money import Money
+from billing.utils import convert_amount
+
+TRANSACTION_COLUMNS = ("id", "created", "description", "is_top_up")
+ENTRY_COLUMNS = ("id", "amount", "balance_after", "wallet_id", "transaction_id")
+FEED_COLUMNS = (
+    "wallet_id",
+    "entry_id",
+    "transaction_id",
+    "created",
+    "description",
+    "is_top_up",
+    "amount",
+    "balance_after",
+    "currency",
+    "counterparty_wallet_id",
+    "counterparty_entry_id",
+    "counterparty_amount",
+    "counterparty_currency",
+)
+NULL = "\\N"
+
+
+def reserve_ids(model, count):
+    """Takes `count` ids from the table sequence at once
+
+    :return: int first reserved id
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+            "nextval(pg_get_serial_sequence(%s, 'id')) + %s - 1)",
+            [model._meta.db_table, model._meta.db_table, count],
+        )
+        return cursor.fetchone()[0] - count + 1
+
+
+def parse_wallet_counts(value):
+    """:param value: str like "USD=60000,EUR=40000"
+    :return: dict() currency: int number of wallets, in the given order
+    """
+    counts = {}
+    for item in value.split(","):
+        currency, _, count = item.partition("=")
+        if not count.strip().isdigit():
+            raise CommandError(
+                f"Wallets per currency must look like USD=100,EUR=50, got {item!r}"
+            )
+        counts[currency.strip()] = int(count)
+    return counts
+
+
+def deal_currencies(counts):
+    """Spreads wallets of every currency evenly over the sequence
+
+    Equal counts are dealt round robin, so every slice [index::workers]
+    gets every currency in its proportion.
+
+    :param counts: dict() currency: int number of wallets
+    :return: list of currencies, one per wallet
+    """
+    positions = [
+        ((index + 0.5) / count, order, currency)
+        for order, (currency, count) in enumerate(counts.items())
+        for index in range(count)
+    ]
+    return [currency for _, _, currency in sorted(positions)]
+
+
+def copy_rows(cursor, model, columns, rows):
+    buffer = io.StringIO()
+    buffer.writelines("\t".join(row) + "\n" for row in rows)
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY {model._meta.db_table} ({', '.join(columns)}) FROM STDIN", buffer
+    )
+
+
+class LedgerWriter:
+    """Writes transactions of one partition of wallets, see `generate_partition`
+
+    Transactions and entries get ids from reserved ranges, wallets keep
+    their running balances in cents, rows are sent with COPY in chunks.
+    """
+
+    def __init__(self, transaction_id, entry_id, balances, currencies, chunk_size):
+        self.transaction_id = transaction_id
+        self.entry_id = entry_id
+        self.balances = balances
+        self.currencies = currencies
+        self.chunk_size = chunk_size
+        self.counts = dict.fromkeys(balances, 0)
+        self.transactions = []
+        self.entries = []
+        self.feed_items = []
+
+    def add(self, created, description, is_top_up, legs):
+        """Adds a transaction
+
+        :param legs: list of (wallet id, amount in cents), one or two
+        """
+        created = created.isoformat()
+        is_top_up = "t" if is_top_up else "f"
+        self.transactions.append(
+            (str(self.transaction_id), created, description, is_top_up)
+        )
+        entries = []
+        for wallet_id, cents in legs:
+            self.balances[wallet_id] += cents
+            self.counts[wallet_id] += 1
+            entry = (
+                str(self.entry_id),
+                str(cents),
+                str(self.balances[wallet_id]),
+                str(wallet_id),
+                str(self.transaction_id),
+            )
+            entries.append(entry)
+            self.entry_id += 1
+        self.entries.extend(entries)
+
+        for index, (wallet_id, _) in enumerate(legs):
+            entry = entries[index]
+            counterparty = (NULL,) * 4
+            if len(legs) == 2:
+                other_wallet_id = legs[1 - index][0]
+                other = entries[1 - index]
+                counterparty = (
+                    other[3],
+                    other[0],
+                    other[1],
+                    self.currencies[other_wallet_id],
+                )
+            self.feed_items.append(
+                (
+                    entry[3],
+                    entry[0],
+                    entry[4],
+                    created,
+                    description,
+                    is_top_up,
+                    entry[1],
+                    entry[2],
+                    self.currencies[wallet_id],
+                )
+                + counterparty
+            )
+
+        self.transaction_id += 1
+        if len(self.transactions) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.transactions:
+            return
+        with connection.cursor() as cursor:
+            copy_rows(cursor, Transaction, TRANSACTION_COLUMNS, self.transactions)
+            copy_rows(cursor, TransactionEntry, ENTRY_COLUMNS, self.entries)
+            copy_rows(cursor, FeedItem, FEED_COLUMNS, self.feed_items)
+        self.transactions, self.entries, self.feed_items = [], [], []
+
+
+def generate_partition(task):
+    """Generates the history of one partition of wallets
+
+    Payments are made between wallets of the partition only, so every
+    partition keeps its own running balances and can run in its own process.
+
+    :param task: dict() with keys: wallets (list of (id, currency)), count,
+        transaction_id, entry_id, start, span, initial, skew, rates, seed, chunk_size,
+        skip_fk_checks
+    :return: int number of entries written
+    """
+    if task["skip_fk_checks"]:
+        # Rows are consistent by construction, foreign key triggers only slow COPY down
+        with connection.cursor() as cursor:
+            cursor.execute("SET session_replication_role = replica")
+    try:
+        return write_partition(task)
+    finally:
+        if task["skip_fk_checks"]:
+            with connection.cursor() as cursor:
+                cursor.execute("RESET session_replication_role")
+
+
+def write_partition(task):
+    randomizer = random.Random(task["seed"])
+    wallets = task["wallets"]
+    currencies = dict(wallets)
+    wallet_ids = [wallet_id for wallet_id, _ in wallets]
+    writer = LedgerWriter(
+        task["transaction_id"],
+        task["entry_id"],
+        dict.fromkeys(wallet_ids, 0),
+        currencies,
+        task["chunk_size"],
+    )
+
+    # Every wallet is funded right before the generated history
+    for wallet_id in wallet_ids:
+        writer.add(
+            task["start"] - timedelta(seconds=1),
+            "Top up",
+            True,
+            [(wallet_id, task["initial"])],
+        )
+
+    count = task["count"]
+    step = task["span"] / max(count, 1)
+    payments = 0
+    for index in range(count):
+        source_id = randomizer.choice(wallet_ids)
+        # Skew above 1 sends most payments to the first wallets of the partition
+        position = int(len(wallet_ids) * randomizer.random() ** task["skew"])
+        destination_id = wallet_ids[position]
+        if destination_id == source_id:
+            destination_id = wallet_ids[(position + 1) % len(wallet_ids)]
+        if not writer.balances[source_id]:
+            # Drained wallets get paid back instead
+            source_id, destination_id = destination_id, source_id
+        if not writer.balances[source_id]:
+            # Both are drained, another funded wallet pays
+            funded = [
+                wallet_id
+                for wallet_id in wallet_ids
+                if writer.balances[wallet_id] and wallet_id != destination_id
+            ]
+            if not funded:
+                continue
+            source_id = randomizer.choice(funded)
+        cents = min(randomizer.randint(100, 10000), writer.balances[source_id])
+        destination_cents = cents
+        source_currency = currencies[source_id]
+        destination_currency = currencies[destination_id]
+        if source_currency != destination_currency:
+            destination_cents = convert_amount(
+                cents, task["rates"][(source_currency, destination_currency)]
+            )
+        writer.add(
+            task["start"] + step * index,
+            f"Payment #{index}",
+            False,
+            [(source_id, -cents), (destination_id, destination_cents)],
+        )
+        payments += 1
+    writer.flush()
+
+    with connection.cursor() as cursor:
+        execute_values(
+            cursor.cursor,
+            f"""
+            UPDATE {Wallet._meta.db_table} wallet
+            SET balance = generated.balance, version = generated.version
+            FROM (VALUES %s) AS generated (id, balance, version)
+            WHERE wallet.id = generated.id
+            """,
+            [
+                (wallet_id, writer.balances[wallet_id], entries_count)
+                for wallet_id, entries_count in writer.counts.items()
+            ],
+            template="(%s, %s::bigint, %s)",
+            page_size=10000,
+        )
+    return len(wallet_ids) + payments * 2
+
+
+def generate_partition_process(task):
+    # Runs in a worker process with its own DB connection.
+    try:
+        return generate_partition(task)
+    finally:
+        connection.close()
 
 
 class Command(BaseCommand):
-    help = "Add transactions command to quickly create lots of transactions for testing purposes"
+    help = (
+        "Add transactions for testing purposes. Without --users makes 100 payments "
+        "between the first two users. With --users generates a synthetic ledger: "
+        "users with wallets, funding top-ups and payments between them are written "
+        "with COPY, optionally by several processes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--users", type=int, help="Users to create, one wallet each"
+        )
+        parser.add_argument(
+            "--currencies",
+            default=",".join(SUPPORTED_CURRENCIES),
+            help="Comma separated wallet currencies, the same number of wallets each",
+        )
+        parser.add_argument(
+            "--wallets-per-currency",
+            help="Wallets of every currency instead of --users and --currencies, "
+            "e.g. USD=60000,EUR=40000",
+        )
+        parser.add_argument(
+            "--transactions", type=int, default=100000, help="Payments to generate"
+        )
+        parser.add_argument(
+            "--days", type=int, default=365, help="Payments are spread over past days"
+        )
+        parser.add_argument(
+            "--skew",
+            type=float,
+            default=1.0,
+            help="1 picks receivers uniformly, higher values concentrate "
+            "payments on a few hot wallets",
+        )
+        parser.add_argument(
+            "--initial-balance",
+            type=Money.from_decimal,
+            default=Money.from_decimal("10000"),
+            help="Top up of every wallet before its payments",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=1, help="Processes writing the ledger"
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=50000,
+            help="Transactions sent per COPY",
+        )
+        parser.add_argument(
+            "--password",
+            default="password",
+            help="Password of generated users",
+        )
+        parser.add_argument(
+            "--skip-fk-checks",
+            action="store_true",
+            help="Don't check foreign keys of copied rows, several times faster. "
+            "Needs a DB superuser",
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Random seed")
 
     def handle(self, *args, **options):
+        if options["users"] is None and options["wallets_per_currency"] is None:
+            self.add_payments()
+        else:
+            self.generate(**options)
+
+    def add_payments(self):
         user1, user2 = User.objects.all()[:2]
-        top_up_wallet(user1.wallet, 1000)
-        top_up_wallet(user2.wallet, 2000)
+        top_up_wallet(user1.wallet, Money.from_decimal(1000))
+        top_up_wallet(user2.wallet, Money.from_decimal(2000))
         for x in range(100):
             source_wallet = user1.wallet
             destination_wallet = user2.wallet
@@ -19,6 +370,130 @@ class Command(BaseCommand):
             send_payment(
                 source_wallet=source_wallet,
                 destination_wallet=destination_wallet,
-                amount=x,
+                amount=Money.from_decimal(x),
                 description=f"Payment #{x}",
             )
+
+    def generate(self, users, currencies, transactions, days, workers, **options):
+        if options["wallets_per_currency"] is None:
+            currencies = [currency.strip() for currency in currencies.split(",")]
+            # Users are split evenly, the first currencies get the remainder
+            wallet_counts = {
+                currency: users // len(currencies) + (index < users % len(currencies))
+                for index, currency in enumerate(currencies)
+            }
+        elif users is not None:
+            raise CommandError("Pass either --users or --wallets-per-currency")
+        else:
+            wallet_counts = parse_wallet_counts(options["wallets_per_currency"])
+        currencies = list(wallet_counts)
+        users = sum(wallet_counts.values())
+        if set(currencies) - set(SUPPORTED_CURRENCIES):
+            raise CommandError(
+                f"Currencies must be any of: {', '.join(SUPPORTED_CURRENCIES)}"
+            )
+        if users < 2:
+            raise CommandError("At least 2 users are needed")
+        workers = max(1, min(workers, users // 2))
+
+        rates = {}
+        if len(currencies) > 1:
+            _, cross_rates = find_cross_rates()
+            if not cross_rates:
+                raise CommandError(
+                    "No exchange rates stored, run backfill_exchange_rates first"
+                )
+            rates = {
+                (source, destination): cross_rates.get(source, destination)
+                for source in currencies
+                for destination in currencies
+            }
+            missing = sorted(
+                {source for (source, _), rate in rates.items() if rate is None}
+            )
+            if missing:
+                # Checked before anything is written, a payment can't fail halfway
+                raise CommandError(
+                    f"No exchange rates stored for {', '.join(missing)}, "
+                    "run backfill_exchange_rates or pass --currencies without them"
+                )
+        started = time.perf_counter()
+
+        prefix = f"gen_{uuid.uuid4().hex[:8]}"
+        password = make_password(options["password"])
+        created_users = User.objects.bulk_create(
+            [
+                User(username=f"{prefix}_{index}", password=password)
+                for index in range(users)
+            ],
+            batch_size=10000,
+        )
+        wallets = Wallet.objects.bulk_create(
+            [
+                Wallet(user=user, currency=currency)
+                for user, currency in zip(created_users, deal_currencies(wallet_counts))
+            ],
+            batch_size=10000,
+        )
+
+        # Currencies are spread evenly, so every partition gets every currency
+        partitions = [
+            [(wallet.id, wallet.currency) for wallet in wallets[index::workers]]
+            for index in range(workers)
+        ]
+        counts = [transactions // workers] * workers
+        counts[0] += transactions - sum(counts)
+        transaction_id = reserve_ids(Transaction, users + transactions)
+        entry_id = reserve_ids(TransactionEntry, users + transactions * 2)
+        end = timezone.now()
+        start = end - timedelta(days=days)
+        tasks = []
+        for index, (partition, count) in enumerate(zip(partitions, counts)):
+            tasks.append(
+                dict(
+                    wallets=partition,
+                    count=count,
+                    transaction_id=transaction_id,
+                    entry_id=entry_id,
+                    start=start,
+                    span=end - start,
+                    initial=options["initial_balance"],
+                    skew=options["skew"],
+                    rates=rates,
+                    seed=options["seed"] + index,
+                    chunk_size=options["chunk_size"],
+                    skip_fk_checks=options["skip_fk_checks"],
+                )
+            )
+            transaction_id += len(partition) + count
+            entry_id += len(partition) + count * 2
+
+        if workers > 1:
+            # Children open their own DB connections
+            connections.close_all()
+            with multiprocessing.Pool(workers) as pool:
+                entries = sum(pool.map(generate_partition_process, tasks))
+        else:
+            entries = generate_partition(tasks[0])
+
+        # Planner statistics first, stale ones can make the rollup rebuild take minutes
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"ANALYZE {Transaction._meta.db_table}, "
+                f"{TransactionEntry._meta.db_table}, {FeedItem._meta.db_table}"
+            )
+        call_command(
+            "rebuild_rollups",
+            date_from=timezone.localdate(start) - timedelta(days=1),
+            date_to=timezone.localdate(end),
+            concurrency=workers,
+            stdout=self.stdout,
+        )
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated {users} users ({prefix}_*), {(users + entries) // 2} "
+                f"transactions and {entries} entries in {elapsed:.1f}s"
+            )
+        )
@@ -0,0 +1,123 @@
+import csv
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.constants import USD, EUR, SUPPORTED_CURRENCIES
+from billing.context import download_exchange_rates, store_exchange_rates
+from billing.models import ExchangeRate
+
+
+def read_ecb_csv(path, date_from=None, date_to=None):
+    """Reads EUR based rates from an ECB history file (eurofxref-hist.csv)
+
+    Header is `Date,USD,JPY,...`, missing rates are `N/A`.
+
+    :return: dict() of date -> dict() of currency -> USD to currency rate
+    """
+    rates_by_date = {}
+    with open(path, newline="") as csv_file:
+        for row in csv.DictReader(csv_file):
+            for_date = date.fromisoformat(row.pop("Date").strip())
+            if (date_from and for_date < date_from) or (date_to and for_date > date_to):
+                continue
+
+            eur_rates = {}
+            for currency, rate in row.items():
+                try:
+                    eur_rates[(currency or "").strip()] = Decimal(rate.strip())
+                except (InvalidOperation, AttributeError):
+                    continue  # N/A or empty trailing column
+            if USD not in eur_rates:
+                continue
+
+            # Rebase from EUR to USD.
+            usd_rate = eur_rates[USD]
+            eur_rates[EUR] = Decimal(1)
+            rates_by_date[for_date] = {
+                currency: eur_rates[currency] / usd_rate
+                for currency in SUPPORTED_CURRENCIES
+                if currency in eur_rates
+            }
+    return rates_by_date
+
+
+class Command(BaseCommand):
+    help = (
+        "Store exchange rates for a range of dates, downloading them concurrently "
+        "or reading an ECB-style CSV file. Dates already stored are skipped"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="date_from", type=date.fromisoformat)
+        parser.add_argument("--to", dest="date_to", type=date.fromisoformat)
+        parser.add_argument(
+            "--concurrency", type=int, default=8, help="Parallel downloads"
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=100,
+            help="Dates downloaded and inserted per chunk",
+        )
+        parser.add_argument(
+            "--file", help="Read rates from ECB-style CSV instead of downloading"
+        )
+
+    def handle(self, *args, **options):
+        date_from = options["date_from"]
+        date_to = options["date_to"] or date.today()
+        started = time.perf_counter()
+
+        if options["file"]:
+            stored = store_exchange_rates(
+                read_ecb_csv(options["file"], date_from, date_to)
+            )
+        else:
+            if not date_from:
+                raise CommandError("--from is required when downloading rates")
+            stored = self.download(
+                date_from, date_to, options["concurrency"], options["chunk_size"]
+            )
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Stored {stored} rates in {elapsed:.1f}s "
+                f"({stored / elapsed if elapsed else 0:.0f} rows/s)"
+            )
+        )
+
+    def download(self, date_from, date_to, concurrency, chunk_size):
+        existing_dates = set(
+            ExchangeRate.objects.filter(date__range=(date_from, date_to))
+            .values_list("date", flat=True)
+            .distinct()
+        )
+        missing_dates = [
+            date_from + timedelta(days=offset)
+            for offset in range((date_to - date_from).days + 1)
+            if date_from + timedelta(days=offset) not in existing_dates
+        ]
+        self.stdout.write(
+            f"{len(existing_dates)} dates already stored, "
+            f"downloading {len(missing_dates)}"
+        )
+
+        stored = 0
+        # Only downloads run in threads, rows are inserted from this thread.
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for offset in range(0, len(missing_dates), chunk_size):
+                chunk = missing_dates[offset : offset + chunk_size]
+                responses = executor.map(download_exchange_rates, chunk)
+                stored += store_exchange_rates(
+                    {
+                        for_date: response["rates"]
+                        for for_date, response in zip(chunk, responses)
+                    }
+                )
+                self.stdout.write(f"Stored rates up to {chunk[-1]}")
+        return stored
@@ -0,0 +1,37 @@
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+BENCHMARKS = {
+    "auth": "billing.benchmarks.auth",
+    "balance": "billing.benchmarks.balance",
+    "batch_payments": "billing.benchmarks.batch_payments",
+    "contention": "billing.benchmarks.contention",
+    "exchange_rates": "billing.benchmarks.exchange_rates",
+    "load": "billing.benchmarks.load",
+    "metrics": "billing.benchmarks.metrics",
+    "pagination": "billing.benchmarks.pagination",
+    "payment_queue": "billing.benchmarks.payment_queue",
+    "report": "billing.benchmarks.report",
+    "serializers": "billing.benchmarks.serializers",
+}
+
+
+class Command(BaseCommand):
+    help = "Run a performance benchmark. Use a scratch database, benchmarks create data"
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest="benchmark", required=True)
+        for name, module_path in BENCHMARKS.items():
+            module = import_module(module_path)
+            module.add_arguments(
+                subparsers.add_parser(name, help=module.__doc__.splitlines()[0])
+            )
+
+    def handle(self, *args, **options):
+        module = import_module(BENCHMARKS[options.pop("benchmark")])
+        # Views are called in-process with APIRequestFactory requests.
+        with override_settings(ALLOWED_HOSTS=settings.ALLOWED_HOSTS + ["testserver"]):
+            module.run(self, **options)
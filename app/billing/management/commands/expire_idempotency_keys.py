@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from billing.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Delete Idempotency-Key responses older than IDEMPOTENCY_KEY_TTL"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=10000,
+            help="Number of keys deleted per DB transaction",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+        expired = IdempotencyKey.objects.filter(created__lt=cutoff)
+
+        deleted = 0
+        while True:
+            # Short deletes by the created index, writers are never blocked for long
+            count, _ = IdempotencyKey.objects.filter(
+                id__in=expired.values("id")[: options["chunk_size"]]
+            ).delete()
+            if not count:
+                break
+            deleted += count
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired keys"))
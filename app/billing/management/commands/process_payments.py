@@ -0,0 +1,54 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from billing.constants import PAYMENT_FAILED
+from billing.context import find_payment_queue_depth, settle_queued_payments
+
+
+class Command(BaseCommand):
+    help = (
+        "Settle payments queued with POST /api/transactions/?async=true in batches. "
+        "Runs forever, waiting --interval seconds when the queue is empty, "
+        "unless --once is given. Several workers can run side by side"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.PAYMENT_QUEUE_BATCH_SIZE,
+            help="Queued payments settled per DB transaction",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.PAYMENT_QUEUE_POLL_INTERVAL,
+            help="Seconds to wait when the queue is empty",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Empty the queue once and exit"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            payments = settle_queued_payments(options["batch_size"])
+            if payments:
+                self.report(payments)
+            elif options["once"]:
+                break
+            else:
+                time.sleep(options["interval"])
+
+    def report(self, payments):
+        latencies = [
+            (payment.processed - payment.created).total_seconds()
+            for payment in payments
+        ]
+        failed = sum(payment.status == PAYMENT_FAILED for payment in payments)
+        self.stdout.write(
+            f"Settled {len(payments)} payments ({failed} failed), "
+            f"latency mean {sum(latencies) / len(latencies):.3f}s "
+            f"max {max(latencies):.3f}s, queue depth {find_payment_queue_depth()}"
+        )
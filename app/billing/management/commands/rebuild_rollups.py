@@ -0,0 +1,114 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from billing.models import Transaction, TransactionEntry, Wallet, DailyRollup
+
+REBUILD_ROLLUPS = f"""
+INSERT INTO {DailyRollup._meta.db_table}
+    (wallet_id, day, currency, inflow, outflow, entries_count)
+SELECT
+    entry.wallet_id,
+    (transaction.created AT TIME ZONE %s)::date,
+    wallet.currency,
+    COALESCE(SUM(entry.amount) FILTER (WHERE entry.amount > 0), 0),
+    COALESCE(-SUM(entry.amount) FILTER (WHERE entry.amount < 0), 0),
+    COUNT(*)
+FROM {TransactionEntry._meta.db_table} entry
+JOIN {Transaction._meta.db_table} transaction ON transaction.id = entry.transaction_id
+JOIN {Wallet._meta.db_table} wallet ON wallet.id = entry.wallet_id
+WHERE transaction.created >= %s AND transaction.created < %s
+GROUP BY 1, 2, 3
+"""
+
+
+def rebuild_rollups(day_from, day_to):
+    """Replaces rollups of the days with ones computed from entries
+
+    Payments add to rollups of the day they are made, see update_daily_rollups.
+    Rebuilding yesterday or later locks the rollups against them first, so every
+    payment is either in the rebuilt rows or added to them after the rebuild commits.
+    Older days are rebuilt without blocking payments.
+
+    :param day_from: date
+    :param day_to: date, included
+    :return: int number of stored rollups
+    """
+    start = timezone.make_aware(datetime.combine(day_from, datetime.min.time()))
+    end = timezone.make_aware(
+        datetime.combine(day_to + timedelta(days=1), datetime.min.time())
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        # A payment made just before midnight can commit the next day
+        if day_to >= timezone.localdate() - timedelta(days=1):
+            # Waits for payments that already wrote rollups and blocks new ones,
+            # doesn't conflict with reads
+            cursor.execute(
+                f"LOCK TABLE {DailyRollup._meta.db_table} IN SHARE ROW EXCLUSIVE MODE"
+            )
+        DailyRollup.objects.filter(day__range=(day_from, day_to)).delete()
+        cursor.execute(REBUILD_ROLLUPS, [settings.TIME_ZONE, start, end])
+        return cursor.rowcount
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute daily wallet rollups of a date range from transaction entries, "
+        "chunks of days are rebuilt in parallel. Payments wait while the chunk "
+        "with yesterday or today is rebuilt"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--from", dest="date_from", type=date.fromisoformat, required=True
+        )
+        parser.add_argument("--to", dest="date_to", type=date.fromisoformat)
+        parser.add_argument(
+            "--concurrency", type=int, default=4, help="Chunks rebuilt in parallel"
+        )
+        parser.add_argument(
+            "--chunk-days",
+            type=int,
+            default=7,
+            help="Days rebuilt per DB transaction",
+        )
+
+    def handle(self, *args, **options):
+        date_from = options["date_from"]
+        date_to = options["date_to"] or timezone.localdate()
+        if date_from > date_to:
+            raise CommandError("--from must not be after --to")
+        started = time.perf_counter()
+
+        chunk_days = options["chunk_days"]
+        chunks = []
+        chunk_start = date_from
+        while chunk_start <= date_to:
+            chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), date_to)
+            chunks.append((chunk_start, chunk_end))
+            chunk_start = chunk_end + timedelta(days=1)
+
+        if options["concurrency"] > 1:
+            with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+                stored = sum(executor.map(self.rebuild_chunk, chunks))
+        else:
+            stored = sum(rebuild_rollups(*chunk) for chunk in chunks)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt {stored} rollups of {len(chunks)} chunks in {elapsed:.1f}s"
+            )
+        )
+
+    def rebuild_chunk(self, chunk):
+        # Runs in a worker thread with its own DB connection.
+        try:
+            return rebuild_rollups(*chunk)
+        finally:
+            connection.close()
@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Sum, Value
+from django.db.models.functions import Coalesce
+
+from billing.models import Wallet
+from billing.money import format_money
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute wallet balances from their transaction entries "
+        "and repair the ones that drifted"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of wallets locked and checked per DB transaction",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report mismatched wallets, don't update them",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        dry_run = options["dry_run"]
+
+        checked = repaired = 0
+        last_id = 0
+        while True:
+            with transaction.atomic():
+                # Lock the chunk so concurrent payments wait until it's repaired,
+                # entries committed before the lock is taken are included in the sum.
+                wallet_ids = list(
+                    Wallet.objects.select_for_update()
+                    .filter(id__gt=last_id)
+                    .order_by("id")
+                    .values_list("id", flat=True)[:chunk_size]
+                )
+                if not wallet_ids:
+                    break
+                last_id = wallet_ids[-1]
+
+                wallets = Wallet.objects.filter(id__in=wallet_ids).annotate(
+                    ledger_balance=Coalesce(Sum("transactionentry__amount"), Value(0))
+                )
+                for wallet in wallets:
+                    checked += 1
+                    if wallet.balance == wallet.ledger_balance:
+                        continue
+                    repaired += 1
+                    self.stdout.write(
+                        f"Wallet {wallet.id}: stored {format_money(wallet.balance)}, "
+                        f"ledger {format_money(wallet.ledger_balance)}"
+                    )
+                    if not dry_run:
+                        Wallet.objects.filter(id=wallet.id).update(
+                            balance=wallet.ledger_balance, version=F("version") + 1
+                        )
+
+        action = "found" if dry_run else "repaired"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Checked {checked} wallets, {action} {repaired} mismatched balances"
+            )
+        )
@@ -0,0 +1,45 @@
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from billing.context import update_exchange_rates_for_date_if_not_exist
+
+
+class Command(BaseCommand):
+    help = (
+        "Download exchange rates for today and upcoming days before they are needed. "
+        "Runs forever, checking every --interval seconds, unless --once is given"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=settings.EXCHANGE_RATES_REFRESH_INTERVAL,
+            help="Seconds between checks",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.EXCHANGE_RATES_PREFETCH_DAYS,
+            help="Days after today to fetch in advance",
+        )
+        parser.add_argument("--once", action="store_true", help="Check once and exit")
+
+    def handle(self, *args, **options):
+        while True:
+            today = date.today()
+            for offset in range(options["days"] + 1):
+                for_date = today + timedelta(days=offset)
+                try:
+                    update_exchange_rates_for_date_if_not_exist(for_date)
+                except Exception as error:  # pylint: disable=broad-except
+                    # Try again on the next check, stored rates are served meanwhile.
+                    self.stderr.write(
+                        f"Failed to refresh rates for {for_date}: {error}"
+                    )
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,83 @@
+import io
+import os
+import pstats
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from billing.profiling import parse_profile_name
+
+SORT_KEYS = ("cumulative", "tottime", "ncalls")
+
+
+class Command(BaseCommand):
+    help = (
+        "List request profiles captured in PROFILE_DIR, "
+        "or show functions of the selected profiles by cumulative time"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "profiles",
+            nargs="*",
+            help="Profiles to show, X-Profile-Id header values or file names",
+        )
+        parser.add_argument("--view", help="Only profiles of this URL name")
+        parser.add_argument(
+            "--min-duration",
+            type=int,
+            default=0,
+            help="Only profiles of requests slower than this, ms",
+        )
+        parser.add_argument(
+            "--summary",
+            action="store_true",
+            help="Show functions of all the listed profiles added together",
+        )
+        parser.add_argument(
+            "--sort", choices=SORT_KEYS, default="cumulative", help="Function order"
+        )
+        parser.add_argument(
+            "--limit", type=int, default=30, help="Number of functions shown"
+        )
+
+    def find_profiles(self, keys, view, min_duration):
+        """:return: list of (file path, dict() of parse_profile_name), newest first"""
+        if not os.path.isdir(settings.PROFILE_DIR):
+            return []
+        found = []
+        for file_name in sorted(os.listdir(settings.PROFILE_DIR), reverse=True):
+            name, extension = os.path.splitext(file_name)
+            if extension != ".prof":
+                continue
+            if keys and not any(name.startswith(key) for key in keys):
+                continue
+            info = parse_profile_name(name)
+            if view and info["view"] != view:
+                continue
+            if info["duration_ms"] < min_duration:
+                continue
+            found.append((os.path.join(settings.PROFILE_DIR, file_name), info))
+        return found
+
+    def handle(self, *args, **options):
+        keys = [os.path.splitext(key)[0] for key in options["profiles"]]
+        found = self.find_profiles(keys, options["view"], options["min_duration"])
+        if not found:
+            self.stdout.write(f"No profiles in {settings.PROFILE_DIR}")
+            return
+
+        if not keys and not options["summary"]:
+            for path, info in found:
+                self.stdout.write(
+                    f"{info['created']:%Y-%m-%d %H:%M:%S} {info['duration_ms']:>7} ms "
+                    f"{info['method']:>6} {info['status']} {info['view']:<20} "
+                    f"{os.path.basename(path)}"
+                )
+            return
+
+        output = io.StringIO()
+        stats = pstats.Stats(*[path for path, _ in found], stream=output)
+        stats.strip_dirs().sort_stats(options["sort"]).print_stats(options["limit"])
+        self.stdout.write(f"{len(found)} profiles")
+        self.stdout.write(output.getvalue())
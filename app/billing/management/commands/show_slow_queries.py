@@ -0,0 +1,61 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "List slow queries captured in SLOW_QUERY_DIR, slowest first, "
+        "or show the SQL, parameters, location and plan of some"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("fingerprints", nargs="*", help="Queries to show")
+        parser.add_argument(
+            "--location", help="Only queries run from here, e.g. find_transactions"
+        )
+
+    def load_captures(self, fingerprints, location):
+        if not os.path.isdir(settings.SLOW_QUERY_DIR):
+            return []
+        captures = []
+        for file_name in os.listdir(settings.SLOW_QUERY_DIR):
+            key, extension = os.path.splitext(file_name)
+            if extension != ".json":
+                continue
+            if fingerprints and key not in fingerprints:
+                continue
+            with open(os.path.join(settings.SLOW_QUERY_DIR, file_name)) as capture_file:
+                capture = json.load(capture_file)
+            if location and not any(location in name for name in capture["location"]):
+                continue
+            captures.append(capture)
+        return sorted(captures, key=lambda capture: -capture["duration_ms"])
+
+    def handle(self, *args, **options):
+        captures = self.load_captures(options["fingerprints"], options["location"])
+        if not captures:
+            self.stdout.write(f"No slow queries in {settings.SLOW_QUERY_DIR}")
+            return
+
+        if not options["fingerprints"]:
+            for capture in captures:
+                origin = capture["location"][-1] if capture["location"] else "-"
+                sql = " ".join(capture["sql"].split())
+                self.stdout.write(
+                    f"{capture['duration_ms']:>10.1f} ms {capture['fingerprint']} "
+                    f"{origin:<50} {sql[:60]}"
+                )
+            return
+
+        for capture in captures:
+            self.stdout.write(
+                f"{capture['fingerprint']}, {capture['duration_ms']} ms "
+                f"at {capture['captured']}\n"
+                f"Location: {' > '.join(capture['location']) or '-'}\n"
+                f"SQL: {capture['sql']}\n"
+                f"Parameters: {capture['params']}\n"
+                f"{capture['plan']}\n"
+            )
@@ -0,0 +1,133 @@
+"""Request latency, SQL query count and SQL time per URL name in Prometheus format.
+
+uWSGI workers are separate processes. When PROMETHEUS_MULTIPROC_DIR is set
+(see uwsgi.ini) every worker writes its samples to memory mapped files in
+that directory and /metrics/ sums the files of all workers.
+"""
+import ipaddress
+import os
+import time
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import connection
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.multiprocess import MultiProcessCollector
+
+LABELS = ("view", "method", "status")
+# Requests not matching any URL share one label, so scanners can't add series
+UNRESOLVED = "unresolved"
+
+REQUEST_DURATION = Histogram(
+    "billing_request_duration_seconds",
+    "Time to respond to a request",
+    LABELS,
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+REQUEST_QUERIES = Histogram(
+    "billing_request_queries",
+    "SQL queries made by a request",
+    LABELS,
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144),
+)
+REQUEST_SQL_DURATION = Histogram(
+    "billing_request_sql_duration_seconds",
+    "Time a request spent in SQL queries",
+    LABELS,
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 10),
+)
+
+
+class QueryTimer:
+    """Database execute wrapper counting queries and their time"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+class MetricsMiddleware:
+    """Records latency and SQL of every request, keep it first in MIDDLEWARE.
+
+    Queries of streaming responses, e.g. reports, are made while the
+    response is sent, they're recorded when the stream ends.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        queries = QueryTimer()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+
+        def record():
+            match = request.resolver_match
+            labels = (
+                match.url_name if match and match.url_name else UNRESOLVED,
+                request.method,
+                response.status_code,
+            )
+            REQUEST_DURATION.labels(*labels).observe(time.perf_counter() - started)
+            REQUEST_QUERIES.labels(*labels).observe(queries.count)
+            REQUEST_SQL_DURATION.labels(*labels).observe(queries.duration)
+
+        if response.streaming:
+            response.streaming_content = stream(
+                response.streaming_content, queries, record
+            )
+        else:
+            record()
+        return response
+
+
+def stream(content, queries, record):
+    try:
+        with connection.execute_wrapper(queries):
+            yield from content
+    finally:
+        record()
+
+
+def is_allowed_client(address):
+    """:return: bool, True if address is in one of METRICS_ALLOWED_NETWORKS"""
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(
+        address in ipaddress.ip_network(network.strip(), strict=False)
+        for network in settings.METRICS_ALLOWED_NETWORKS
+        if network.strip()
+    )
+
+
+def metrics(request):
+    """Metrics of all workers in Prometheus text format
+
+    Served to METRICS_ALLOWED_NETWORKS only. The peer address is checked,
+    not X-Forwarded-For, which any client can send.
+    """
+    if not is_allowed_client(request.META.get("REMOTE_ADDR", "")):
+        raise PermissionDenied
+    registry = REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("billing", "0004_auto_20190918_1401")]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                fields=["-created", "-id"], name="transaction_created_id_idx"
+            ),
+        )
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicate_exchange_rates(apps, schema_editor):
+    """Rates used to be downloaded twice by concurrent requests, keep the first"""
+    ExchangeRate = apps.get_model("billing", "ExchangeRate")
+    duplicates = (
+        ExchangeRate.objects.values("date", "to_currency", "from_currency")
+        .annotate(first_id=Min("id"), count=models.Count("id"))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        ExchangeRate.objects.filter(
+            date=duplicate["date"],
+            to_currency=duplicate["to_currency"],
+            from_currency=duplicate["from_currency"],
+        ).exclude(id=duplicate["first_id"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("billing", "0005_transaction_created_id_idx")]
+
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_exchange_rates, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name="exchangerate",
+            constraint=models.UniqueConstraint(
+                fields=["date", "to_currency", "from_currency"],
+                name="exchange_rate_date_currency_uniq",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="transactionentry",
+            index=models.Index(
+                fields=["wallet", "transaction"], name="entry_wallet_transaction_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,122 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+# One feed row per existing entry, the counterparty is the other entry
+# of the same transaction.
+BACKFILL_FEED = """
+INSERT INTO billing_feeditem (
+    wallet_id, entry_id, transaction_id, created, description, is_top_up,
+    amount, currency, counterparty_wallet_id, counterparty_entry_id,
+    counterparty_amount, counterparty_currency
+)
+SELECT
+    entry.wallet_id, entry.id, entry.transaction_id, transaction.created,
+    transaction.description, transaction.is_top_up, entry.amount, wallet.currency,
+    other.wallet_id, other.id, other.amount, other_wallet.currency
+FROM billing_transactionentry entry
+JOIN billing_transaction transaction ON transaction.id = entry.transaction_id
+JOIN billing_wallet wallet ON wallet.id = entry.wallet_id
+LEFT JOIN billing_transactionentry other
+    ON other.transaction_id = entry.transaction_id AND other.id <> entry.id
+LEFT JOIN billing_wallet other_wallet ON other_wallet.id = other.wallet_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("billing", "0006_ledger_indexes")]
+
+    operations = [
+        migrations.CreateModel(
+            name="FeedItem",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created", models.DateTimeField()),
+                (
+                    "description",
+                    models.CharField(blank=True, max_length=255, null=True),
+                ),
+                ("is_top_up", models.BooleanField(default=False)),
+                ("amount", models.DecimalField(decimal_places=2, max_digits=20)),
+                (
+                    "currency",
+                    models.CharField(
+                        choices=[
+                            ("EUR", "EUR"),
+                            ("USD", "USD"),
+                            ("CAD", "CAD"),
+                            ("CNY", "CNY"),
+                        ],
+                        max_length=3,
+                    ),
+                ),
+                ("counterparty_entry_id", models.IntegerField(null=True)),
+                (
+                    "counterparty_amount",
+                    models.DecimalField(decimal_places=2, max_digits=20, null=True),
+                ),
+                (
+                    "counterparty_currency",
+                    models.CharField(
+                        choices=[
+                            ("EUR", "EUR"),
+                            ("USD", "USD"),
+                            ("CAD", "CAD"),
+                            ("CNY", "CNY"),
+                        ],
+                        max_length=3,
+                        null=True,
+                    ),
+                ),
+                (
+                    "counterparty_wallet",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="billing.Wallet",
+                    ),
+                ),
+                (
+                    "entry",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="feed_item",
+                        to="billing.TransactionEntry",
+                    ),
+                ),
+                (
+                    "transaction",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="feed_items",
+                        to="billing.Transaction",
+                    ),
+                ),
+                (
+                    "wallet",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="feed",
+                        to="billing.Wallet",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="feeditem",
+            index=models.Index(
+                fields=["wallet", "-created", "-id"], name="feed_wallet_created_idx"
+            ),
+        ),
+        migrations.RunSQL(BACKFILL_FEED, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,62 @@
+from django.db import migrations, models, transaction
+
+# Wallets backfilled per DB transaction, keeps row locks short on big ledgers
+WALLETS_PER_CHUNK = 500
+
+BACKFILL_ENTRIES = """
+UPDATE billing_transactionentry entry
+SET balance_after = running.balance
+FROM (
+    SELECT
+        entry.id,
+        SUM(entry.amount) OVER (
+            PARTITION BY entry.wallet_id ORDER BY transaction.created, entry.id
+        ) AS balance
+    FROM billing_transactionentry entry
+    JOIN billing_transaction transaction ON transaction.id = entry.transaction_id
+    WHERE entry.wallet_id = ANY(%s)
+) running
+WHERE entry.id = running.id AND entry.balance_after IS NULL
+"""
+
+BACKFILL_FEED = """
+UPDATE billing_feeditem feed
+SET balance_after = entry.balance_after
+FROM billing_transactionentry entry
+WHERE entry.id = feed.entry_id
+    AND feed.wallet_id = ANY(%s)
+    AND feed.balance_after IS NULL
+"""
+
+
+def backfill_balance_after(apps, schema_editor):
+    """Running sum of every wallet history, wallets start with zero balance"""
+    Wallet = apps.get_model("billing", "Wallet")
+    wallet_ids = list(Wallet.objects.order_by("id").values_list("id", flat=True))
+    for offset in range(0, len(wallet_ids), WALLETS_PER_CHUNK):
+        chunk = wallet_ids[offset : offset + WALLETS_PER_CHUNK]
+        with transaction.atomic(), schema_editor.connection.cursor() as cursor:
+            cursor.execute(BACKFILL_ENTRIES, [chunk])
+            cursor.execute(BACKFILL_FEED, [chunk])
+
+
+class Migration(migrations.Migration):
+
+    # Every chunk is committed on its own
+    atomic = False
+
+    dependencies = [("billing", "0007_feeditem")]
+
+    operations = [
+        migrations.AddField(
+            model_name="transactionentry",
+            name="balance_after",
+            field=models.DecimalField(decimal_places=2, max_digits=20, null=True),
+        ),
+        migrations.AddField(
+            model_name="feeditem",
+            name="balance_after",
+            field=models.DecimalField(decimal_places=2, max_digits=20, null=True),
+        ),
+        migrations.RunPython(backfill_balance_after, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,14 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("billing", "0009_dailyrollup")]
+
+    operations = [
+        migrations.AddField(
+            model_name="wallet",
+            name="version",
+            field=models.PositiveIntegerField(default=0),
+        )
+    ]
@@ -0,0 +1,77 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("billing", "0011_idempotencykey")]
+
+    operations = [
+        migrations.CreateModel(
+            name="QueuedPayment",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("amount", models.DecimalField(decimal_places=2, max_digits=20)),
+                (
+                    "description",
+                    models.CharField(blank=True, max_length=255, null=True),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "queued"),
+                            ("completed", "completed"),
+                            ("failed", "failed"),
+                        ],
+                        default="queued",
+                        max_length=9,
+                    ),
+                ),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("processed", models.DateTimeField(null=True)),
+                ("error", models.CharField(max_length=255, null=True)),
+                (
+                    "destination_wallet",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="billing.Wallet",
+                    ),
+                ),
+                (
+                    "source_wallet",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="queued_payments",
+                        to="billing.Wallet",
+                    ),
+                ),
+                (
+                    "transaction",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="billing.Transaction",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="queuedpayment",
+            index=models.Index(
+                condition=models.Q(status="queued"),
+                fields=["id"],
+                name="queued_payment_pending_idx",
+            ),
+        ),
+    ]
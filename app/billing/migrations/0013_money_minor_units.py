@@ -0,0 +1,53 @@
+from django.db import migrations, models
+
+# Amounts become minor units and rates hundredths, both were 2 decimal places
+SCALE = 100
+
+# table: [(model name, column, field), ...]
+COLUMNS = {
+    "billing_wallet": [("wallet", "balance", models.BigIntegerField(default=0))],
+    "billing_exchangerate": [
+        ("exchangerate", "rate", models.BigIntegerField(default=0))
+    ],
+    "billing_transactionentry": [
+        ("transactionentry", "amount", models.BigIntegerField()),
+        ("transactionentry", "balance_after", models.BigIntegerField(null=True)),
+    ],
+    "billing_feeditem": [
+        ("feeditem", "amount", models.BigIntegerField()),
+        ("feeditem", "balance_after", models.BigIntegerField(null=True)),
+        ("feeditem", "counterparty_amount", models.BigIntegerField(null=True)),
+    ],
+    "billing_dailyrollup": [
+        ("dailyrollup", "inflow", models.BigIntegerField(default=0)),
+        ("dailyrollup", "outflow", models.BigIntegerField(default=0)),
+    ],
+    "billing_queuedpayment": [("queuedpayment", "amount", models.BigIntegerField())],
+}
+
+
+def alter_columns(table, columns):
+    """All columns of a table are converted in one ALTER TABLE, one table rewrite"""
+    return migrations.RunSQL(
+        f"ALTER TABLE {table} "
+        + ", ".join(
+            f"ALTER COLUMN {column} TYPE bigint USING round({column} * {SCALE})::bigint"
+            for _, column, _ in columns
+        ),
+        f"ALTER TABLE {table} "
+        + ", ".join(
+            f"ALTER COLUMN {column} TYPE numeric(20, 2) USING {column}::numeric / {SCALE}"
+            for _, column, _ in columns
+        ),
+        state_operations=[
+            migrations.AlterField(model_name=model_name, name=column, field=field)
+            for model_name, column, field in columns
+        ],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("billing", "0012_queuedpayment")]
+
+    operations = [alter_columns(table, columns) for table, columns in COLUMNS.items()]
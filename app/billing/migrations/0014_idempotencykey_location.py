@@ -0,0 +1,14 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("billing", "0013_money_minor_units")]
+
+    operations = [
+        migrations.AddField(
+            model_name="idempotencykey",
+            name="location",
+            field=models.CharField(max_length=2048, null=True),
+        )
+    ]
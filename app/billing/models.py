@@ -1,7 +1,8 @@
 from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
 
-from billing.constants import CURRENCIES
+from billing.constants import CURRENCIES, PAYMENT_STATUSES, PAYMENT_QUEUED
+from billing.money import RATE_DECIMAL_PLACES, format_money, to_decimal
 
 
 class UserManagerWithRelations(UserManager):
@@ -17,12 +18,18 @@ class User(AbstractUser):
 
 
 class Wallet(models.Model):
-    balance = models.DecimalField(decimal_places=2, max_digits=20, default=0)
+    # Amounts are in minor units, see billing.money
+    balance = models.BigIntegerField(default=0)
     user = models.OneToOneField(User, related_name="wallet", on_delete=models.CASCADE)
     currency = models.CharField(max_length=3, choices=CURRENCIES)
+    # Incremented with every balance change, used as the wallet ETag
+    version = models.PositiveIntegerField(default=0)
 
     def __str__(self):
-        return f"{self.user.username}'s wallet, balance: {self.balance} {self.currency}"
+        return (
+            f"{self.user.username}'s wallet, "
+            f"balance: {format_money(self.balance)} {self.currency}"
+        )
 
 
 class Transaction(models.Model):
@@ -39,6 +46,10 @@ class Transaction(models.Model):
 
     class Meta:
         ordering = ["-created"]
+        indexes = [
+            # Keyset pagination, see billing.pagination.KeysetPagination
+            models.Index(fields=["-created", "-id"], name="transaction_created_id_idx")
+        ]
 
     def __str__(self):
         return (
@@ -54,13 +65,24 @@ class ExchangeRate(models.Model):
     date = models.DateField()
     from_currency = models.CharField(max_length=3, choices=CURRENCIES)
     to_currency = models.CharField(max_length=3, choices=CURRENCIES)
-    rate = models.DecimalField(decimal_places=2, max_digits=20, default=0)
+    # Scaled by billing.money.RATE_SCALE, 90 is 0.90
+    rate = models.BigIntegerField(default=0)
 
     def __str__(self):
-        return f"{self.from_currency} to {self.to_currency}: {self.rate}, Date: {self.date}"
+        return (
+            f"{self.from_currency} to {self.to_currency}: "
+            f"{to_decimal(self.rate, RATE_DECIMAL_PLACES)}, Date: {self.date}"
+        )
 
     class Meta:
         ordering = ("-date",)
+        constraints = [
+            # Rates are looked up by date or by (date, to_currency)
+            models.UniqueConstraint(
+                fields=["date", "to_currency", "from_currency"],
+                name="exchange_rate_date_currency_uniq",
+            )
+        ]
 
 
 class TransactionEntry(models.Model):
@@ -70,11 +92,189 @@ class TransactionEntry(models.Model):
     Positive amount for incomes.
     """
 
-    amount = models.DecimalField(decimal_places=2, max_digits=20)
+    amount = models.BigIntegerField()
+    # Wallet balance right after this entry
+    balance_after = models.BigIntegerField(null=True)
     wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE)
     transaction = models.ForeignKey(
         Transaction, related_name="entries", on_delete=models.CASCADE
     )
 
+    class Meta:
+        indexes = [
+            # Wallet history lookups joined to transactions
+            models.Index(
+                fields=["wallet", "transaction"], name="entry_wallet_transaction_idx"
+            )
+        ]
+
+    def __str__(self):
+        return f"{format_money(self.amount)} {self.wallet.currency}"
+
+
+class FeedItem(models.Model):
+    """
+    Wallet transactions list item, a denormalized copy of one TransactionEntry
+    with its transaction and the entry on the other side of it, if any.
+    Written together with the entries, the list is read from this table alone.
+    """
+
+    wallet = models.ForeignKey(
+        Wallet, related_name="feed", on_delete=models.CASCADE, db_index=False
+    )
+    entry = models.OneToOneField(
+        TransactionEntry, related_name="feed_item", on_delete=models.CASCADE
+    )
+    transaction = models.ForeignKey(
+        Transaction, related_name="feed_items", on_delete=models.CASCADE
+    )
+    created = models.DateTimeField()
+    description = models.CharField(max_length=255, null=True, blank=True)
+    is_top_up = models.BooleanField(default=False)
+    amount = models.BigIntegerField()
+    balance_after = models.BigIntegerField(null=True)
+    currency = models.CharField(max_length=3, choices=CURRENCIES)
+    counterparty_wallet = models.ForeignKey(
+        Wallet, related_name="+", null=True, on_delete=models.CASCADE
+    )
+    counterparty_entry_id = models.IntegerField(null=True)
+    counterparty_amount = models.BigIntegerField(null=True)
+    counterparty_currency = models.CharField(
+        max_length=3, choices=CURRENCIES, null=True
+    )
+
+    class Meta:
+        indexes = [
+            # Wallet list pages are range scans of this index
+            models.Index(
+                fields=["wallet", "-created", "-id"], name="feed_wallet_created_idx"
+            )
+        ]
+
+    @property
+    def entries(self):
+        """Entries of the transaction in id order, like Transaction.entries"""
+        entries = [
+            dict(
+                id=self.entry_id,
+                amount=self.amount,
+                currency=self.currency,
+                wallet=self.wallet_id,
+            )
+        ]
+        if self.counterparty_entry_id:
+            entries.append(
+                dict(
+                    id=self.counterparty_entry_id,
+                    amount=self.counterparty_amount,
+                    currency=self.counterparty_currency,
+                    wallet=self.counterparty_wallet_id,
+                )
+            )
+        return sorted(entries, key=lambda entry: entry["id"])
+
+    def __str__(self):
+        return f"{self.description}: {format_money(self.amount)} {self.currency}"
+
+
+class DailyRollup(models.Model):
+    """
+    Totals of wallet entries for one day, updated with every transaction.
+    Outflow is stored as a positive number, days are in TIME_ZONE.
+    """
+
+    wallet = models.ForeignKey(
+        Wallet, related_name="daily_rollups", on_delete=models.CASCADE, db_index=False
+    )
+    day = models.DateField()
+    currency = models.CharField(max_length=3, choices=CURRENCIES)
+    inflow = models.BigIntegerField(default=0)
+    outflow = models.BigIntegerField(default=0)
+    entries_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Upsert target, also serves wallet summaries by day range
+            models.UniqueConstraint(
+                fields=["wallet", "day"], name="rollup_wallet_day_uniq"
+            )
+        ]
+
+    @property
+    def net(self):
+        return self.inflow - self.outflow
+
+    def __str__(self):
+        return (
+            f"{self.day}: +{format_money(self.inflow)} "
+            f"-{format_money(self.outflow)} {self.currency}"
+        )
+
+
+class IdempotencyKey(models.Model):
+    """
+    Response of a POST request sent with an Idempotency-Key header,
+    repeated requests with the same key get it back, see billing.idempotency.
+    Response is empty while the first request is still running.
+    """
+
+    user = models.ForeignKey(
+        User, related_name="+", on_delete=models.CASCADE, db_index=False
+    )
+    key = models.CharField(max_length=255)
+    path = models.CharField(max_length=255)
+    # Keys are expired in bulk by age, see expire_idempotency_keys
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    # Response data as JSON
+    response = models.TextField(null=True)
+    # Location header of the response, e.g. of a queued payment
+    location = models.CharField(max_length=2048, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "key"], name="idempotency_key_user_key_uniq"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.key}: {self.path} {self.status_code}"
+
+
+class QueuedPayment(models.Model):
+    """
+    Payment accepted with POST /api/transactions/?async=true and settled later
+    by the process_payments worker, which sets the status and the transaction.
+    """
+
+    source_wallet = models.ForeignKey(
+        Wallet, related_name="queued_payments", on_delete=models.CASCADE
+    )
+    destination_wallet = models.ForeignKey(
+        Wallet, related_name="+", on_delete=models.CASCADE
+    )
+    amount = models.BigIntegerField()
+    description = models.CharField(max_length=255, null=True, blank=True)
+    status = models.CharField(
+        max_length=9, choices=PAYMENT_STATUSES, default=PAYMENT_QUEUED
+    )
+    created = models.DateTimeField(auto_now_add=True)
+    processed = models.DateTimeField(null=True)
+    transaction = models.ForeignKey(
+        Transaction, related_name="+", null=True, on_delete=models.SET_NULL
+    )
+    error = models.CharField(max_length=255, null=True)
+
+    class Meta:
+        indexes = [
+            # Workers claim the oldest queued payments, settled ones drop out
+            models.Index(
+                fields=["id"],
+                name="queued_payment_pending_idx",
+                condition=models.Q(status=PAYMENT_QUEUED),
+            )
+        ]
+
     def __str__(self):
-        return f"{self.amount} {self.wallet.currency}"
+        return f"{self.description}: {format_money(self.amount)}, {self.status}"
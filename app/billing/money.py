@@ -0,0 +1,73 @@
+"""Amounts as integer minor units (cents), exchange rates as scaled integers.
+
+Balances, entry amounts and rollups are BigIntegerFields, added, compared
+and summed as plain ints in Python and in SQL. Decimals only appear where
+the API reads and writes amounts, see MoneyField and RateField in serializers.
+"""
+from decimal import Decimal, ROUND_HALF_EVEN
+
+# Every supported currency has 2 decimal places
+DECIMAL_PLACES = 2
+MINOR_UNITS = 10**DECIMAL_PLACES
+MONEY_FORMAT = f"%d.%0{DECIMAL_PLACES}d"
+# Rates are stored with 2 decimal places, 90 is 0.90
+RATE_DECIMAL_PLACES = 2
+RATE_SCALE = 10**RATE_DECIMAL_PLACES
+
+
+def divide(dividend, divisor):
+    """Integer division rounding half to even, like Decimal.quantize does"""
+    quotient, remainder = divmod(dividend, divisor)
+    doubled = 2 * remainder
+    if doubled > divisor or (doubled == divisor and quotient % 2):
+        quotient += 1
+    return quotient
+
+
+def to_scaled_int(value, places=DECIMAL_PLACES):
+    """:param value: Decimal, str or int in major units
+    :return: int rounded half to even to `places`
+    """
+    return int(
+        Decimal(value).scaleb(places).to_integral_value(rounding=ROUND_HALF_EVEN)
+    )
+
+
+def to_decimal(minor, places=DECIMAL_PLACES):
+    """:return: Decimal with exactly `places` decimal places"""
+    return Decimal(minor).scaleb(-places)
+
+
+def format_money(minor):
+    """Formats like DecimalField(decimal_places=2) with COERCE_DECIMAL_TO_STRING"""
+    # %-formatting of the divmod tuple is the fastest way, it's called per report row
+    if minor < 0:
+        return "-" + MONEY_FORMAT % divmod(-minor, MINOR_UNITS)
+    return MONEY_FORMAT % divmod(minor, MINOR_UNITS)
+
+
+class Money(int):
+    """Amount in minor units, an int without instance dict.
+
+    Arithmetic and the database see a plain int, arithmetic returns plain ints.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_decimal(cls, value):
+        """:param value: Decimal, str or int in major units, e.g. Decimal("12.34")"""
+        return cls(to_scaled_int(value))
+
+    def to_decimal(self):
+        return to_decimal(self)
+
+    def format(self):
+        return format_money(self)
+
+    # int has no __str__ of its own, str() would fall back to __repr__ below.
+    # The database adapter and COPY rely on str() giving the plain number.
+    __str__ = int.__repr__
+
+    def __repr__(self):
+        return f"Money({format_money(self)})"
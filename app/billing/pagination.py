@@ -0,0 +1,99 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Paginates newest first by the (created, id) position of the last item.
+
+    Any page, however deep, is a single index range scan on (created, id)
+    and no total count is calculated. Cursors are opaque, clients follow `next`.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "limit"
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+
+        queryset = queryset.order_by("-created", "-id")
+        if position:
+            created, last_id = position
+            # `created <= x` lets the index scan start at the cursor,
+            # the rest drops already seen rows with the same `created`.
+            queryset = queryset.filter(
+                Q(created__lte=created) & (Q(created__lt=created) | Q(id__lt=last_id))
+            )
+
+        # One extra row tells if there is a next page, without a count.
+        page = list(queryset[: page_size + 1])
+        self.next_position = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_position = (page[-1].created, page[-1].id)
+        return page
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size,
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            created, last_id = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            created = parse_datetime(created)
+            if created is None:
+                raise ValueError
+            return created, int(last_id)
+        except (TypeError, ValueError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        created, last_id = position
+        return base64.urlsafe_b64encode(
+            json.dumps([created.isoformat(), last_id]).encode()
+        ).decode()
+
+    def get_next_link(self):
+        if not self.next_position:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.next_position)
+        )
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict([("next", self.get_next_link()), ("results", data)])
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
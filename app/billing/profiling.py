@@ -0,0 +1,150 @@
+"""Opt-in cProfile of requests, saved to PROFILE_DIR for show_profiles.
+
+A request is profiled when it's sampled (PROFILE_SAMPLE_RATE) or when a
+staff user sends the X-Profile header. Other requests only pay for a header
+lookup and a random number when sampling is on.
+"""
+import cProfile
+import logging
+import os
+import random
+import time
+from datetime import datetime
+
+from django.conf import settings
+from rest_framework.exceptions import AuthenticationFailed
+
+from billing.authentication import CachedJWTAuthentication
+
+PROFILE_HEADER = "HTTP_X_PROFILE"
+PROFILE_ID_HEADER = "X-Profile-Id"
+TIMESTAMP_FORMAT = "%Y%m%dT%H%M%S.%f"
+UNRESOLVED = "unresolved"
+
+logger = logging.getLogger(__name__)
+
+
+def is_staff(request):
+    """Staff users logged in with a session or a JWT access token"""
+    if request.user.is_authenticated:
+        return request.user.is_staff
+    try:
+        authenticated = CachedJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return authenticated is not None and authenticated[0].is_staff
+
+
+def profile_id():
+    """Unique, sortable by time"""
+    return f"{datetime.utcnow().strftime(TIMESTAMP_FORMAT)}_{os.getpid()}"
+
+
+def profile_name(key, request, response, duration):
+    """File name of a profile, see parse_profile_name.
+
+    The view name goes last, it may contain the separator.
+    """
+    match = request.resolver_match
+    return "_".join(
+        (
+            key,
+            f"{duration * 1000:.0f}ms",
+            request.method,
+            str(response.status_code),
+            match.url_name if match and match.url_name else UNRESOLVED,
+        )
+    )
+
+
+def parse_profile_name(name):
+    """:return: dict() of created, duration_ms, method, status and view"""
+    created, _, duration, method, status, view = name.split("_", 5)
+    return dict(
+        created=datetime.strptime(created, TIMESTAMP_FORMAT),
+        duration_ms=int(duration[: -len("ms")]),
+        method=method,
+        status=int(status),
+        view=view,
+    )
+
+
+def save_profile(profiler, name):
+    """Writes the stats and deletes the oldest files above PROFILE_MAX_FILES"""
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    profiler.dump_stats(os.path.join(settings.PROFILE_DIR, f"{name}.prof"))
+
+    names = sorted(
+        file_name
+        for file_name in os.listdir(settings.PROFILE_DIR)
+        if file_name.endswith(".prof")
+    )
+    for file_name in names[: -settings.PROFILE_MAX_FILES]:
+        try:
+            os.remove(os.path.join(settings.PROFILE_DIR, file_name))
+        except FileNotFoundError:
+            pass  # removed by another worker
+
+
+class ProfilingMiddleware:
+    """Profiles the rest of the middleware and the view, keep it after
+    AuthenticationMiddleware. Streaming responses are profiled while sent.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = settings.PROFILE_SAMPLE_RATE
+        sampled = rate and random.random() < rate
+        if not sampled and not (PROFILE_HEADER in request.META and is_staff(request)):
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+ allows one profiler at a time, another thread has it
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+
+        key = profile_id()
+        response[PROFILE_ID_HEADER] = key
+
+        def save():
+            duration = time.perf_counter() - started
+            name = profile_name(key, request, response, duration)
+            # The request has succeeded, a full disk mustn't turn it into an error
+            try:
+                save_profile(profiler, name)
+            except Exception:  # pylint: disable=broad-except
+                logger.warning("Failed to save profile %s", name, exc_info=True)
+
+        if response.streaming:
+            response.streaming_content = stream(
+                response.streaming_content, profiler, save
+            )
+        else:
+            save()
+        return response
+
+
+def stream(content, profiler, save):
+    """Profiles making the chunks, not sending them"""
+    chunks = iter(content)
+    try:
+        while True:
+            profiler.enable()
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+            finally:
+                profiler.disable()
+            yield chunk
+    finally:
+        save()
@@ -0,0 +1,71 @@
+import requests
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from billing.constants import USD, SUPPORTED_CURRENCIES
+
+
+class HTTPRateProvider:
+    """Downloads USD based rates from the public exchange rates API.
+
+    Uses one pooled session per process, every request has a timeout
+    and failed connections or 5xx responses are retried with backoff.
+    """
+
+    def __init__(self):
+        retry = Retry(
+            total=settings.EXCHANGE_RATES_RETRIES,
+            backoff_factor=settings.EXCHANGE_RATES_BACKOFF,
+            status_forcelist=(500, 502, 503, 504),
+        )
+        adapter = HTTPAdapter(
+            max_retries=retry, pool_maxsize=settings.EXCHANGE_RATES_POOL_SIZE
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def fetch(self, for_date):
+        """
+        :param for_date: date
+        :return: dict() with keys: base, date, rates
+        """
+        response = self.session.get(
+            f"{settings.EXCHANGE_RATES_URL}{for_date}",
+            params=dict(base=USD, symbols=",".join(SUPPORTED_CURRENCIES)),
+            timeout=settings.EXCHANGE_RATES_TIMEOUT,
+        )
+        response.raise_for_status()
+        return response.json()
+
+
+class FakeRateProvider:
+    """Offline provider with stable made up rates, for development and tests"""
+
+    base_rates = dict(USD=1.0, EUR=0.9069, CAD=1.3259, CNY=7.0967)
+
+    def fetch(self, for_date):
+        # Move rates a little from day to day, same date always gives same rates.
+        drift = 1 + (for_date.toordinal() % 7 - 3) / 1000
+        return dict(
+            base=USD,
+            date=for_date.isoformat(),
+            rates={
+                currency: rate if currency == USD else round(rate * drift, 4)
+                for currency, rate in self.base_rates.items()
+            },
+        )
+
+
+_provider = None
+
+
+def get_rate_provider():
+    """Returns the process wide provider set by EXCHANGE_RATES_PROVIDER setting"""
+    global _provider  # pylint: disable=global-statement
+    if _provider is None:
+        _provider = import_string(settings.EXCHANGE_RATES_PROVIDER)()
+    return _provider
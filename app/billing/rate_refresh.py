@@ -0,0 +1,57 @@
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class RateRefresher:
+    """Runs `refresh(for_date)` for requested dates in a background thread.
+
+    A date is queued once until its refresh finishes, so a burst of requests
+    for missing rates makes a single download per process. With
+    EXCHANGE_RATES_BACKGROUND_REFRESH disabled the refresh runs inline.
+    """
+
+    def __init__(self, refresh):
+        self._refresh = refresh
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def request(self, for_date):
+        if not settings.EXCHANGE_RATES_BACKGROUND_REFRESH:
+            self._run_refresh(for_date)
+            return
+
+        with self._lock:
+            if for_date in self._pending:
+                return
+            self._pending.add(for_date)
+            # Started lazily, so every forked uWSGI worker gets its own thread.
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._worker, name="rate-refresher", daemon=True
+                )
+                self._thread.start()
+        self._queue.put(for_date)
+
+    def _worker(self):
+        while True:
+            for_date = self._queue.get()
+            try:
+                self._run_refresh(for_date)
+            finally:
+                connection.close()
+                with self._lock:
+                    self._pending.discard(for_date)
+
+    def _run_refresh(self, for_date):
+        try:
+            self._refresh(for_date)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Failed to refresh exchange rates for %s", for_date)
@@ -0,0 +1,115 @@
+"""Streaming report writers.
+
+Rows come from a `.iterator()` over report entries `values_list(*REPORT_COLUMNS)`
+and are formatted like ReportSerializer output, see billing.fast_serializers.
+Output of every writer matches the corresponding DRF renderer.
+"""
+import csv
+import io
+import json
+
+from django.utils.xmlutils import SimplerXMLGenerator
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from billing.fast_serializers import REPORT_COLUMNS, serialize_report_row
+
+# CSVRenderer sorts header alphabetically
+CSV_HEADER = tuple(sorted(REPORT_COLUMNS))
+
+# Rows written to the buffer before a chunk is sent to the client
+ROWS_PER_CHUNK = 500
+
+
+def _chunked(rows, write_row, buffer):
+    for index, row in enumerate(rows, 1):
+        write_row(serialize_report_row(row))
+        if index % ROWS_PER_CHUNK == 0:
+            yield _flush(buffer)
+    yield _flush(buffer)
+
+
+def _flush(buffer):
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return data.encode("utf-8")
+
+
+def stream_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    yield from _chunked(
+        rows, lambda row: writer.writerow([row[key] for key in CSV_HEADER]), buffer
+    )
+
+
+def stream_xml(rows):
+    buffer = io.StringIO()
+    xml = SimplerXMLGenerator(buffer, "utf-8")
+    xml.startDocument()
+    xml.startElement("root", {})
+
+    def write_row(row):
+        xml.startElement("list-item", {})
+        for key in REPORT_COLUMNS:
+            xml.startElement(key, {})
+            xml.characters(row[key])
+            xml.endElement(key)
+        xml.endElement("list-item")
+
+    yield from _chunked(rows, write_row, buffer)
+    xml.endElement("root")
+    xml.endDocument()
+    yield _flush(buffer)
+
+
+def stream_json(rows):
+    buffer = io.StringIO()
+    buffer.write("[")
+    separator = ""
+
+    def write_row(row):
+        nonlocal separator
+        buffer.write(separator)
+        buffer.write(json.dumps(row, ensure_ascii=False, separators=(",", ":")))
+        separator = ","
+
+    yield from _chunked(rows, write_row, buffer)
+    buffer.write("]")
+    yield _flush(buffer)
+
+
+def stream_json_lines(rows):
+    buffer = io.StringIO()
+    yield from _chunked(
+        rows,
+        lambda row: buffer.write(json.dumps(row, ensure_ascii=False) + "\n"),
+        buffer,
+    )
+
+
+class JSONLinesRenderer(BaseRenderer):
+    """Renders a list as one JSON document per line"""
+
+    media_type = "application/x-ndjson"
+    format = "jsonl"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not isinstance(data, list):
+            data = [data]
+        return "".join(
+            json.dumps(item, cls=JSONEncoder, ensure_ascii=False) + "\n"
+            for item in data
+        ).encode(self.charset)
+
+
+# format query param -> (writer, content type)
+REPORT_STREAMS = {
+    "json": (stream_json, "application/json"),
+    "jsonl": (stream_json_lines, "application/x-ndjson"),
+    "csv": (stream_csv, "text/csv; charset=utf-8"),
+    "xml": (stream_xml, "application/xml; charset=utf-8"),
+}
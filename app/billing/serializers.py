@@ -1,14 +1,71 @@
+from datetime import datetime, time, timedelta
 from decimal import Decimal
 
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from rest_framework import serializers
+from rest_framework.fields import empty
 from rest_framework.validators import UniqueValidator
 
-from billing.constants import CURRENCIES
-from billing.models import TransactionEntry, Transaction, ExchangeRate, User, Wallet
-from billing.utils import calculate_currency_rate
+from billing.constants import (
+    CURRENCIES,
+    MAX_BATCH_PAYMENTS,
+    STATEMENT_MAX_DAYS,
+    SUMMARY_PERIODS,
+)
+from billing.money import (
+    DECIMAL_PLACES,
+    RATE_DECIMAL_PLACES,
+    Money,
+    format_money,
+    to_decimal,
+    to_scaled_int,
+)
+from billing.models import (
+    TransactionEntry,
+    Transaction,
+    ExchangeRate,
+    User,
+    Wallet,
+    FeedItem,
+    QueuedPayment,
+)
+
+
+class MoneyField(serializers.DecimalField):
+    """Amount in minor units, read and written like DecimalField(decimal_places=2).
+
+    Input is validated as a decimal and becomes Money.
+    """
+
+    def __init__(self, **kwargs):
+        # 18 digits in minor units fit a bigint
+        super().__init__(max_digits=18, decimal_places=DECIMAL_PLACES, **kwargs)
+
+    def run_validation(self, data=empty):
+        value = super().run_validation(data)
+        return value if value is None else Money.from_decimal(value)
+
+    def to_representation(self, value):
+        return format_money(value)
+
+
+class RateField(serializers.DecimalField):
+    """Exchange rate scaled by RATE_SCALE, read and written as a decimal"""
+
+    def __init__(self, **kwargs):
+        super().__init__(max_digits=18, decimal_places=RATE_DECIMAL_PLACES, **kwargs)
+
+    def run_validation(self, data=empty):
+        value = super().run_validation(data)
+        return value if value is None else to_scaled_int(value, RATE_DECIMAL_PLACES)
+
+    def to_representation(self, value):
+        return super().to_representation(to_decimal(value, RATE_DECIMAL_PLACES))
 
 
 class TransactionEntrySerializer(serializers.ModelSerializer):
+    amount = MoneyField()
     currency = serializers.ReadOnlyField(source="wallet.currency")
 
     class Meta:
@@ -17,12 +74,12 @@ class TransactionEntrySerializer(serializers.ModelSerializer):
 
 
 class TopUpSerializer(serializers.Serializer):
-    amount = serializers.DecimalField(
-        decimal_places=2, max_digits=20, min_value=Decimal("0.01")
-    )
+    amount = MoneyField(min_value=Decimal("0.01"))
 
 
 class WalletSerializer(serializers.ModelSerializer):
+    balance = MoneyField()
+
     class Meta:
         model = Wallet
         fields = ("id", "balance", "currency")
@@ -36,7 +93,79 @@ class TransactionSerializer(serializers.ModelSerializer):
         fields = ("id", "created", "description", "entries", "is_top_up")
 
 
+class FeedEntrySerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    amount = MoneyField()
+    currency = serializers.CharField()
+    wallet = serializers.IntegerField()
+
+
+class FeedItemSerializer(serializers.ModelSerializer):
+    """Same output as TransactionSerializer, from a single FeedItem row"""
+
+    id = serializers.IntegerField(source="transaction_id")
+    entries = FeedEntrySerializer(many=True)
+
+    class Meta:
+        model = FeedItem
+        fields = ("id", "created", "description", "entries", "is_top_up")
+
+
+class DateOrDateTimeField(serializers.DateTimeField):
+    """DateTimeField also taking a plain date, in TIME_ZONE.
+
+    A date is the start of the day, or its end with `end_of_day`.
+    """
+
+    def __init__(self, end_of_day=False, **kwargs):
+        self.end_of_day = end_of_day
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, value):
+        try:
+            day = parse_date(value) if isinstance(value, str) else None
+        except ValueError:
+            day = None  # a date out of range, reported by DateTimeField
+        if day is None:
+            return super().to_internal_value(value)
+        return timezone.make_aware(
+            datetime.combine(day, time.max if self.end_of_day else time.min)
+        )
+
+
+class StatementFilterSerializer(serializers.Serializer):
+    date_from = DateOrDateTimeField()
+    date_to = DateOrDateTimeField(end_of_day=True)
+
+    def validate(self, attrs):
+        if attrs["date_from"] > attrs["date_to"]:
+            raise serializers.ValidationError("date_from must be before date_to")
+        if attrs["date_to"] - attrs["date_from"] > timedelta(days=STATEMENT_MAX_DAYS):
+            raise serializers.ValidationError(
+                f"Statement period can't be longer than {STATEMENT_MAX_DAYS} days"
+            )
+        return attrs
+
+
+class StatementEntrySerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source="transaction_id")
+    amount = MoneyField()
+    balance_after = MoneyField()
+
+    class Meta:
+        model = FeedItem
+        fields = ("id", "created", "description", "amount", "balance_after")
+
+
+class StatementSerializer(serializers.Serializer):
+    opening_balance = MoneyField()
+    closing_balance = MoneyField()
+    entries = StatementEntrySerializer(many=True)
+
+
 class ExchangeRateSerializer(serializers.ModelSerializer):
+    rate = RateField()
+
     class Meta:
         model = ExchangeRate
         fields = ("id", "from_currency", "to_currency", "rate", "date")
@@ -50,7 +179,12 @@ class ExchangeRateSerializerRead(ExchangeRateSerializer):
         return self.context.get("base_currency")
 
     def get_rate(self, obj):
-        return calculate_currency_rate(obj.rate, self.context.get("base_rate"))
+        return to_decimal(
+            self.context["cross_rates"].get(
+                self.context.get("base_currency"), obj.to_currency
+            ),
+            RATE_DECIMAL_PLACES,
+        )
 
 
 class UserSerializerRead(serializers.ModelSerializer):
@@ -80,13 +214,13 @@ class UserSerializerWrite(serializers.ModelSerializer):
         return user
 
 
-class PaymentSerializer(serializers.Serializer):
-    amount = serializers.DecimalField(
-        decimal_places=2, max_digits=20, min_value=Decimal("0.01")
-    )
+class PaymentItemSerializer(serializers.Serializer):
+    amount = MoneyField(min_value=Decimal("0.01"))
     destination_wallet = serializers.IntegerField()
     description = serializers.CharField(max_length=255)
 
+
+class PaymentSerializer(PaymentItemSerializer):
     def validate(self, attrs):
         destination_wallet = Wallet.objects.filter(
             id=attrs["destination_wallet"]
@@ -99,9 +233,63 @@ class PaymentSerializer(serializers.Serializer):
         return attrs
 
 
+class QueuedPaymentSerializer(serializers.ModelSerializer):
+    url = serializers.HyperlinkedIdentityField(view_name="queued-payment")
+    amount = MoneyField()
+
+    class Meta:
+        model = QueuedPayment
+        fields = (
+            "id",
+            "url",
+            "status",
+            "amount",
+            "destination_wallet",
+            "description",
+            "created",
+            "processed",
+            "transaction",
+            "error",
+        )
+
+
+class BatchPaymentSerializer(serializers.Serializer):
+    # Items are validated one by one with PaymentItemSerializer,
+    # so an invalid payment fails alone instead of the whole batch.
+    payments = serializers.ListField(
+        child=serializers.DictField(), allow_empty=False, max_length=MAX_BATCH_PAYMENTS
+    )
+
+
 class ReportSerializer(serializers.Serializer):
     id = serializers.CharField()
     username = serializers.CharField()
     created = serializers.DateTimeField()
     currency = serializers.CharField()
-    amount = serializers.DecimalField(decimal_places=2, max_digits=20)
+    amount = MoneyField()
+
+
+class ReportSummarySerializer(serializers.Serializer):
+    # No period when grouped by currency
+    period = serializers.DateField(required=False)
+    currency = serializers.CharField()
+    count = serializers.IntegerField()
+    sum = MoneyField()
+    min = MoneyField()
+    max = MoneyField()
+
+
+class SummaryFilterSerializer(serializers.Serializer):
+    username = serializers.CharField(required=False)
+    period = serializers.ChoiceField(choices=SUMMARY_PERIODS, default="day")
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+
+class SummarySerializer(serializers.Serializer):
+    period = serializers.DateField()
+    currency = serializers.CharField()
+    inflow = MoneyField(source="total_inflow")
+    outflow = MoneyField(source="total_outflow")
+    net = MoneyField()
+    count = serializers.IntegerField()
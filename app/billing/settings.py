@@ -34,11 +34,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so latency covers the other middleware
+    "billing.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "billing.profiling.ProfilingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "debug_toolbar.middleware.DebugToolbarMiddleware",
@@ -133,7 +136,7 @@ AUTH_USER_MODEL = "billing.User"
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "billing.authentication.CachedJWTAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
@@ -141,7 +144,60 @@ REST_FRAMEWORK = {
     "PAGE_SIZE": 10,
 }
 
+# Shared by all uWSGI workers and services, so a user saved in one process
+# is dropped from the cache for all of them. Without MEMCACHED_LOCATION every
+# process has its own cache, only fine for a single process dev server and tests.
+CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+if os.environ.get("MEMCACHED_LOCATION"):
+    CACHES["default"] = {
+        "BACKEND": "django.core.cache.backends.memcached.MemcachedCache",
+        "LOCATION": os.environ["MEMCACHED_LOCATION"],
+    }
+
+# Seconds a JWT authenticated user with the wallet is cached, see CachedJWTAuthentication
+AUTH_USER_CACHE_TTL = 60
+
+# Seconds an Idempotency-Key is kept, see the expire_idempotency_keys command
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+
 
 EXCHANGE_RATES_URL = "https://api.exchangeratesapi.io/"
+# Use "billing.rate_providers.FakeRateProvider" to work offline
+EXCHANGE_RATES_PROVIDER = os.environ.get(
+    "EXCHANGE_RATES_PROVIDER", "billing.rate_providers.HTTPRateProvider"
+)
+EXCHANGE_RATES_TIMEOUT = (3.05, 10)  # connect and read timeouts, seconds
+EXCHANGE_RATES_RETRIES = 3
+EXCHANGE_RATES_BACKOFF = 0.5  # seconds, doubled after every retry
+EXCHANGE_RATES_POOL_SIZE = 16  # connections kept open, max useful backfill concurrency
+# Missing rates are downloaded in a background thread, requests never wait for them
+EXCHANGE_RATES_BACKGROUND_REFRESH = not TESTING
+# refresh_exchange_rates command settings
+EXCHANGE_RATES_REFRESH_INTERVAL = 15 * 60  # seconds
+EXCHANGE_RATES_PREFETCH_DAYS = 1  # days after today to fetch in advance
+
+# process_payments command settings
+PAYMENT_QUEUE_BATCH_SIZE = 100  # queued payments settled per DB transaction
+PAYMENT_QUEUE_POLL_INTERVAL = 1.0  # seconds to wait when the queue is empty
+
+# Clients allowed to read /metrics/, comma separated addresses or networks.
+# Checked in the app, port 8000 is published on the host past nginx.
+METRICS_ALLOWED_NETWORKS = os.environ.get(
+    "METRICS_ALLOWED_NETWORKS", "127.0.0.1/32,::1/128"
+).split(",")
+
+# Requests profiled with cProfile, see billing/profiling.py and show_profiles command
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))  # 0.01 is 1%
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "/tmp/profiles")
+PROFILE_MAX_FILES = 500  # the oldest profiles are deleted
+
+# Queries slower than this many seconds are explained, see billing/slow_queries.py
+SLOW_QUERY_THRESHOLD = (
+    float(os.environ["SLOW_QUERY_THRESHOLD"])
+    if os.environ.get("SLOW_QUERY_THRESHOLD")
+    else None  # off
+)
+SLOW_QUERY_DIR = os.environ.get("SLOW_QUERY_DIR", "/tmp/slow_queries")
+SLOW_QUERY_MAX_FILES = 200  # the least recently captured queries are deleted
 
 QUERYCOUNT = {"DISPLAY_DUPLICATES": 2}
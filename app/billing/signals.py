@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from billing.authentication import invalidate_cached_users
+from billing.cache import exchange_rate_cache
+from billing.models import ExchangeRate, User, Wallet
+from billing.slow_queries import observe_query
+
+
+@receiver([post_save, post_delete], sender=ExchangeRate)
+def invalidate_exchange_rate_cache(sender, instance, **kwargs):
+    # Rates are written once a day, dropping every date is cheap.
+    exchange_rate_cache.invalidate()
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_cached_users([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Wallet)
+def invalidate_cached_wallet_user(sender, instance, **kwargs):
+    # Balance updates don't send signals, balance is not cached.
+    invalidate_cached_users([instance.user_id])
+
+
+@receiver(connection_created)
+def observe_slow_queries(sender, connection, **kwargs):
+    # Sent again on reconnect, the wrappers are kept. EXPLAIN is PostgreSQL's.
+    if (
+        settings.SLOW_QUERY_THRESHOLD is not None
+        and connection.vendor == "postgresql"
+        and observe_query not in connection.execute_wrappers
+    ):
+        connection.execute_wrappers.append(observe_query)
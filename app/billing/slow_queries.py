@@ -0,0 +1,172 @@
+"""EXPLAIN plans of queries slower than SLOW_QUERY_THRESHOLD, see show_slow_queries.
+
+Every DB connection gets observe_query as an execute wrapper when the
+threshold is set (see signals.py). The first slow run of a query is
+explained and saved to SLOW_QUERY_DIR as <fingerprint>.json, later runs
+of queries differing only in values are skipped. Plain SELECTs are
+explained with ANALYZE, so they run once more. Writes, locking SELECTs
+and sequence calls aren't run again, they only get the planner's estimates.
+
+Only PostgreSQL queries are observed. Rows fetched from server side cursors,
+e.g. streamed reports (`.iterator()`), aren't timed: the wrapper only sees
+the cheap DECLARE. The same query runs without a cursor when the report
+isn't streamed, capture it that way.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(PACKAGE_DIR)
+# Observers of every query, never where a query comes from
+SKIPPED_PATHS = {
+    os.path.join(PACKAGE_DIR, file_name)
+    for file_name in ("metrics.py", "profiling.py", "slow_queries.py")
+}
+
+# Values the fingerprint ignores: string and number literals, placeholder lists
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+PLACEHOLDER_LISTS = re.compile(r"%s(?:\s*,\s*%s)+")
+WHITESPACE = re.compile(r"\s+")
+
+EXPLAINABLE = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "VALUES"}
+# SELECTs not run again by EXPLAIN ANALYZE: locking rows or moving sequences
+SIDE_EFFECTS = re.compile(
+    r"\bFOR\s+(?:NO\s+KEY\s+)?(?:UPDATE|SHARE|KEY\s+SHARE)\b|\b(?:nextval|setval)\s*\(",
+    re.IGNORECASE,
+)
+
+# In this process, to skip checking the disk for queries seen before
+captured = set()
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(sql):
+    normalized = PLACEHOLDER_LISTS.sub("%s", LITERALS.sub("?", sql))
+    normalized = WHITESPACE.sub(" ", normalized).strip()
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16]
+
+
+def statement_type(sql):
+    return sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ""
+
+
+def find_location():
+    """Project functions running the query, outermost first, e.g.
+    ["billing.views.ReportView.get:377", "billing.context.find_report_entries:512"]
+    """
+    location = []
+    frame = sys._getframe(1)  # pylint: disable=protected-access
+    while frame is not None:
+        path = os.path.abspath(frame.f_code.co_filename)
+        if path.startswith(PACKAGE_DIR + os.sep) and path not in SKIPPED_PATHS:
+            module = os.path.splitext(os.path.relpath(path, PROJECT_DIR))[0]
+            name = frame.f_code.co_name
+            instance = frame.f_locals.get("self")
+            if instance is not None:
+                name = f"{type(instance).__name__}.{name}"
+            location.append(f"{module.replace(os.sep, '.')}.{name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return location[::-1]
+
+
+def explain(connection, sql, params):
+    """Runs EXPLAIN on a separate cursor of the same connection and transaction.
+
+    :return: str plan, or the error when the query can't be explained
+    """
+    analyze = statement_type(sql) == "SELECT" and not SIDE_EFFECTS.search(sql)
+    raw = connection.connection
+    in_transaction = not raw.autocommit
+    with raw.cursor() as cursor:
+        # A failed EXPLAIN must not break the transaction of the request
+        if in_transaction:
+            cursor.execute("SAVEPOINT explain_slow_query")
+        try:
+            cursor.execute(
+                f"EXPLAIN {'(ANALYZE, BUFFERS) ' if analyze else ''}{sql}", params
+            )
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+        except Exception as error:  # pylint: disable=broad-except
+            plan = f"EXPLAIN failed: {error}"
+            if in_transaction:
+                cursor.execute("ROLLBACK TO SAVEPOINT explain_slow_query")
+        if in_transaction:
+            cursor.execute("RELEASE SAVEPOINT explain_slow_query")
+    return plan
+
+
+def save_capture(key, capture):
+    """Writes the capture and deletes the oldest above SLOW_QUERY_MAX_FILES"""
+    os.makedirs(settings.SLOW_QUERY_DIR, exist_ok=True)
+    path = os.path.join(settings.SLOW_QUERY_DIR, f"{key}.json")
+    # Renamed into place, so readers never see half a file
+    with open(f"{path}.{os.getpid()}.tmp", "w") as capture_file:
+        json.dump(capture, capture_file, indent=2, default=str)
+    os.replace(capture_file.name, path)
+
+    paths = [
+        os.path.join(settings.SLOW_QUERY_DIR, file_name)
+        for file_name in os.listdir(settings.SLOW_QUERY_DIR)
+        if file_name.endswith(".json")
+    ]
+    paths.sort(key=os.path.getmtime)
+    for old_path in paths[: -settings.SLOW_QUERY_MAX_FILES]:
+        try:
+            os.remove(old_path)
+        except FileNotFoundError:
+            pass  # removed by another worker
+
+
+def capture_query(connection, sql, params, duration):
+    """Explains and saves the query unless a query like it was captured before"""
+    if statement_type(sql) not in EXPLAINABLE:
+        return
+
+    key = fingerprint(sql)
+    if key in captured:
+        return
+    captured.add(key)
+    if os.path.exists(os.path.join(settings.SLOW_QUERY_DIR, f"{key}.json")):
+        return
+
+    save_capture(
+        key,
+        dict(
+            fingerprint=key,
+            captured=timezone.now().isoformat(),
+            duration_ms=round(duration * 1000, 3),
+            location=find_location(),
+            sql=sql,
+            params=params,
+            plan=explain(connection, sql, params),
+        ),
+    )
+
+
+def observe_query(execute, sql, params, many, context):
+    """Database execute wrapper capturing slow queries"""
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration = time.perf_counter() - started
+    threshold = settings.SLOW_QUERY_THRESHOLD
+    if threshold is None or duration < threshold or many:
+        return result
+    connection = context["connection"]
+    if connection.vendor != "postgresql":
+        return result
+
+    # The query has succeeded, a full disk mustn't turn it into an error
+    try:
+        capture_query(connection, sql, params, duration)
+    except Exception:  # pylint: disable=broad-except
+        logger.warning("Failed to capture slow query: %s", sql, exc_info=True)
+    return result
@@ -1 +1,3 @@
 from .test_api import *
+from .test_concurrency import *
+from .test_query_plans import *
@@ -1,19 +1,80 @@
 import csv
 import io
+import json
+import os
+import tempfile
+from unittest import skipUnless
+from importlib import import_module
 
+from django.apps import apps
+from django.core.cache import cache
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from mock import patch
-from datetime import datetime, date
-from decimal import Decimal
+from datetime import datetime, date, timedelta
+from decimal import Decimal, ROUND_HALF_EVEN
 
-from django.test import TestCase
+from django.db import connection
+from django.db.models import Count, Max, Min, Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils import timezone
+from prometheus_client import REGISTRY
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
+from rest_framework_csv.renderers import CSVRenderer
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_xml.renderers import XMLRenderer
 
-from billing.constants import USD, EUR, CAD, SUPPORTED_CURRENCIES
-from billing.context import top_up_wallet, find_transactions
-from billing.models import User, Wallet, Transaction, ExchangeRate, TransactionEntry
+from billing.authentication import CachedJWTAuthentication, invalidate_cached_users
+from billing.cache import exchange_rate_cache
+from billing.constants import (
+    USD,
+    EUR,
+    CAD,
+    CNY,
+    SUPPORTED_CURRENCIES,
+    PAYMENT_QUEUED,
+    PAYMENT_COMPLETED,
+    PAYMENT_FAILED,
+)
+from billing.context import (
+    top_up_wallet,
+    find_transactions,
+    find_exchange_rates,
+    find_cross_rate,
+    send_payment,
+    find_report_entries,
+)
+from billing.models import (
+    User,
+    Wallet,
+    Transaction,
+    ExchangeRate,
+    TransactionEntry,
+    FeedItem,
+    DailyRollup,
+    IdempotencyKey,
+    QueuedPayment,
+)
+from billing.money import Money, format_money, to_decimal, to_scaled_int
+from billing.rate_providers import FakeRateProvider
+from billing.slow_queries import observe_query
+from billing.fast_serializers import (
+    FEED_COLUMNS,
+    REPORT_COLUMNS,
+    serialize_feed_row,
+    serialize_report_row,
+)
+from billing.serializers import (
+    TransactionSerializer,
+    FeedItemSerializer,
+    ReportSerializer,
+)
+from billing.utils import calculate_currency_rate, convert_amount
 
 
 class TestAPI(TestCase):
@@ -21,6 +82,9 @@ class TestAPI(TestCase):
 
     def setUp(self):
         self.now = datetime.utcnow()
+        # Cached rates and users outlive the rolled back rows of previous tests
+        exchange_rate_cache.invalidate()
+        cache.clear()
 
         self.user = User.objects.create(
             username="admin",
@@ -79,7 +143,7 @@ class TestAPI(TestCase):
         self.assertEqual(TransactionEntry.objects.count(), 1)
 
         self.user_wallet.refresh_from_db()
-        self.assertEqual(self.user_wallet.balance, 100)
+        self.assertEqual(self.user_wallet.balance, 10000)
 
     def test_get_exchange_rates_downloads_new_rates(self):
         to_date = date.today().isoformat()
@@ -108,13 +172,13 @@ class TestAPI(TestCase):
 
     def test_get_existing_exchange_rates(self):
         ExchangeRate.objects.create(
-            from_currency=USD, to_currency=EUR, rate=0.90, date=date.today()
+            from_currency=USD, to_currency=EUR, rate=90, date=date.today()
         )
         ExchangeRate.objects.create(
-            from_currency=USD, to_currency=USD, rate=1, date=date.today()
+            from_currency=USD, to_currency=USD, rate=100, date=date.today()
         )
         ExchangeRate.objects.create(
-            from_currency=USD, to_currency=CAD, rate=1.33, date=date.today()
+            from_currency=USD, to_currency=CAD, rate=133, date=date.today()
         )
         result = self.client.get(f"{reverse('exchange-rates')}?from_currency=EUR")
         self.assertEqual(len(result.data["results"]), 2)  # self rate excluded
@@ -159,10 +223,10 @@ class TestAPI(TestCase):
     def test_send_money(self):
         today = date.today()
         ExchangeRate.objects.create(
-            from_currency=USD, to_currency=USD, rate=1, date=today
+            from_currency=USD, to_currency=USD, rate=100, date=today
         )
         ExchangeRate.objects.create(
-            from_currency=USD, to_currency=EUR, rate=0.90, date=today
+            from_currency=USD, to_currency=EUR, rate=90, date=today
         )
         self.assertEqual(self.user_wallet.balance, 0)
         post_data = dict(
@@ -175,14 +239,14 @@ class TestAPI(TestCase):
         self.assertEqual(result.status_code, 400)
         self.assertEqual(result.json(), ["More gold is needed."])
         # Add 500 $ to user wallet
-        top_up_wallet(self.user_wallet, 500)
+        top_up_wallet(self.user_wallet, 50000)
         result = self.client.post(reverse("transactions"), post_data, format="json")
 
         self.assertEqual(result.status_code, 201)
         self.user_wallet.refresh_from_db()
         self.user2_wallet.refresh_from_db()
-        self.assertEqual(self.user_wallet.balance, Decimal("400"))
-        self.assertEqual(self.user2_wallet.balance, Decimal("90"))
+        self.assertEqual(self.user_wallet.balance, 40000)
+        self.assertEqual(self.user2_wallet.balance, 9000)
         self.assertEqual(Transaction.objects.count(), 2)  # 1 top up, 1 payment
         self.assertEqual(
             TransactionEntry.objects.count(), 3
@@ -192,10 +256,10 @@ class TestAPI(TestCase):
         # Setup data before report testing
         today = date.today()
         ExchangeRate.objects.create(
-            from_currency=USD, to_currency=USD, rate=1, date=today
+            from_currency=USD, to_currency=USD, rate=100, date=today
         )
         ExchangeRate.objects.create(
-            from_currency=USD, to_currency=EUR, rate=0.90, date=today
+            from_currency=USD, to_currency=EUR, rate=90, date=today
         )
         call_command("add_transactions")
         transactions = Transaction.objects.count()
@@ -240,3 +304,1111 @@ class TestAPI(TestCase):
         headers = body.pop(0)
         self.assertEqual(headers, ["amount", "created", "currency", "id", "username"])
         self.assertEqual(len(body), 101)
+
+    def test_reconcile_balances(self):
+        top_up_wallet(self.user_wallet, 50000)
+        top_up_wallet(self.user_wallet, 25000)
+        self.user_wallet.refresh_from_db()
+        self.assertEqual(self.user_wallet.balance, 75000)
+
+        # Corrupt stored balances, the ledger stays the source of truth
+        Wallet.objects.filter(id=self.user_wallet.id).update(balance=1)
+        Wallet.objects.filter(id=self.user2_wallet.id).update(balance=5)
+        out = io.StringIO()
+        call_command("reconcile_balances", chunk_size=1, stdout=out)
+
+        self.assertIn("repaired 2 mismatched balances", out.getvalue())
+        self.user_wallet.refresh_from_db()
+        self.user2_wallet.refresh_from_db()
+        self.assertEqual(self.user_wallet.balance, 75000)
+        self.assertEqual(self.user2_wallet.balance, 0)
+
+    def test_send_money_batch(self):
+        today = date.today()
+        ExchangeRate.objects.create(
+            from_currency=USD, to_currency=USD, rate=100, date=today
+        )
+        ExchangeRate.objects.create(
+            from_currency=USD, to_currency=EUR, rate=90, date=today
+        )
+        top_up_wallet(self.user_wallet, 15000)
+        payments = [
+            dict(
+                amount=100, description="First", destination_wallet=self.user2_wallet.id
+            ),
+            dict(
+                amount=100,
+                description="Too much",
+                destination_wallet=self.user2_wallet.id,
+            ),
+            dict(amount=10, description="Nowhere", destination_wallet=999999),
+            dict(
+                amount=-5,
+                description="Invalid",
+                destination_wallet=self.user2_wallet.id,
+            ),
+            dict(
+                amount=50, description="Last", destination_wallet=self.user2_wallet.id
+            ),
+        ]
+        result = self.client.post(
+            reverse("transactions-batch"), dict(payments=payments), format="json"
+        )
+
+        self.assertEqual(result.status_code, 200)
+        results = result.data["results"]
+        self.assertEqual(
+            [item["success"] for item in results], [True, False, False, False, True]
+        )
+        self.assertEqual(
+            results[1]["errors"]["non_field_errors"], ["More gold is needed."]
+        )
+        self.assertIn("amount", results[3]["errors"])
+        self.assertEqual(result.data["balance"], Decimal("0"))
+        self.user2_wallet.refresh_from_db()
+        self.assertEqual(self.user2_wallet.balance, 13500)
+        self.assertEqual(Transaction.objects.count(), 3)  # 1 top up, 2 payments
+        self.assertEqual(
+            Transaction.objects.get(id=results[4]["transaction"]).description, "Last"
+        )
+
+    def test_exchange_rate_cache(self):
+        today = date.today()
+        ExchangeRate.objects.create(
+            from_currency=USD, to_currency=EUR, rate=90, date=today
+        )
+        with self.assertNumQueries(1):
+            find_exchange_rates(dict(to_currency=EUR))
+        with self.assertNumQueries(0):
+            rates = find_exchange_rates(dict(to_currency=EUR))
+            self.assertEqual(rates[0].rate, 90)
+            self.assertEqual(find_exchange_rates(dict(to_currency=CAD)), [])
+
+        # Writing new rates invalidates the cache
+        ExchangeRate.objects.create(
+            from_currency=USD, to_currency=CAD, rate=133, date=today
+        )
+        self.assertEqual(len(find_exchange_rates()), 2)
+
+        # Day roll over evicts everything
+        exchange_rate_cache._day = date(2000, 1, 1)
+        with self.assertNumQueries(1):
+            find_exchange_rates()
+
+    def test_cross_rates(self):
+        today = date.today()
+        for currency, rate in ((USD, 100), (EUR, 90), (CAD, 133)):
+            ExchangeRate.objects.create(
+                from_currency=USD, to_currency=currency, rate=rate, date=today
+            )
+        self.assertEqual(find_cross_rate(EUR, CAD), 148)
+        with self.assertNumQueries(0):
+            self.assertEqual(find_cross_rate(CAD, USD), 75)
+            self.assertEqual(find_cross_rate(EUR, EUR), 100)
+            with self.assertRaises(serializers.ValidationError):
+                find_cross_rate(USD, CNY)
+
+    @override_settings(EXCHANGE_RATES_BACKGROUND_REFRESH=True)
+    def test_get_exchange_rates_serves_stale_rates_while_refreshing(self):
+        yesterday = date.today() - timedelta(days=1)
+        ExchangeRate.objects.create(
+            from_currency=USD, to_currency=USD, rate=100, date=yesterday
+        )
+        ExchangeRate.objects.create(
+            from_currency=USD, to_currency=EUR, rate=90, date=yesterday
+        )
+        with patch("billing.context.rate_refresher.request") as request_refresh:
+            result = self.client.get(f"{reverse('exchange-rates')}?from_currency=USD")
+
+        request_refresh.assert_called_once_with(date.today())
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(len(result.data["results"]), 1)
+        self.assertEqual(result.data["results"][0]["date"], yesterday.isoformat())
+
+    def test_refresh_exchange_rates(self):
+        with patch(
+            "billing.context.get_rate_provider", return_value=FakeRateProvider()
+        ):
+            call_command("refresh_exchange_rates", once=True, days=1)
+            call_command("refresh_exchange_rates", once=True, days=1)
+
+        tomorrow = date.today() + timedelta(days=1)
+        for for_date in (date.today(), tomorrow):
+            self.assertEqual(
+                ExchangeRate.objects.filter(date=for_date).count(),
+                len(SUPPORTED_CURRENCIES),
+            )
+
+    def test_backfill_exchange_rates(self):
+        date_from = date(2019, 9, 1)
+        ExchangeRate.objects.create(
+            from_currency=USD, to_currency=USD, rate=100, date=date(2019, 9, 2)
+        )
+        with patch(
+            "billing.context.get_rate_provider", return_value=FakeRateProvider()
+        ):
+            call_command(
+                "backfill_exchange_rates",
+                "--from=2019-09-01",
+                "--to=2019-09-05",
+                "--concurrency=2",
+                "--chunk-size=2",
+                stdout=io.StringIO(),
+            )
+
+        self.assertEqual(ExchangeRate.objects.filter(date=date(2019, 9, 2)).count(), 1)
+        self.assertEqual(
+            ExchangeRate.objects.filter(date__gte=date_from).count(),
+            1 + 4 * len(SUPPORTED_CURRENCIES),
+        )
+
+    def test_backfill_exchange_rates_from_csv(self):
+        content = (
+            "Date,USD,JPY,CNY,CAD,\n"
+            "2019-09-18,1.1059,119.52,7.8310,1.4652,\n"
+            "2019-09-17,1.1017,N/A,7.8042,1.4600,\n"
+        )
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as file:
+            file.write(content)
+        try:
+            call_command(
+                "backfill_exchange_rates",
+                f"--file={file.name}",
+                "--from=2019-09-18",
+                stdout=io.StringIO(),
+            )
+        finally:
+            os.remove(file.name)
+
+        rates = dict(
+            ExchangeRate.objects.values_list("to_currency", "rate").filter(
+                date=date(2019, 9, 18)
+            )
+        )
+        self.assertEqual(
+            rates,
+            {
+                USD: 100,
+                EUR: 90,
+                CNY: 708,
+                CAD: 132,
+            },
+        )
+        self.assertFalse(ExchangeRate.objects.filter(date=date(2019, 9, 17)).exists())
+
+    def test_report_streaming(self):
+        today = date.today()
+        ExchangeRate.objects.create(
+            from_currency=USD, to_currency=USD, rate=100, date=today
+        )
+        ExchangeRate.objects.create(
+            from_currency=USD, to_currency=EUR, rate=90, date=today
+        )
+        call_command("add_transactions")
+        url = f"{reverse('generate-report')}?username={self.user.username}"
+
+        # Streamed reports are identical to the rendered ones
+        for output_format in ("json", "jsonl", "csv", "xml"):
+            rendered = self.client.get(f"{url}&format={output_format}")
+            streamed = self.client.get(f"{url}&format={output_format}&stream=true")
+            self.assertEqual(streamed.status_code, 200)
+            self.assertEqual(
+                b"".join(streamed.streaming_content), rendered.content, output_format
+            )
+            self.assertEqual(
+                streamed["Content-Disposition"], rendered["Content-Disposition"]
+            )
+
+        streamed = self.client.get(f"{url}&format=jsonl&stream=true")
+        lines = b"".join(streamed.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 101)
+
+        # Other renderers can't be streamed
+        result = self.client.get(f"{url}&format=api&stream=true")
+        self.assertEqual(result.status_code, 400)
+
+    def test_transactions_keyset_pagination(self):
+        for amount in range(1, 26):
+            top_up_wallet(self.user_wallet, amount * 100)
+        top_up_wallet(self.user2_wallet, 10000)  # not in the user list
+
+        seen = []
+        url = f"{reverse('transactions')}?limit=10"
+        while url:
+            result = self.client.get(url)
+            self.assertEqual(result.status_code, 200)
+            self.assertNotIn("count", result.data)
+            seen.extend(item["id"] for item in result.data["results"])
+            url = result.data["next"]
+
+        expected = list(
+            find_transactions(dict(wallet=self.user_wallet))
+            .order_by("-created", "-id")
+            .values_list("transaction_id", flat=True)
+        )
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(seen, expected)
+
+        result = self.client.get(f"{reverse('transactions')}?cursor=garbage")
+        self.assertEqual(result.status_code, 404)
+
+    def test_transactions_feed(self):
+        ExchangeRate.objects.create(
+            from_currency=USD, to_currency=USD, rate=100, date=date.today()
+        )
+        ExchangeRate.objects.create(
+            from_currency=USD, to_currency=EUR, rate=90, date=date.today()
+        )
+        top_up_wallet(self.user_wallet, 10000)
+        post_data = dict(
+            amount=10, destination_wallet=self.user2_wallet.id, description="Payment"
+        )
+        self.client.post(reverse("transactions"), post_data, format="json")
+        self.client.post(
+            reverse("transactions-batch"),
+            dict(payments=[post_data, dict(post_data, amount=5)]),
+            format="json",
+        )
+        self.assertEqual(FeedItem.objects.count(), TransactionEntry.objects.count())
+
+        # Feed items are listed like the transactions they were made from
+        result = self.client.get(reverse("transactions"))
+        self.assertEqual(len(result.data["results"]), 4)
+        for item in result.data["results"]:
+            self.assertEqual(
+                item,
+                TransactionSerializer(Transaction.objects.get(id=item["id"])).data,
+            )
+        payment = result.data["results"][-2]
+        self.assertEqual(
+            [(entry["amount"], entry["currency"]) for entry in payment["entries"]],
+            [("-10.00", USD), ("9.00", EUR)],
+        )
+
+        # The other side sees the payments, not the top up
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user2).access_token}"
+        )
+        result = self.client.get(reverse("transactions"))
+        self.assertEqual(len(result.data["results"]), 3)
+
+    def test_wallet_statement(self):
+        ExchangeRate.objects.create(
+            from_currency=USD, to_currency=USD, rate=100, date=date.today()
+        )
+        ExchangeRate.objects.create(
+            from_currency=USD, to_currency=EUR, rate=90, date=date.today()
+        )
+        for amount in (100, 50, 25):
+            top_up_wallet(self.user_wallet, amount * 100)
+        send_payment(self.user_wallet, self.user2_wallet, 1000, "Payment")
+
+        balances = [10000, 15000, 17500, 16500]
+        entries = TransactionEntry.objects.filter(wallet=self.user_wallet)
+        self.assertEqual(
+            list(entries.order_by("id").values_list("balance_after", flat=True)),
+            balances,
+        )
+        feed = list(
+            FeedItem.objects.filter(wallet=self.user_wallet).order_by("created")
+        )
+        self.assertEqual([item.balance_after for item in feed], balances)
+        self.assertEqual(
+            TransactionEntry.objects.get(wallet=self.user2_wallet).balance_after,
+            900,
+        )
+
+        result = self.client.get(
+            reverse("wallet-statement"),
+            dict(
+                date_from=feed[1].created.isoformat(),
+                date_to=feed[2].created.isoformat(),
+            ),
+        )
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.data["opening_balance"], "100.00")
+        self.assertEqual(result.data["closing_balance"], "175.00")
+        self.assertEqual(
+            [
+                (entry["amount"], entry["balance_after"])
+                for entry in result.data["entries"]
+            ],
+            [("50.00", "150.00"), ("25.00", "175.00")],
+        )
+        self.assertEqual(result.data["entries"][0]["id"], feed[1].transaction_id)
+
+        # Plain dates cover whole days in TIME_ZONE
+        today = timezone.localdate(feed[0].created).isoformat()
+        result = self.client.get(
+            reverse("wallet-statement"), dict(date_from=today, date_to=today)
+        )
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.data["opening_balance"], "0.00")
+        self.assertEqual(result.data["closing_balance"], "165.00")
+        self.assertEqual(len(result.data["entries"]), 4)
+
+        for params in (
+            dict(),
+            dict(date_from=today),
+            dict(date_from="garbage", date_to=today),
+            dict(date_from="2000-01-01", date_to=today),
+            dict(date_from=today, date_to="2000-01-01"),
+        ):
+            result = self.client.get(reverse("wallet-statement"), params)
+            self.assertEqual(result.status_code, 400, params)
+
+        # Migration backfills the same running balances
+        entries.update(balance_after=None)
+        FeedItem.objects.update(balance_after=None)
+        migration = import_module("billing.migrations.0008_balance_after")
+        migration.backfill_balance_after(apps, connection.schema_editor())
+        self.assertEqual(
+            list(entries.order_by("id").values_list("balance_after", flat=True)),
+            balances,
+        )
+        self.assertEqual(
+            list(
+                FeedItem.objects.filter(wallet=self.user_wallet)
+                .order_by("created")
+                .values_list("balance_after", flat=True)
+            ),
+            balances,
+        )
+
+    def test_daily_rollups(self):
+        today = date.today()
+        ExchangeRate.objects.create(
+            from_currency=USD, to_currency=USD, rate=100, date=today
+        )
+        ExchangeRate.objects.create(
+            from_currency=USD, to_currency=EUR, rate=90, date=today
+        )
+        old_top_up = top_up_wallet(self.user_wallet, 4000)
+        top_up_wallet(self.user_wallet, 10000)
+        send_payment(self.user_wallet, self.user2_wallet, 1000, "Payment")
+        post_data = dict(
+            amount=10, destination_wallet=self.user2_wallet.id, description="Payment"
+        )
+        self.client.post(
+            reverse("transactions-batch"),
+            dict(payments=[post_data, dict(post_data, amount=5)]),
+            format="json",
+        )
+
+        rollup = DailyRollup.objects.get(wallet=self.user_wallet, day=today)
+        self.assertEqual(
+            (rollup.currency, rollup.inflow, rollup.outflow, rollup.net),
+            (USD, 14000, 2500, 11500),
+        )
+        self.assertEqual(rollup.entries_count, 5)
+        rollup = DailyRollup.objects.get(wallet=self.user2_wallet, day=today)
+        self.assertEqual((rollup.inflow, rollup.entries_count), (2250, 3))
+
+        # Rebuild gives the same rollups and moves changed history to its day
+        rollups = list(DailyRollup.objects.order_by("id").values())
+        DailyRollup.objects.all().delete()
+        call_command(
+            "rebuild_rollups",
+            "--from",
+            str(today - timedelta(days=40)),
+            "--concurrency",
+            "1",
+        )
+        self.assertEqual(
+            [dict(rollup, id=None) for rollup in rollups],
+            [
+                dict(rollup, id=None)
+                for rollup in DailyRollup.objects.order_by("wallet", "day").values()
+            ],
+        )
+        Transaction.objects.filter(id=old_top_up.id).update(
+            created=self.now.replace(tzinfo=timezone.utc) - timedelta(days=35)
+        )
+        old_day = today - timedelta(days=35)
+        call_command(
+            "rebuild_rollups",
+            "--from",
+            str(today - timedelta(days=40)),
+            "--concurrency",
+            "1",
+        )
+        self.assertEqual(
+            list(
+                DailyRollup.objects.filter(wallet=self.user_wallet)
+                .order_by("day")
+                .values_list("day", "inflow")
+            ),
+            [(old_day, 4000), (today, 10000)],
+        )
+
+        result = self.client.get(reverse("wallet-summary"), dict(period="month"))
+        self.assertEqual(result.status_code, 200)
+        expected = [
+            dict(
+                period=today.replace(day=1).isoformat(),
+                currency=USD,
+                inflow="100.00",
+                outflow="25.00",
+                net="75.00",
+                count=4,
+            )
+        ]
+        if old_day.month != today.month:
+            expected.insert(
+                0,
+                dict(
+                    period=old_day.replace(day=1).isoformat(),
+                    currency=USD,
+                    inflow="40.00",
+                    outflow="0.00",
+                    net="40.00",
+                    count=1,
+                ),
+            )
+        else:
+            expected = [dict(expected[0], inflow="140.00", net="115.00", count=5)]
+        self.assertEqual([dict(row) for row in result.data], expected)
+
+        result = self.client.get(
+            reverse("wallet-summary"), dict(period="day", date_from=today.isoformat())
+        )
+        self.assertEqual([row["period"] for row in result.data], [today.isoformat()])
+
+        result = self.client.get(
+            reverse("wallet-summary"), dict(username=self.user2.username)
+        )
+        self.assertEqual(result.status_code, 403)
+        result = self.client.get(reverse("wallet-summary"), dict(period="year"))
+        self.assertEqual(result.status_code, 400)
+
+    def test_report_summary(self):
+        today = date.today()
+        ExchangeRate.objects.create(
+            from_currency=USD, to_currency=USD, rate=100, date=today
+        )
+        ExchangeRate.objects.create(
+            from_currency=USD, to_currency=EUR, rate=90, date=today
+        )
+        call_command("add_transactions")
+        totals = TransactionEntry.objects.filter(wallet=self.user_wallet).aggregate(
+            count=Count("id"), sum=Sum("amount"), min=Min("amount"), max=Max("amount")
+        )
+        expected = dict(
+            currency=USD,
+            count=101,
+            sum=format_money(totals["sum"]),
+            min=format_money(totals["min"]),
+            max="1000.00",
+        )
+        url = f"{reverse('generate-report')}?username={self.user.username}"
+
+        result = self.client.get(f"{url}&summary=true")
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual([dict(row) for row in result.data], [expected])
+        self.assertEqual(totals["count"], 101)
+
+        for group_by, period in (
+            ("day", today),
+            ("week", today - timedelta(days=today.weekday())),
+            ("month", today.replace(day=1)),
+        ):
+            result = self.client.get(f"{url}&group_by={group_by}")
+            self.assertEqual(
+                [dict(row) for row in result.data],
+                [dict(expected, period=period.isoformat())],
+                group_by,
+            )
+
+        result = self.client.get(f"{url}&group_by=day&format=csv")
+        self.assertEqual(result.status_code, 200)
+        rows = list(csv.DictReader(io.StringIO(result.content.decode())))
+        self.assertEqual(rows, [dict(expected, count="101", period=today.isoformat())])
+        result = self.client.get(f"{url}&group_by=month&format=xml")
+        self.assertEqual(result.status_code, 200)
+        self.assertIn(b"<count>101</count>", result.content)
+
+        result = self.client.get(
+            f"{url}&summary=true&date_from={(self.now + timedelta(days=1)).isoformat()}"
+        )
+        self.assertEqual(result.data, [])
+        result = self.client.get(f"{url}&group_by=year")
+        self.assertEqual(result.status_code, 400)
+
+    def test_fast_serializers(self):
+        today = date.today()
+        ExchangeRate.objects.create(
+            from_currency=USD, to_currency=USD, rate=100, date=today
+        )
+        ExchangeRate.objects.create(
+            from_currency=USD, to_currency=EUR, rate=90, date=today
+        )
+        call_command("add_transactions")
+
+        feed = find_transactions(dict(wallet=self.user_wallet)).order_by("-created")
+        self.assertEqual(
+            [serialize_feed_row(row) for row in feed.values_list(*FEED_COLUMNS)],
+            FeedItemSerializer(feed, many=True).data,
+        )
+        entries = find_report_entries(dict(username=self.user.username))
+        self.assertEqual(
+            [serialize_report_row(row) for row in entries.values_list(*REPORT_COLUMNS)],
+            ReportSerializer(entries, many=True).data,
+        )
+
+        # Rendered responses are byte for byte the same as with DRF serializers
+        url = f"{reverse('generate-report')}?username={self.user.username}"
+        for output_format, renderer in (
+            ("json", JSONRenderer()),
+            ("csv", CSVRenderer()),
+            ("xml", XMLRenderer()),
+        ):
+            result = self.client.get(f"{url}&format={output_format}")
+            self.assertEqual(
+                result.content,
+                force_bytes(renderer.render(ReportSerializer(entries, many=True).data)),
+                output_format,
+            )
+        result = self.client.get(reverse("transactions"), dict(limit=100))
+        self.assertEqual(
+            result.content,
+            JSONRenderer().render(
+                dict(
+                    next=result.data["next"],
+                    results=FeedItemSerializer(feed[:100], many=True).data,
+                )
+            ),
+        )
+
+    def test_cached_authentication(self):
+        url = reverse("transactions")
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertFalse(
+            [query for query in queries if User._meta.db_table in query["sql"]]
+        )
+
+        # Balance is never served from the cache
+        token = RefreshToken.for_user(self.user).access_token
+        Wallet.objects.filter(id=self.user_wallet.id).update(balance=77700)
+        user = CachedJWTAuthentication().get_user(token)
+        self.assertEqual(user.wallet.balance, 77700)
+        result = self.client.post(
+            reverse("top-up-wallet"), dict(amount=100), format="json"
+        )
+        self.assertEqual(result.data["balance"], Decimal(877))
+
+        # Saved users and wallets are dropped from the cache
+        self.user_wallet.currency = EUR
+        self.user_wallet.save()
+        self.assertEqual(CachedJWTAuthentication().get_user(token).wallet.currency, EUR)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+        # Bulk updates send no signals, they need an explicit invalidation
+        self.user.is_active = True
+        self.user.save()
+        self.assertEqual(self.client.get(url).status_code, 200)
+        User.objects.filter(id=self.user.id).update(is_active=False)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        invalidate_cached_users([self.user.id])
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+    def test_wallet_etag(self):
+        ExchangeRate.objects.create(
+            from_currency=USD, to_currency=USD, rate=100, date=date.today()
+        )
+        ExchangeRate.objects.create(
+            from_currency=USD, to_currency=EUR, rate=90, date=date.today()
+        )
+        url = reverse("wallet")
+        result = self.client.get(url)
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(
+            result.data,
+            dict(id=self.user_wallet.id, balance="0.00", currency=USD),
+        )
+        etag = result["ETag"]
+
+        # Unchanged wallet is answered from the wallet row alone
+        with CaptureQueriesContext(connection) as queries:
+            result = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(result.status_code, 304)
+        self.assertEqual(result["ETag"], etag)
+        self.assertFalse(
+            [
+                query
+                for query in queries
+                if TransactionEntry._meta.db_table in query["sql"]
+            ]
+        )
+
+        # Every balance change gets a new ETag
+        top_up_wallet(self.user_wallet, 10000)
+        result = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.data["balance"], "100.00")
+        self.assertNotEqual(result["ETag"], etag)
+        etag = result["ETag"]
+
+        send_payment(self.user_wallet, self.user2_wallet, 1000, "Payment")
+        result = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.data["balance"], "90.00")
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=result["ETag"]).status_code, 304
+        )
+
+    def test_idempotency_key(self):
+        ExchangeRate.objects.create(
+            from_currency=USD, to_currency=USD, rate=100, date=date.today()
+        )
+        ExchangeRate.objects.create(
+            from_currency=USD, to_currency=EUR, rate=90, date=date.today()
+        )
+        url = reverse("top-up-wallet")
+        first = self.client.post(
+            url, dict(amount=100), format="json", HTTP_IDEMPOTENCY_KEY="top-up-1"
+        )
+        self.assertEqual(first.status_code, 201)
+
+        # Repeated request is answered with one read, nothing is written
+        with CaptureQueriesContext(connection) as queries:
+            repeated = self.client.post(
+                url, dict(amount=100), format="json", HTTP_IDEMPOTENCY_KEY="top-up-1"
+            )
+        self.assertEqual(repeated.status_code, 201)
+        self.assertEqual(repeated["Idempotent-Replayed"], "true")
+        self.assertEqual(repeated.content, first.content)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+        # Other keys and requests without a key are new requests
+        self.client.post(
+            url, dict(amount=50), format="json", HTTP_IDEMPOTENCY_KEY="top-up-2"
+        )
+        self.client.post(url, dict(amount=50), format="json")
+        self.user_wallet.refresh_from_db()
+        self.assertEqual(self.user_wallet.balance, 20000)
+
+        # A key belongs to one request
+        result = self.client.post(
+            reverse("transactions"),
+            dict(
+                amount=10,
+                description="Payment",
+                destination_wallet=self.user2_wallet.id,
+            ),
+            format="json",
+            HTTP_IDEMPOTENCY_KEY="top-up-1",
+        )
+        self.assertEqual(result.status_code, 400)
+        self.assertIn("Idempotency-Key", result.data)
+
+        # Failed requests leave no key behind and can be retried
+        payment = dict(
+            amount=1000, description="Payment", destination_wallet=self.user2_wallet.id
+        )
+        result = self.client.post(
+            reverse("transactions"),
+            payment,
+            format="json",
+            HTTP_IDEMPOTENCY_KEY="payment-1",
+        )
+        self.assertEqual(result.status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.filter(key="payment-1").exists())
+        payment["amount"] = 10
+        result = self.client.post(
+            reverse("transactions"),
+            payment,
+            format="json",
+            HTTP_IDEMPOTENCY_KEY="payment-1",
+        )
+        self.assertEqual(result.status_code, 201)
+
+        # Keys are expired in bulk by age
+        IdempotencyKey.objects.filter(key="top-up-1").update(
+            created=timezone.now() - timedelta(days=2)
+        )
+        call_command("expire_idempotency_keys", chunk_size=1, stdout=io.StringIO())
+        self.assertEqual(
+            list(IdempotencyKey.objects.order_by("id").values_list("key", flat=True)),
+            ["top-up-2", "payment-1"],
+        )
+
+    def test_async_payments(self):
+        ExchangeRate.objects.create(
+            from_currency=USD, to_currency=USD, rate=100, date=date.today()
+        )
+        ExchangeRate.objects.create(
+            from_currency=USD, to_currency=EUR, rate=90, date=date.today()
+        )
+        top_up_wallet(self.user_wallet, 10000)
+        url = reverse("transactions") + "?async=true"
+        payment = dict(
+            amount=60, description="Payment", destination_wallet=self.user2_wallet.id
+        )
+        first = self.client.post(url, payment, format="json")
+        second = self.client.post(url, payment, format="json")
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(first.data["status"], PAYMENT_QUEUED)
+        self.assertEqual(first["Location"], first.data["url"])
+        # Replays of a queued payment point to it too
+        replayed = self.client.post(
+            url, payment, format="json", HTTP_IDEMPOTENCY_KEY="queued-1"
+        )
+        self.assertEqual(replayed.status_code, 202)
+        self.assertFalse(replayed.has_header("Idempotent-Replayed"))
+        replayed = self.client.post(
+            url, payment, format="json", HTTP_IDEMPOTENCY_KEY="queued-1"
+        )
+        self.assertEqual(replayed["Idempotent-Replayed"], "true")
+        self.assertEqual(replayed["Location"], replayed.data["url"])
+        QueuedPayment.objects.filter(id=replayed.data["id"]).delete()
+        # Nothing is sent until the worker runs
+        self.assertEqual(TransactionEntry.objects.count(), 1)
+
+        output = io.StringIO()
+        call_command("process_payments", once=True, stdout=output)
+        self.assertIn("Settled 2 payments (1 failed)", output.getvalue())
+        self.assertIn("queue depth 0", output.getvalue())
+
+        result = self.client.get(first["Location"])
+        self.assertEqual(result.data["status"], PAYMENT_COMPLETED)
+        self.assertEqual(
+            Transaction.objects.get(id=result.data["transaction"]).description,
+            "Payment",
+        )
+        result = self.client.get(second["Location"])
+        self.assertEqual(result.data["status"], PAYMENT_FAILED)
+        self.assertEqual(result.data["error"], "More gold is needed.")
+        self.user_wallet.refresh_from_db()
+        self.assertEqual(self.user_wallet.balance, 4000)
+
+        # Queued payments are seen by their sender only
+        client = APIClient()
+        client.force_authenticate(self.user2)
+        self.assertEqual(client.get(first["Location"]).status_code, 404)
+
+    def test_generate_ledger(self):
+        today = date.today()
+        ExchangeRate.objects.create(
+            from_currency=USD, to_currency=USD, rate=100, date=today
+        )
+        ExchangeRate.objects.create(
+            from_currency=USD, to_currency=EUR, rate=90, date=today
+        )
+        # A missing rate is reported before anything is written
+        with self.assertRaisesMessage(CommandError, "No exchange rates stored for CAD"):
+            call_command(
+                "add_transactions", users=6, currencies="USD,CAD", stdout=io.StringIO()
+            )
+        self.assertFalse(User.objects.filter(username__startswith="gen_").exists())
+
+        call_command(
+            "add_transactions",
+            users=6,
+            transactions=300,
+            currencies="USD,EUR",
+            days=10,
+            skew=2,
+            stdout=io.StringIO(),
+        )
+        wallets = Wallet.objects.filter(user__username__startswith="gen_")
+        self.assertEqual(
+            sorted(wallets.values_list("currency", flat=True)), [EUR] * 3 + [USD] * 3
+        )
+        self.assertTrue(wallets.first().user.check_password("password"))
+        self.assertEqual(Transaction.objects.count(), 306)
+        self.assertEqual(Transaction.objects.filter(is_top_up=True).count(), 6)
+        self.assertGreater(
+            Transaction.objects.aggregate(Min("created"))["created__min"],
+            timezone.now() - timedelta(days=11),
+        )
+
+        for wallet in wallets:
+            entries = TransactionEntry.objects.filter(wallet=wallet).order_by(
+                "transaction__created", "id"
+            )
+            self.assertEqual(wallet.balance, sum(entry.amount for entry in entries))
+            self.assertGreaterEqual(wallet.balance, 0)
+            self.assertEqual(entries.last().balance_after, wallet.balance)
+            self.assertEqual(wallet.version, len(entries))
+            self.assertEqual(
+                FeedItem.objects.filter(wallet=wallet).count(), len(entries)
+            )
+            self.assertEqual(
+                DailyRollup.objects.filter(wallet=wallet).aggregate(
+                    Sum("entries_count")
+                )["entries_count__sum"],
+                len(entries),
+            )
+        self.assertEqual(TransactionEntry.objects.count(), 606)
+
+        # Generated history is served like any other
+        client = APIClient()
+        client.force_authenticate(wallets.first().user)
+        result = client.get(reverse("transactions"))
+        self.assertEqual(result.status_code, 200)
+        self.assertTrue(result.data["results"])
+
+        # Wallets drain fast, payments still never send nothing
+        Transaction.objects.all().delete()
+        Wallet.objects.all().delete()
+        call_command(
+            "add_transactions",
+            wallets_per_currency="USD=4,EUR=2",
+            transactions=300,
+            initial_balance=Money.from_decimal(2),
+            stdout=io.StringIO(),
+        )
+        wallets = Wallet.objects.filter(user__username__startswith="gen_")
+        self.assertEqual(
+            sorted(wallets.values_list("currency", flat=True)), [EUR] * 2 + [USD] * 4
+        )
+        self.assertFalse(TransactionEntry.objects.filter(amount=0).exists())
+        self.assertEqual(Transaction.objects.count(), 306)
+        for wallet in wallets:
+            self.assertEqual(
+                wallet.balance,
+                TransactionEntry.objects.filter(wallet=wallet).aggregate(
+                    Sum("amount")
+                )["amount__sum"],
+            )
+
+    def test_request_metrics(self):
+        ExchangeRate.objects.create(
+            from_currency=USD, to_currency=USD, rate=100, date=date.today()
+        )
+        ExchangeRate.objects.create(
+            from_currency=USD, to_currency=EUR, rate=90, date=date.today()
+        )
+        top_up_wallet(self.user_wallet, 10000)
+
+        def sample(name, view, method="GET", status="200"):
+            return (
+                REGISTRY.get_sample_value(
+                    name, dict(view=view, method=method, status=status)
+                )
+                or 0
+            )
+
+        requests = sample("billing_request_queries_count", "transactions")
+        queries = sample("billing_request_queries_sum", "transactions")
+        with CaptureQueriesContext(connection) as captured:
+            result = self.client.get(reverse("transactions"))
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(
+            sample("billing_request_queries_count", "transactions"), requests + 1
+        )
+        self.assertEqual(
+            sample("billing_request_queries_sum", "transactions"),
+            queries + len(captured),
+        )
+        self.assertGreater(
+            sample("billing_request_sql_duration_seconds_sum", "transactions"), 0
+        )
+
+        # Streamed responses are recorded with their queries once sent
+        requests = sample("billing_request_queries_count", "generate-report")
+        queries = sample("billing_request_queries_sum", "generate-report")
+        url = f"{reverse('generate-report')}?username={self.user.username}&format=csv&stream=true"
+        result = self.client.get(url)
+        self.assertEqual(
+            sample("billing_request_queries_count", "generate-report"), requests
+        )
+        b"".join(result.streaming_content)
+        self.assertEqual(
+            sample("billing_request_queries_count", "generate-report"), requests + 1
+        )
+        self.assertGreater(
+            sample("billing_request_queries_sum", "generate-report"), queries
+        )
+
+        # Unknown URLs share one series
+        self.client.get("/no-such-page/")
+        self.assertTrue(
+            sample("billing_request_duration_seconds_count", "unresolved", status="404")
+        )
+
+        # Served to allowed networks only, localhost by default
+        result = self.anon_client.get(reverse("metrics"), REMOTE_ADDR="203.0.113.5")
+        self.assertEqual(result.status_code, 403)
+        result = self.anon_client.get(
+            reverse("metrics"),
+            REMOTE_ADDR="127.0.0.1",
+            HTTP_X_FORWARDED_FOR="203.0.113.5",
+        )
+        self.assertEqual(result.status_code, 200)
+        with override_settings(METRICS_ALLOWED_NETWORKS=["10.0.0.0/8", "203.0.113.5"]):
+            result = self.anon_client.get(reverse("metrics"), REMOTE_ADDR="203.0.113.5")
+        self.assertEqual(result.status_code, 200)
+        self.assertIn(
+            b'billing_request_queries_count{method="GET",status="200",view="transactions"}',
+            result.content,
+        )
+
+    def test_request_profiling(self):
+        ExchangeRate.objects.create(
+            from_currency=USD, to_currency=USD, rate=100, date=date.today()
+        )
+        url = reverse("exchange-rates")
+        with tempfile.TemporaryDirectory() as profile_dir, override_settings(
+            PROFILE_DIR=profile_dir, PROFILE_MAX_FILES=2
+        ):
+            # Only staff can ask for a profile
+            result = self.client.get(url, HTTP_X_PROFILE="1")
+            self.assertEqual(result.status_code, 200)
+            self.assertNotIn("X-Profile-Id", result)
+            self.assertFalse(os.listdir(profile_dir))
+
+            self.user.is_staff = True
+            self.user.save()
+            result = self.client.get(url, HTTP_X_PROFILE="1")
+            self.assertEqual(result.status_code, 200)
+            profile_id = result["X-Profile-Id"]
+            (file_name,) = os.listdir(profile_dir)
+            self.assertTrue(file_name.startswith(profile_id))
+            self.assertTrue(file_name.endswith("_GET_200_exchange-rates.prof"))
+
+            # Sampled requests of any user, the oldest profiles are deleted
+            with override_settings(PROFILE_SAMPLE_RATE=1):
+                self.anon_client.get(url)
+                self.anon_client.get(url)
+            file_names = sorted(os.listdir(profile_dir))
+            self.assertEqual(len(file_names), 2)
+            self.assertNotIn(file_name, file_names)
+            self.assertTrue(file_names[0].endswith("_GET_401_exchange-rates.prof"))
+
+            output = io.StringIO()
+            call_command("show_profiles", stdout=output)
+            self.assertEqual(len(output.getvalue().splitlines()), 2)
+            self.assertIn("exchange-rates", output.getvalue())
+
+            output = io.StringIO()
+            call_command("show_profiles", "--summary", stdout=output)
+            self.assertIn("2 profiles", output.getvalue())
+            self.assertIn("cumulative", output.getvalue())
+
+        # Profiles that can't be saved are logged, responses are sent anyway
+        with tempfile.NamedTemporaryFile() as not_a_dir, override_settings(
+            PROFILE_DIR=not_a_dir.name
+        ), self.assertLogs("billing.profiling", "WARNING"):
+            result = self.client.get(url, HTTP_X_PROFILE="1")
+            self.assertEqual(result.status_code, 200)
+            streamed = self.client.get(
+                f"{reverse('generate-report')}?username={self.user.username}"
+                "&format=csv&stream=true",
+                HTTP_X_PROFILE="1",
+            )
+            self.assertTrue(b"".join(streamed.streaming_content))
+
+    @skipUnless(connection.vendor == "postgresql", "EXPLAIN plans are PostgreSQL's")
+    def test_slow_query_capture(self):
+        ExchangeRate.objects.create(
+            from_currency=USD, to_currency=USD, rate=100, date=date.today()
+        )
+        top_up_wallet(self.user_wallet, 10000)
+        with tempfile.TemporaryDirectory() as capture_dir, override_settings(
+            SLOW_QUERY_THRESHOLD=0, SLOW_QUERY_DIR=capture_dir, SLOW_QUERY_MAX_FILES=100
+        ), patch("billing.slow_queries.captured", set()), connection.execute_wrapper(
+            observe_query
+        ):
+            result = self.client.get(reverse("transactions"))
+            self.assertEqual(result.status_code, 200)
+            file_names = set(os.listdir(capture_dir))
+            self.assertTrue(file_names)
+
+            captures = []
+            for file_name in file_names:
+                with open(os.path.join(capture_dir, file_name)) as capture_file:
+                    captures.append(json.load(capture_file))
+            (capture,) = [
+                capture
+                for capture in captures
+                if any(
+                    "TransactionViewset.list" in name for name in capture["location"]
+                )
+                and FeedItem._meta.db_table in capture["sql"]
+            ]
+            self.assertIn("actual time", capture["plan"])
+            self.assertIn("Buffers", capture["plan"])
+
+            # The same queries with other values are captured once
+            self.client.get(reverse("transactions") + "?limit=5&offset=1")
+            self.assertEqual(set(os.listdir(capture_dir)), file_names)
+
+            # Writes are explained without running them again
+            result = self.client.post(
+                reverse("top-up-wallet"), dict(amount=10), format="json"
+            )
+            self.assertEqual(result.status_code, 201)
+            self.user_wallet.refresh_from_db()
+            self.assertEqual(self.user_wallet.balance, 11000)
+            updates = []
+            for file_name in set(os.listdir(capture_dir)) - file_names:
+                with open(os.path.join(capture_dir, file_name)) as capture_file:
+                    capture = json.load(capture_file)
+                if capture["sql"].startswith("UPDATE"):
+                    updates.append(capture)
+            self.assertTrue(updates)
+            for capture in updates:
+                self.assertNotIn("actual time", capture["plan"])
+                self.assertFalse(capture["plan"].startswith("EXPLAIN failed"))
+
+            output = io.StringIO()
+            call_command("show_slow_queries", stdout=output)
+            self.assertEqual(
+                len(output.getvalue().splitlines()), len(os.listdir(capture_dir))
+            )
+            output = io.StringIO()
+            call_command("show_slow_queries", updates[0]["fingerprint"], stdout=output)
+            self.assertIn(updates[0]["sql"], output.getvalue())
+
+        # Captures that can't be saved are logged, queries succeed anyway
+        with tempfile.NamedTemporaryFile() as not_a_dir, override_settings(
+            SLOW_QUERY_THRESHOLD=0, SLOW_QUERY_DIR=not_a_dir.name
+        ), patch("billing.slow_queries.captured", set()), connection.execute_wrapper(
+            observe_query
+        ), self.assertLogs(
+            "billing.slow_queries", "WARNING"
+        ):
+            result = self.client.get(reverse("transactions"))
+            self.assertEqual(result.status_code, 200)
+
+    def test_money_minor_units(self):
+        # Integer rounding matches Decimal.quantize, half to even
+        for amount, rate, expected in (
+            (1000, 90, 900),
+            (5, 90, 4),  # 0.045 -> 0.04
+            (15, 90, 14),  # 0.135 -> 0.14
+            (-15, 90, -14),
+            (12345, 133, 16419),
+        ):
+            self.assertEqual(convert_amount(amount, rate), expected)
+            self.assertEqual(
+                expected,
+                to_scaled_int(
+                    (to_decimal(amount) * to_decimal(rate)).quantize(
+                        Decimal("0.01"), rounding=ROUND_HALF_EVEN
+                    )
+                ),
+            )
+        self.assertEqual(calculate_currency_rate(133, 90), 148)
+        self.assertEqual(Money.from_decimal("12.345"), 1234)
+        self.assertEqual(str(Money(-5)), "-5")
+        self.assertEqual(Money(-5).format(), "-0.05")
+
+        result = self.client.post(
+            reverse("top-up-wallet"), dict(amount="0.10"), format="json"
+        )
+        self.assertEqual(result.status_code, 201)
+        self.assertEqual(result.json()["balance"], 0.1)
+        self.assertEqual(result.data["transaction"]["entries"][0]["amount"], "0.10")
+        self.user_wallet.refresh_from_db()
+        self.assertEqual(self.user_wallet.balance, 10)
+        result = self.client.post(
+            reverse("top-up-wallet"), dict(amount="0.105"), format="json"
+        )
+        self.assertEqual(result.status_code, 400)
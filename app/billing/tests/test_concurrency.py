@@ -0,0 +1,216 @@
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import date
+
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+from django.test import TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from billing.cache import exchange_rate_cache
+from billing.constants import USD, PAYMENT_QUEUED, PAYMENT_COMPLETED
+from billing.context import (
+    queue_payment,
+    send_payment,
+    settle_queued_payments,
+    top_up_wallet,
+)
+from billing.management.commands.rebuild_rollups import rebuild_rollups
+from billing.models import (
+    User,
+    Wallet,
+    Transaction,
+    TransactionEntry,
+    ExchangeRate,
+    QueuedPayment,
+    DailyRollup,
+)
+
+
+class TestConcurrentPayments(TransactionTestCase):
+    """Payments from several threads, each thread uses its own DB connection"""
+
+    # Raise it for a longer run, `manage benchmark contention` times the payments
+    payments = int(os.environ.get("STRESS_TEST_PAYMENTS", 2000))
+
+    def setUp(self):
+        self.wallets = []
+        for index in range(4):
+            user = User.objects.create(username=f"user{index}")
+            wallet = Wallet.objects.create(user=user, currency=USD)
+            top_up_wallet(wallet, 10000)
+            self.wallets.append(wallet)
+
+    def pay(self, seed):
+        randomizer = random.Random(seed)
+        source_wallet, destination_wallet = randomizer.sample(self.wallets, 2)
+        try:
+            send_payment(
+                source_wallet=Wallet.objects.get(id=source_wallet.id),
+                destination_wallet=Wallet.objects.get(id=destination_wallet.id),
+                amount=randomizer.randint(1, 60) * 100,
+                description="Concurrent payment",
+            )
+            return True
+        except serializers.ValidationError:
+            return False
+        finally:
+            connection.close()
+
+    def test_concurrent_payments_never_overdraw(self):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(self.pay, range(self.payments)))
+
+        self.assertTrue(any(results))
+        self.assertFalse(all(results))  # some payments had to be rejected
+        total = 0
+        for wallet in Wallet.objects.all():
+            ledger_balance = TransactionEntry.objects.filter(wallet=wallet).aggregate(
+                Sum("amount")
+            )["amount__sum"]
+            self.assertGreaterEqual(wallet.balance, 0)
+            self.assertEqual(wallet.balance, ledger_balance)
+            total += wallet.balance
+        self.assertEqual(total, 40000)
+
+    def rebuild_today(self):
+        try:
+            today = timezone.localdate()
+            return rebuild_rollups(today, today)
+        finally:
+            connection.close()
+
+    def test_rebuild_rollups_during_payment(self):
+        DailyRollup.objects.all().delete()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            with transaction.atomic():
+                # Inserts rollups of today the rebuild can't see yet
+                send_payment(
+                    source_wallet=self.wallets[0],
+                    destination_wallet=self.wallets[1],
+                    amount=2500,
+                    description="Payment during rebuild",
+                )
+                rebuilt = executor.submit(self.rebuild_today)
+                # The rebuild waits for the payment
+                self.assertFalse(wait([rebuilt], timeout=1).done)
+            self.assertEqual(rebuilt.result(), 4)
+
+        ledger = TransactionEntry.objects.values("wallet").annotate(
+            inflow=Sum("amount", filter=Q(amount__gt=0)),
+            entries_count=Count("id"),
+        )
+        self.assertEqual(
+            {(row["wallet"], row["inflow"], row["entries_count"]) for row in ledger},
+            set(DailyRollup.objects.values_list("wallet", "inflow", "entries_count")),
+        )
+
+
+class TestConcurrentIdempotencyKeys(TransactionTestCase):
+    """Identical top-ups with one Idempotency-Key racing from several threads"""
+
+    workers = 8
+
+    def setUp(self):
+        self.user = User.objects.create(username="user")
+        self.wallet = Wallet.objects.create(user=self.user, currency=USD)
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+        self.barrier = threading.Barrier(self.workers)
+
+    def top_up(self, _):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token}")
+        self.barrier.wait()
+        try:
+            return client.post(
+                reverse("top-up-wallet"),
+                dict(amount=100),
+                format="json",
+                HTTP_IDEMPOTENCY_KEY="same-key",
+            )
+        finally:
+            connection.close()
+
+    def test_identical_keys_race(self):
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            responses = list(executor.map(self.top_up, range(self.workers)))
+
+        self.assertEqual({response.status_code for response in responses}, {201})
+        self.assertEqual(len({response.content for response in responses}), 1)
+        replayed = [
+            response
+            for response in responses
+            if response.has_header("Idempotent-Replayed")
+        ]
+        self.assertEqual(len(replayed), self.workers - 1)
+        self.assertEqual(Transaction.objects.count(), 1)
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, 10000)
+
+
+class TestConcurrentPaymentWorkers(TransactionTestCase):
+    """Several process_payments workers settling one queue"""
+
+    def setUp(self):
+        exchange_rate_cache.invalidate()
+        ExchangeRate.objects.create(
+            from_currency=USD, to_currency=USD, rate=100, date=date.today()
+        )
+        self.wallets = []
+        for index in range(4):
+            user = User.objects.create(username=f"user{index}")
+            wallet = Wallet.objects.create(user=user, currency=USD)
+            top_up_wallet(wallet, 10000)
+            self.wallets.append(wallet)
+        randomizer = random.Random(0)
+        for _ in range(300):
+            source_wallet, destination_wallet = randomizer.sample(self.wallets, 2)
+            queue_payment(
+                source_wallet,
+                destination_wallet,
+                randomizer.randint(1, 60) * 100,
+                "Queued payment",
+            )
+
+    def work(self, _):
+        settled = []
+        try:
+            while True:
+                payments = settle_queued_payments(batch_size=10)
+                if not payments:
+                    return settled
+                settled.extend(payment.id for payment in payments)
+        finally:
+            connection.close()
+
+    def test_workers_settle_every_payment_once(self):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            settled = [
+                payment_id
+                for worker_settled in executor.map(self.work, range(4))
+                for payment_id in worker_settled
+            ]
+
+        self.assertEqual(
+            sorted(settled), sorted(QueuedPayment.objects.values_list("id", flat=True))
+        )
+        self.assertFalse(QueuedPayment.objects.filter(status=PAYMENT_QUEUED).exists())
+        completed = QueuedPayment.objects.filter(status=PAYMENT_COMPLETED).count()
+        self.assertTrue(0 < completed < 300)
+        # Top-ups and one transaction per completed payment
+        self.assertEqual(Transaction.objects.count(), 4 + completed)
+        total = 0
+        for wallet in Wallet.objects.all():
+            ledger_balance = TransactionEntry.objects.filter(wallet=wallet).aggregate(
+                Sum("amount")
+            )["amount__sum"]
+            self.assertGreaterEqual(wallet.balance, 0)
+            self.assertEqual(wallet.balance, ledger_balance)
+            total += wallet.balance
+        self.assertEqual(total, 40000)
@@ -0,0 +1,219 @@
+import re
+from datetime import date, timedelta
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import now
+from mock import patch
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from billing.cache import exchange_rate_cache
+from billing.constants import USD, EUR, SUPPORTED_CURRENCIES
+from billing.context import (
+    find_cross_rates,
+    find_report_entries,
+    find_wallet_balance,
+    send_payment,
+    top_up_wallet,
+)
+from billing.models import (
+    User,
+    Wallet,
+    Transaction,
+    ExchangeRate,
+    TransactionEntry,
+    FeedItem,
+    DailyRollup,
+)
+from billing.management.commands.rebuild_rollups import rebuild_rollups
+
+# Large enough for the planner to prefer indexes, small enough for a quick setup
+USERS = 2000
+TRANSACTIONS = 100000
+RATE_DAYS = 3 * 365
+
+LEDGER_TABLES = tuple(
+    model._meta.db_table
+    for model in (
+        User,
+        Wallet,
+        Transaction,
+        TransactionEntry,
+        ExchangeRate,
+        FeedItem,
+        DailyRollup,
+    )
+)
+SEQ_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+class TestQueryPlans(TestCase):
+    """Hot queries must not scan whole ledger tables.
+
+    Every statement the scenarios run is captured and EXPLAINed, a sequential
+    scan of a ledger table means an index is missing or can't be used.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.bulk_create(
+            User(username=f"user{index}", password="!") for index in range(USERS)
+        )
+        users = User.objects.filter(username__startswith="user").order_by("id")
+        Wallet.objects.bulk_create(
+            Wallet(user=user, currency=EUR if user.id % 2 else USD) for user in users
+        )
+        wallet_ids = list(Wallet.objects.order_by("id").values_list("id", flat=True))
+
+        today = date.today()
+        ExchangeRate.objects.bulk_create(
+            ExchangeRate(
+                from_currency=USD,
+                to_currency=currency,
+                rate=100 if currency == USD else 90,
+                date=today - timedelta(days=offset),
+            )
+            for offset in range(RATE_DAYS)
+            for currency in SUPPORTED_CURRENCIES
+        )
+
+        with connection.cursor() as cursor:
+            # Single entry transactions a minute apart, spread over all wallets.
+            cursor.execute(
+                f"""
+                WITH seeded AS (
+                    INSERT INTO {Transaction._meta.db_table} (created, description, is_top_up)
+                    SELECT now() - make_interval(mins => n), 'Seed', false
+                    FROM generate_series(1, %s) AS n
+                    RETURNING id, created
+                ), entries AS (
+                    INSERT INTO {TransactionEntry._meta.db_table} (amount, wallet_id, transaction_id)
+                    SELECT 1, (%s::int[])[1 + id %% %s], id FROM seeded
+                    RETURNING id, amount, wallet_id, transaction_id
+                )
+                INSERT INTO {FeedItem._meta.db_table} (
+                    wallet_id, entry_id, transaction_id, created, description,
+                    is_top_up, amount, currency
+                )
+                SELECT entries.wallet_id, entries.id, seeded.id, seeded.created,
+                    'Seed', false, entries.amount, wallet.currency
+                FROM entries
+                JOIN seeded ON seeded.id = entries.transaction_id
+                JOIN {Wallet._meta.db_table} wallet ON wallet.id = entries.wallet_id
+                """,
+                [TRANSACTIONS, wallet_ids, len(wallet_ids)],
+            )
+            # Stats left by earlier tests describe nearly empty tables,
+            # the rollup rebuild needs fresh ones to join the seeded rows.
+            cursor.execute(f"ANALYZE {', '.join(LEDGER_TABLES)}")
+            rebuild_rollups(today - timedelta(days=TRANSACTIONS // 1440 + 1), today)
+            cursor.execute(f"ANALYZE {', '.join(LEDGER_TABLES)}")
+
+    def setUp(self):
+        exchange_rate_cache.invalidate()
+        self.user = User.objects.get(username="user1")
+        self.wallet = self.user.wallet
+        self.other_wallet = User.objects.get(username="user2").wallet
+        top_up_wallet(self.wallet, 100000)
+
+        self.client = APIClient()
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {str(refresh.access_token)}"
+        )
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN {sql}")
+            return "\n".join(row[0] for row in cursor.fetchall())
+
+    def assertNoSeqScans(self, queries):
+        statements = [
+            query["sql"]
+            for query in queries
+            if query["sql"].lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE"))
+        ]
+        self.assertTrue(statements)
+        for sql in statements:
+            plan = self.explain(sql)
+            scanned = set(SEQ_SCAN.findall(plan)) & set(LEDGER_TABLES)
+            self.assertFalse(scanned, f"Sequential scan in:\n{sql}\n{plan}")
+
+    def test_transactions_list(self):
+        with CaptureQueriesContext(connection) as queries:
+            result = self.client.get(reverse("transactions"), dict(limit=10))
+            self.assertEqual(result.status_code, 200)
+            self.client.get(result.data["next"])
+        self.assertNoSeqScans(queries)
+
+    def test_report(self):
+        with CaptureQueriesContext(connection) as queries:
+            result = self.client.get(
+                reverse("generate-report"), dict(username=self.user.username)
+            )
+            self.assertEqual(result.status_code, 200)
+            self.client.get(
+                reverse("generate-report"),
+                dict(
+                    username=self.user.username,
+                    date_from=result.data[-1]["created"],
+                    date_to=result.data[0]["created"],
+                ),
+            )
+            self.client.get(
+                reverse("generate-report"),
+                dict(username=self.user.username, group_by="month"),
+            )
+        self.assertNoSeqScans(queries)
+
+    def test_report_entries_by_date(self):
+        with CaptureQueriesContext(connection) as queries:
+            list(
+                find_report_entries(
+                    dict(
+                        username=self.user.username,
+                        date_from=date.today() - timedelta(days=7),
+                    )
+                )
+            )
+        self.assertNoSeqScans(queries)
+
+    def test_statement(self):
+        with CaptureQueriesContext(connection) as queries:
+            find_wallet_balance(self.wallet, now())
+            result = self.client.get(
+                reverse("wallet-statement"),
+                dict(
+                    date_from=(now() - timedelta(days=7)).isoformat(),
+                    date_to=now().isoformat(),
+                ),
+            )
+            self.assertEqual(result.status_code, 200)
+        self.assertNoSeqScans(queries)
+
+    def test_summary(self):
+        with CaptureQueriesContext(connection) as queries:
+            result = self.client.get(
+                reverse("wallet-summary"),
+                dict(period="week", date_from=date.today() - timedelta(days=30)),
+            )
+            self.assertEqual(result.status_code, 200)
+        self.assertNoSeqScans(queries)
+
+    def test_send_payment(self):
+        with CaptureQueriesContext(connection) as queries:
+            send_payment(self.wallet, self.other_wallet, 1000, "Payment")
+        self.assertNoSeqScans(queries)
+
+    @patch("billing.context.rate_refresher")
+    def test_exchange_rates(self, rate_refresher):
+        with CaptureQueriesContext(connection) as queries:
+            # Cache miss loads the date, a future date falls back to the latest.
+            self.assertEqual(find_cross_rates()[0], date.today())
+            self.assertEqual(
+                find_cross_rates(date.today() + timedelta(days=1))[0], date.today()
+            )
+        self.assertNoSeqScans(queries)
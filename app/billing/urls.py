@@ -10,12 +10,18 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from billing.metrics import metrics
 from billing.views import (
     index,
     TopUpWalletView,
+    WalletView,
+    WalletStatementView,
+    WalletSummaryView,
     ExchangeRateList,
     SignupView,
     TransactionViewset,
+    TransactionBatchView,
+    QueuedPaymentView,
     ReportView,
 )
 
@@ -55,14 +61,30 @@ urlpatterns = [
     path("api/signup/", SignupView.as_view(), name="signup"),
     path("api/login/", TokenObtainPairView.as_view(), name="login"),
     path("api/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
+    path("api/wallets/me/", WalletView.as_view(), name="wallet"),
     path("api/wallets/top-up/", TopUpWalletView.as_view(), name="top-up-wallet"),
+    path(
+        "api/wallets/statement/", WalletStatementView.as_view(), name="wallet-statement"
+    ),
+    path("api/wallets/summary/", WalletSummaryView.as_view(), name="wallet-summary"),
     path("api/exchange-rates/", ExchangeRateList.as_view(), name="exchange-rates"),
     path(
         "api/transactions/",
         TransactionViewset.as_view({"get": "list", "post": "post"}),
         name="transactions",
     ),
+    path(
+        "api/transactions/batch/",
+        TransactionBatchView.as_view(),
+        name="transactions-batch",
+    ),
+    path(
+        "api/transactions/queue/<int:pk>/",
+        QueuedPaymentView.as_view(),
+        name="queued-payment",
+    ),
     path("api/report/", ReportView.as_view(), name="generate-report"),
+    path("metrics/", metrics, name="metrics"),
 ]
 
 # Host the static from uWSGI
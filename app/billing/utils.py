@@ -1,4 +1,4 @@
-from decimal import Decimal
+from billing.money import RATE_SCALE, divide
 
 
 def calculate_currency_rate(target_rate, base_rate):
@@ -7,22 +7,57 @@ def calculate_currency_rate(target_rate, base_rate):
     We can basically calculate any currency rate by dividing
     its current rate by base currency rate.
     Default currency is USD with base_rate = 1
+    Rates are integers scaled by RATE_SCALE, 133 is 1.33.
 
     Examples:
     We have in DB:
-        USD to USD: 1
-        USD to EUR: 0.90
-        USD to CAD: 1.33
-        USD to CNY: 7.09
+        USD to USD: 100 (1)
+        USD to EUR: 90 (0.90)
+        USD to CAD: 133 (1.33)
+        USD to CNY: 709 (7.09)
     Example 1:
         We want CAD to USD:
         "base" is CAD=1.33, USD to USD rate is 1,
         we need to divide the original USD to USD rate by new base_rate
-        Result: 1 / 1.33 = 0.75
+        Result: 1 / 1.33 = 0.75, 75
     Example 2:
         We want EUR to CAD:
         "base" is EUR=0.9, USD to CAD is 1.33,
         we need to divide the original USD to CAD rate by new base_rate.
-        Result: 1.33 / 0.90 = 1.48.
+        Result: 1.33 / 0.90 = 1.48, 148
     """
-    return Decimal(target_rate / base_rate).quantize(Decimal("1.00"))
+    return divide(target_rate * RATE_SCALE, base_rate)
+
+
+def convert_amount(amount, rate):
+    """Converts amount in minor units with a scaled cross rate, see `CrossRates`
+
+    Rounded half to even to minor units.
+    """
+    return divide(amount * rate, RATE_SCALE)
+
+
+class CrossRates:
+    """Rates between every pair of currencies for a single date.
+
+    Computed once from USD based rates with `calculate_currency_rate`,
+    so any (from_currency, to_currency) pair is a single dict lookup.
+    """
+
+    __slots__ = ("_rates",)
+
+    def __init__(self, usd_rates):
+        """
+        :param usd_rates: dict() of currency -> USD to currency int scaled rate
+        """
+        self._rates = {
+            (from_currency, to_currency): calculate_currency_rate(
+                target_rate=to_rate, base_rate=from_rate
+            )
+            for from_currency, from_rate in usd_rates.items()
+            for to_currency, to_rate in usd_rates.items()
+        }
+
+    def get(self, from_currency, to_currency):
+        """Returns int scaled rate or None if either currency has no stored rate"""
+        return self._rates.get((from_currency, to_currency))
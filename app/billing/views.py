@@ -1,12 +1,13 @@
 from datetime import date
 
-from django.db.models import F
+from django.http import StreamingHttpResponse
 from django.shortcuts import redirect
 from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control, quote_etag
 from rest_framework import status, viewsets
 from rest_framework.authentication import BasicAuthentication
 from rest_framework.exceptions import PermissionDenied
-from rest_framework.generics import CreateAPIView, ListAPIView
+from rest_framework.generics import CreateAPIView, ListAPIView, RetrieveAPIView
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework import serializers
@@ -15,23 +16,48 @@ from rest_framework.views import APIView
 from rest_framework_csv.renderers import CSVRenderer
 from rest_framework_xml.renderers import XMLRenderer
 
-from billing.constants import USD
+from billing.constants import USD, REPORT_CHUNK_SIZE, REPORT_GROUPS
 from billing.context import (
     top_up_wallet,
     find_exchange_rates,
     send_payment,
+    send_payments,
+    queue_payment,
+    find_queued_payments,
     find_transactions,
-    update_exchange_rates_for_date_if_not_exist,
+    find_cross_rates,
+    find_report_entries,
+    find_report_summary,
+    find_statement,
+    find_rollup_summary,
 )
-from billing.models import TransactionEntry
+from billing.fast_serializers import (
+    FEED_COLUMNS,
+    REPORT_COLUMNS,
+    serialize_feed_row,
+    serialize_report_row,
+)
+from billing.idempotency import idempotent_response
+from billing.money import to_decimal
+from billing.pagination import KeysetPagination
+from billing.reports import REPORT_STREAMS, JSONLinesRenderer
 from billing.serializers import (
     TransactionSerializer,
+    FeedItemSerializer,
+    WalletSerializer,
     TopUpSerializer,
     ExchangeRateSerializerRead,
     UserSerializerWrite,
     UserSerializerRead,
     PaymentSerializer,
-    ReportSerializer,
+    PaymentItemSerializer,
+    BatchPaymentSerializer,
+    QueuedPaymentSerializer,
+    ReportSummarySerializer,
+    StatementFilterSerializer,
+    StatementSerializer,
+    SummaryFilterSerializer,
+    SummarySerializer,
 )
 
 
@@ -60,53 +86,202 @@ class TopUpWalletView(CreateAPIView):
     def post(self, request, *args, **kwargs):
         serializer_instance = self.get_serializer(data=request.data)
         serializer_instance.is_valid(raise_exception=True)
-        transaction_instance = top_up_wallet(
-            request.user.wallet, serializer_instance.validated_data["amount"]
-        )
-        return Response(
-            status=status.HTTP_201_CREATED,
-            data=dict(
-                balance=request.user.wallet.balance,
-                transaction=TransactionSerializer(instance=transaction_instance).data,
-            ),
+
+        def handler():
+            transaction_instance = top_up_wallet(
+                request.user.wallet, serializer_instance.validated_data["amount"]
+            )
+            return Response(
+                status=status.HTTP_201_CREATED,
+                data=dict(
+                    balance=to_decimal(request.user.wallet.balance),
+                    transaction=TransactionSerializer(
+                        instance=transaction_instance
+                    ).data,
+                ),
+            )
+
+        return idempotent_response(request, handler)
+
+
+class WalletView(APIView):
+    def get(self, request):
+        """Returns the user wallet with its balance.
+
+        The ETag changes with every balance change, send it back in `If-None-Match`
+        to get 304 Not Modified while the wallet stays the same.
+        """
+        wallet = request.user.wallet
+        wallet.refresh_from_db(fields=["balance", "version"])
+        etag = quote_etag(f"{wallet.id}-{wallet.version}")
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = Response(WalletSerializer(wallet).data)
+        response["ETag"] = etag
+        # Responses are per user, shared caches must not keep them
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class WalletStatementView(APIView):
+    def get(self, request):
+        """Returns the user wallet entries of a period, oldest first,
+        with the balance before the period and after it.
+
+        `date_from` and `date_to` are required, dates or datetimes, a date `date_to`
+        includes the whole day. Periods are at most STATEMENT_MAX_DAYS long.
+        Every entry has the balance after it.
+        """
+        filter_serializer = StatementFilterSerializer(data=request.query_params)
+        filter_serializer.is_valid(raise_exception=True)
+        statement = find_statement(
+            dict(wallet=request.user.wallet, **filter_serializer.validated_data)
         )
+        return Response(StatementSerializer(statement).data)
+
+
+class WalletSummaryView(APIView):
+    def get(self, request):
+        """Returns inflow, outflow and net of the user wallet by day, week or month.
+
+        Read from daily rollups, filtered by `date_from` and `date_to` dates.
+        Staff can pass `username` of another user.
+        """
+        filter_serializer = SummaryFilterSerializer(data=request.query_params)
+        filter_serializer.is_valid(raise_exception=True)
+        filters = filter_serializer.validated_data
+        filters.setdefault("username", request.user.username)
+        if not request.user.is_staff and filters["username"] != request.user.username:
+            raise PermissionDenied(
+                "You need staff permissions to see another user summary."
+            )
+
+        return Response(SummarySerializer(find_rollup_summary(filters), many=True).data)
 
 
 class TransactionViewset(viewsets.ModelViewSet):
+    pagination_class = KeysetPagination
+
     def get_serializer_class(self):
         if self.request.method == "POST":
             return PaymentSerializer
-        return TransactionSerializer
+        return FeedItemSerializer
 
     def get_queryset(self):
         return find_transactions(dict(wallet=self.request.user.wallet))
 
+    def list(self, request, *args, **kwargs):
+        # Same output as FeedItemSerializer, built straight from row tuples
+        page = self.paginate_queryset(
+            self.get_queryset().values_list(*FEED_COLUMNS, named=True)
+        )
+        return self.get_paginated_response([serialize_feed_row(row) for row in page])
+
     def post(self, request, *args, **kwargs):
+        """Sends a payment from the user wallet.
+
+        With `async=true` the payment is queued and settled by the process_payments
+        worker, the response is 202 with the URL of the queued payment status.
+        """
         payment_serializer = PaymentSerializer(data=request.data)
         payment_serializer.is_valid(raise_exception=True)
+
+        if request.query_params.get("async") == "true":
+
+            def queue_handler():
+                queued_payment = queue_payment(
+                    source_wallet=request.user.wallet,
+                    **payment_serializer.validated_data,
+                )
+                data = QueuedPaymentSerializer(
+                    queued_payment, context=dict(request=request)
+                ).data
+                return Response(
+                    status=status.HTTP_202_ACCEPTED,
+                    data=data,
+                    headers=dict(Location=data["url"]),
+                )
+
+            return idempotent_response(request, queue_handler)
+
+        def pay_handler():
+            user_wallet = request.user.wallet
+            transaction_instance = send_payment(
+                source_wallet=user_wallet, **payment_serializer.validated_data
+            )
+            return Response(
+                status=status.HTTP_201_CREATED,
+                data=dict(
+                    balance=to_decimal(user_wallet.balance),
+                    transaction=TransactionSerializer(
+                        instance=transaction_instance
+                    ).data,
+                ),
+            )
+
+        return idempotent_response(request, pay_handler)
+
+
+class QueuedPaymentView(RetrieveAPIView):
+    """Returns the status of a payment queued with `async=true`"""
+
+    serializer_class = QueuedPaymentSerializer
+
+    def get_queryset(self):
+        return find_queued_payments(dict(wallet=self.request.user.wallet))
+
+
+class TransactionBatchView(CreateAPIView):
+    serializer_class = BatchPaymentSerializer
+
+    def post(self, request, *args, **kwargs):
+        """Sends a list of independent payments from the user wallet.
+
+        Every payment succeeds or fails on its own, results are returned in request order.
+        """
+        serializer_instance = self.get_serializer(data=request.data)
+        serializer_instance.is_valid(raise_exception=True)
+
+        results = []
+        valid_payments = []
+        for payment_data in serializer_instance.validated_data["payments"]:
+            payment_serializer = PaymentItemSerializer(data=payment_data)
+            if payment_serializer.is_valid():
+                results.append(None)
+                valid_payments.append(payment_serializer.validated_data)
+            else:
+                results.append(dict(success=False, errors=payment_serializer.errors))
+
         user_wallet = request.user.wallet
-        if user_wallet.balance < payment_serializer.validated_data["amount"]:
-            raise serializers.ValidationError("More gold is needed.")
-        transaction_instance = send_payment(
-            source_wallet=user_wallet, **payment_serializer.validated_data
-        )
+        outcomes = iter(send_payments(user_wallet, valid_payments))
+        for index, result in enumerate(results):
+            if result:
+                continue
+            outcome = next(outcomes)
+            if isinstance(outcome, serializers.ValidationError):
+                results[index] = dict(
+                    success=False,
+                    errors={api_settings.NON_FIELD_ERRORS_KEY: outcome.detail},
+                )
+            else:
+                results[index] = dict(success=True, transaction=outcome.id)
+
         return Response(
-            status=status.HTTP_201_CREATED,
-            data=dict(
-                balance=user_wallet.balance,
-                transaction=TransactionSerializer(instance=transaction_instance).data,
-            ),
+            status=status.HTTP_200_OK,
+            data=dict(balance=to_decimal(user_wallet.balance), results=results),
         )
 
 
 class ExchangeRateList(ListAPIView):
     serializer_class = ExchangeRateSerializerRead
+    # Date of served rates, older than requested until new ones are downloaded
+    rates_date = None
 
     def get_queryset(self):
-        for_date = self.request.query_params.get("date", date.today())
         queryset = find_exchange_rates(
             dict(
-                for_date=for_date,
+                for_date=self.rates_date,
                 from_currency=self.request.query_params.get("from_currency", USD),
                 to_currency=self.request.query_params.get("to_currency"),
             )
@@ -123,21 +298,20 @@ class ExchangeRateList(ListAPIView):
         Ex.:
         1. USD to CAD for 2019-09-14 requires query string: `?from_currency=USD&to_currency=CAD&date=2019-09-14`
         2. all existing to USD for today: `?from_currency=USD`
+
+        Rates that aren't stored yet are downloaded in background, until then
+        the latest stored rates are returned, check `date` of the results.
         """
         from_currency = self.request.query_params.get("from_currency", USD)
         for_date = date.fromisoformat(
             self.request.query_params.get("date", date.today().isoformat())
         )
 
-        # Download new rates for date if needed.
-        update_exchange_rates_for_date_if_not_exist(for_date)
+        # Missing rates are downloaded in background, latest stored ones are served.
+        # Rates between every pair of currencies are precomputed for the date.
+        self.rates_date, cross_rates = find_cross_rates(for_date)
 
-        # Find base rate for currency conversion calculations.
-        exchange_rate = find_exchange_rates(
-            dict(to_currency=from_currency, for_date=for_date)
-        ).first()
-
-        if not exchange_rate:
+        if not cross_rates or cross_rates.get(from_currency, from_currency) is None:
             raise serializers.ValidationError(
                 f"No exchange rate for currency '{from_currency}' exists"
             )
@@ -145,13 +319,13 @@ class ExchangeRateList(ListAPIView):
         return Response(
             {
                 "results": self.serializer_class(
-                    self.get_queryset().exclude(
-                        to_currency=from_currency
-                    ),  # remove self rate from results, e.g. USD to USD
+                    [
+                        rate
+                        for rate in self.get_queryset()
+                        if rate.to_currency != from_currency
+                    ],  # remove self rate from results, e.g. USD to USD
                     many=True,
-                    context=dict(
-                        base_currency=from_currency, base_rate=exchange_rate.rate
-                    ),
+                    context=dict(base_currency=from_currency, cross_rates=cross_rates),
                 ).data
             }
         )
@@ -161,11 +335,22 @@ class ReportView(APIView):
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [
         CSVRenderer,
         XMLRenderer,
+        JSONLinesRenderer,
     ]
 
     def get(self, request):
+        """Returns entries of the user wallet, newest first.
+
+        Filtered by `date_from` and `date_to`, `format` is one of json, csv, xml, jsonl.
+        With `stream=true` the report is streamed, use it for large reports.
+        With `group_by` (day, week, month, currency) or `summary=true` (by currency)
+        returns count, sum, min and max of amounts per group instead of entries.
+        """
         output_format = request.query_params.get("format")
         username = request.query_params.get("username")
+        group_by = request.query_params.get("group_by")
+        if request.query_params.get("summary") == "true":
+            group_by = group_by or "currency"
 
         if not username:
             raise serializers.ValidationError("username query param is required")
@@ -174,28 +359,38 @@ class ReportView(APIView):
                 "You need staff permissions to see another user report."
             )
 
-        date_from = request.query_params.get("date_from")
-        date_to = request.query_params.get("date_to")
-
-        entries = TransactionEntry.objects.filter(
-            wallet__user__username=username
-        ).select_related("wallet__user", "transaction")
-
-        if date_from:
-            entries = entries.filter(transaction__created__gte=date_from)
-
-        if date_to:
-            entries = entries.filter(transaction__created__lte=date_to)
+        if group_by and group_by not in REPORT_GROUPS:
+            raise serializers.ValidationError(
+                f"group_by must be one of: {', '.join(REPORT_GROUPS)}"
+            )
+        stream = request.query_params.get("stream") == "true"
+        if stream and not group_by and (output_format or "json") not in REPORT_STREAMS:
+            raise serializers.ValidationError(
+                f"Streamed format must be one of: {', '.join(REPORT_STREAMS)}"
+            )
 
-        entries = entries.values(
-            "id",
-            "amount",
-            username=F("wallet__user__username"),
-            created=F("transaction__created"),
-            currency=F("wallet__currency"),
+        filters = dict(
+            username=username,
+            date_from=request.query_params.get("date_from"),
+            date_to=request.query_params.get("date_to"),
         )
-
-        resp = Response(ReportSerializer(entries, many=True).data)
+        entries = find_report_entries(filters).values_list(*REPORT_COLUMNS)
+
+        if group_by:
+            # Aggregated in the database, one row per group
+            summary = find_report_summary(dict(filters, group_by=group_by))
+            resp = Response(ReportSummarySerializer(summary, many=True).data)
+        elif stream:
+            # Rows are read with a server side cursor and written as they come,
+            # memory use doesn't depend on the report size.
+            writer, content_type = REPORT_STREAMS[output_format or "json"]
+            resp = StreamingHttpResponse(
+                writer(entries.iterator(chunk_size=REPORT_CHUNK_SIZE)),
+                content_type=content_type,
+            )
+        else:
+            # Same output as ReportSerializer, built straight from row tuples
+            resp = Response([serialize_report_row(row) for row in entries])
 
         if output_format:
             resp[
@@ -82,6 +82,8 @@ case "$1" in
     uwsgi)
         echo "Running App (uWSGI)..."
         write_uwsgi
+        # Metrics of the previous run's workers would be summed with the new ones
+        rm -rf /tmp/metrics && mkdir -p /tmp/metrics
         uwsgi --ini /uwsgi.ini
     ;;
     *)